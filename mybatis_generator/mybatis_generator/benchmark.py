@@ -0,0 +1,265 @@
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from xml.etree import ElementTree as ET
+
+from .core.io_utils import atomic_write_text
+from .core.templates import to_snake_case
+from .decoding import DECODING_PROFILES, SPECULATIVE_PROFILES, TimingStreamer
+
+# 基准测试使用的固定实体类
+SAMPLE_ENTITIES = [
+    """package com.example.entity;
+
+public class User {
+    private Long id;
+    private String username;
+    private String email;
+    private Integer status;
+    private Date createTime;
+}""",
+    """package com.example.entity;
+
+public class OrderItem {
+    private Long id;
+    private Long orderId;
+    private Long productId;
+    private Integer quantity;
+    private BigDecimal price;
+    private Integer payStatus;
+    private Date createTime;
+    private Date updateTime;
+}""",
+    """package com.example.entity;
+
+public class Product {
+    private Long id;
+    private String productName;
+    private String category;
+    private BigDecimal price;
+    private Integer stock;
+}""",
+]
+
+
+# 基准测试使用的固定单条语句需求：前两条可由模板生成，后两条需要调用模型
+SAMPLE_REQUESTS = [
+    "生成根据id更新User的status的sql",
+    "生成查询OrderItem列表的sql，支持多个字段查询条件",
+    "生成统计Product数量的sql",
+    "生成根据orderId删除OrderItem的sql",
+]
+
+_CLASS_PATTERN = re.compile(r'\bclass\s+(\w+)')
+_FIELD_PATTERN = re.compile(r'private\s+[\w<>\[\], .?]+?\s+(\w+)\s*(?:=[^;]*)?;')
+
+
+def load_benchmark_entities() -> List[str]:
+    """固定实体类加上data/dataset_example.json中的示例输入"""
+    entities = list(SAMPLE_ENTITIES)
+    example_path = os.path.join(os.path.dirname(__file__), 'data', 'dataset_example.json')
+    with open(example_path, 'r', encoding='utf-8') as f:
+        example = json.load(f)
+    for item in example if isinstance(example, list) else [example]:
+        entities.append(item['input'])
+    return entities
+
+
+def is_well_formed(xml: str) -> bool:
+    """输出是否是格式正确的XML"""
+    try:
+        ET.fromstring(xml.strip())
+        return True
+    except ET.ParseError:
+        return False
+
+
+def entity_class_name(entity_content: str) -> Optional[str]:
+    match = _CLASS_PATTERN.search(entity_content)
+    return match.group(1) if match else None
+
+
+def check_mapper(entity_content: str, mapper_xml: str) -> Dict:
+    """
+    检查生成结果的有效性
+    :return: well_formed（XML格式正确）、namespace_ok（namespace以 实体类名Mapper 结尾）、
+             field_coverage（实体类字段的属性名或列名出现在XML中的比例）
+    """
+    result = {'well_formed': False, 'namespace_ok': False, 'field_coverage': 0.0}
+    try:
+        root = ET.fromstring(mapper_xml.strip())
+        result['well_formed'] = True
+    except ET.ParseError:
+        root = None
+    class_name = entity_class_name(entity_content)
+    if root is not None and class_name:
+        result['namespace_ok'] = (root.get('namespace') or '').endswith(f"{class_name}Mapper")
+    fields = _FIELD_PATTERN.findall(entity_content)
+    if fields:
+        covered = sum(1 for field in fields if field in mapper_xml or to_snake_case(field) in mapper_xml)
+        result['field_coverage'] = covered / len(fields)
+    return result
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法计算分位数"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def compare_decoding_profiles(generator, entities: List[str], profiles: List[str] = None) -> Dict:
+    """
+    用同一批实体类比较各解码配置的延迟和输出有效性
+    :param generator: MapperGenerator（不要设置result_cache，否则测到的是缓存命中）
+    :param entities: 实体类内容列表
+    :param profiles: 要比较的解码配置，默认全部
+    :return: 解码配置 -> 统计结果，speculative配置另有草稿接受率、每次前向生成的token数和相对fast的加速比
+    """
+    results = {}
+    for profile in profiles or list(DECODING_PROFILES):
+        drafts_before = generator.draft_stats.stats()
+        # 束搜索不支持streamer，只统计总延迟
+        streaming = DECODING_PROFILES[profile]['num_beams'] == 1
+        latencies, ttfts, new_tokens, decode_seconds = [], [], 0, 0.0
+        checks = []
+        for entity_content in entities:
+            streamer = TimingStreamer() if streaming else None
+            start = time.perf_counter()
+            mapper_xml = generator.generate_mapper(entity_content, decoding=profile, streamer=streamer)
+            latency = time.perf_counter() - start
+            latencies.append(latency)
+            if streamer is not None and streamer.ttft is not None:
+                ttfts.append(streamer.ttft)
+                new_tokens += streamer.new_tokens
+                decode_seconds += latency - streamer.ttft
+            else:
+                new_tokens += len(generator.tokenizer(mapper_xml, add_special_tokens=False)["input_ids"])
+                decode_seconds += latency
+            checks.append(check_mapper(entity_content, mapper_xml))
+        results[profile] = {
+            'requests': len(entities),
+            'latency_mean': round(statistics.mean(latencies), 4),
+            'latency_p50': round(percentile(latencies, 50), 4),
+            'latency_p95': round(percentile(latencies, 95), 4),
+            'ttft_p50': round(percentile(ttfts, 50), 4) if ttfts else None,
+            'ttft_p95': round(percentile(ttfts, 95), 4) if ttfts else None,
+            'tokens_per_second': round(new_tokens / decode_seconds, 2) if decode_seconds else 0.0,
+            'valid_xml_rate': round(sum(c['well_formed'] for c in checks) / len(checks), 4),
+            'namespace_ok_rate': round(sum(c['namespace_ok'] for c in checks) / len(checks), 4),
+            'field_coverage': round(statistics.mean(c['field_coverage'] for c in checks), 4),
+        }
+        if profile in SPECULATIVE_PROFILES:
+            drafts = {key: value - drafts_before[key] for key, value in generator.draft_stats.stats().items()
+                      if key in ('steps', 'drafted', 'accepted', 'new_tokens')}
+            results[profile]['acceptance_rate'] = \
+                round(drafts['accepted'] / drafts['drafted'], 4) if drafts['drafted'] else 0.0
+            results[profile]['tokens_per_step'] = \
+                round(drafts['new_tokens'] / drafts['steps'], 4) if drafts['steps'] else 0.0
+    for profile in SPECULATIVE_PROFILES:
+        if profile in results and 'fast' in results:
+            results[profile]['speedup_vs_fast'] = \
+                round(results['fast']['latency_mean'] / results[profile]['latency_mean'], 3)
+    return results
+
+
+def benchmark_statements(generator, requests: List[str]) -> Dict:
+    """单条语句需求的延迟和模板命中率（模板命中时不调用模型）"""
+    engine = generator.template_engine
+    hits_before = engine.hits if engine is not None else 0
+    latencies, valid = [], 0
+    for request in requests:
+        start = time.perf_counter()
+        xml = generator.generate_statement(request)
+        latencies.append(time.perf_counter() - start)
+        valid += is_well_formed(xml)
+    return {
+        'requests': len(requests),
+        'template_hits': (engine.hits - hits_before) if engine is not None else 0,
+        'latency_p50': round(percentile(latencies, 50), 4),
+        'latency_p95': round(percentile(latencies, 95), 4),
+        'valid_xml_rate': round(valid / len(requests), 4),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(generator, entities: List[str] = None, requests: List[str] = None,
+                  profiles: List[str] = None) -> Dict:
+    """
+    完整的基准测试：模型加载、预热、各解码配置的生成延迟/首token延迟/吞吐/有效性、单条语句生成和峰值内存
+    :param generator: 尚未加载模型的MapperGenerator
+    :param entities: 实体类内容列表，默认load_benchmark_entities()
+    :param requests: 单条语句需求列表，默认SAMPLE_REQUESTS
+    :param profiles: 要比较的解码配置，默认全部
+    :return: 可直接保存为JSON的结果
+    """
+    entities = entities if entities is not None else load_benchmark_entities()
+    requests = requests if requests is not None else SAMPLE_REQUESTS
+
+    start = time.perf_counter()
+    generator.model  # noqa: B018  触发加载
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    generator.warmup()
+    warmup_seconds = time.perf_counter() - start
+
+    return {
+        'environment': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'model': generator._loader.fingerprint(),
+        },
+        'load_seconds': round(load_seconds, 4),
+        'warmup_seconds': round(warmup_seconds, 4),
+        'profiles': compare_decoding_profiles(generator, entities, profiles),
+        'statements': benchmark_statements(generator, requests),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成基准测试：加载时间、延迟、首token延迟、吞吐、峰值内存和输出有效性")
+    parser.add_argument("--base-model", default="facebook/opt-350m")
+    parser.add_argument("--checkpoint", default="./mybatis_mapper_generator")
+    parser.add_argument("--profiles", nargs="+", default=list(DECODING_PROFILES), choices=list(DECODING_PROFILES))
+    parser.add_argument("--output", help="结果JSON文件路径（可选），可在不同提交之间diff")
+    args = parser.parse_args()
+
+    from .inference import MapperGenerator
+    generator = MapperGenerator(base_model_name=args.base_model, checkpoint_path=args.checkpoint)
+    results = run_benchmark(generator, profiles=args.profiles)
+    text = json.dumps(results, ensure_ascii=False, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        atomic_write_text(args.output, text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,75 @@
 import os
 import javalang
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
 from xml.etree import ElementTree as ET
 
+from .io_utils import file_digest
+from .model import EntityInfo, InterfaceInfo, MapperInfo, SqlRefs
+from .reporter import AnalysisReporter
+from .scan_cache import ScanCache
+from .sql_parser import extract_mapper_refs
+
+
+def _parse_java_task(task) -> Dict:
+    """
+    解析单个Java文件（可在子进程中执行）
+    :param task: (kind, file_path, entity_dir, known_digest)
+    :return: 包含文件状态、内容哈希和解析记录的字典
+    """
+    kind, file_path, entity_dir, known_digest = task
+    result = {'file_path': file_path, 'records': {}, 'unchanged': False, 'error': None}
+    try:
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        result.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha1=file_digest(raw))
+        # 内容没有变化（只是mtime变了），直接复用缓存中的记录
+        if known_digest is not None and known_digest == result['sha1']:
+            result['unchanged'] = True
+            return result
+        tree = javalang.parse.parse(raw.decode('utf-8'))
+        if kind == 'entity':
+            result['records'] = ProjectAnalyzer._entity_records(tree, file_path, entity_dir)
+        else:
+            result['records'] = ProjectAnalyzer._interface_records(tree, file_path)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
 class ProjectAnalyzer:
-    def __init__(self, mapper_dir: str, entity_dir: str, mapper_java_dir: str):
+    # 实体类常见后缀（小写），如 UserDO / UserEntity / UserPO
+    ENTITY_SUFFIXES = ('do', 'entity', 'model', 'po')
+    # Mapper接口常见后缀（小写），如 UserMapper / UserDao
+    MAPPER_SUFFIXES = ('mapper', 'dao', 'repository')
+
+    def __init__(self, mapper_dir: str, entity_dir: str, mapper_java_dir: str,
+                 workers: int = 1, cache_path: Optional[str] = None,
+                 reporter: Optional[AnalysisReporter] = None):
         """
         初始化项目分析器
         :param mapper_dir: Mapper XML文件所在目录
         :param entity_dir: 实体类所在目录
         :param mapper_java_dir: Mapper接口文件所在目录
+        :param workers: 解析Java文件的进程数，大于1时使用进程池并行解析
+        :param cache_path: 解析缓存文件路径，设置后再次扫描只重新解析发生变化的文件
+        :param reporter: 事件/进度输出，默认只在终端输出阶段汇总信息
         """
         self.mapper_dir = mapper_dir
         self.entity_dir = entity_dir
         self.mapper_java_dir = mapper_java_dir
+        self.workers = max(1, workers)
+        self.cache = ScanCache(cache_path) if cache_path else None
         self.entity_classes = {}
         self.existing_mappers = {}
         self.mapper_interfaces = {}
         self.naming_patterns = {}  # 添加命名模式字典
+        self.reporter = reporter or AnalysisReporter()
         
-        print("\n=== 初始化项目分析器 ===")
-        print(f"Mapper XML目录: {mapper_dir}")
-        print(f"实体类目录: {entity_dir}")
-        print(f"Mapper接口目录: {mapper_java_dir}")
+        self.reporter.info("\n=== 初始化项目分析器 ===")
+        self.reporter.info(f"Mapper XML目录: {mapper_dir}\n实体类目录: {entity_dir}\nMapper接口目录: {mapper_java_dir}",
+                           mapper_dir=mapper_dir, entity_dir=entity_dir, mapper_java_dir=mapper_java_dir)
         
         # 检查目录是否存在
         self._check_directories()
@@ -35,21 +82,31 @@ class ProjectAnalyzer:
             (self.mapper_java_dir, "Mapper接口")
         ]:
             if not os.path.exists(dir_path):
-                print(f"警告: {dir_name}目录不存在: {dir_path}")
-            else:
-                # 列出目录中的文件
+                self.reporter.error('检查目录', f"{dir_name}目录不存在", dir_path)
+            elif self.reporter.debug_enabled:
+                # 只在debug模式下列出目录中的文件
                 files = os.listdir(dir_path)
-                print(f"\n{dir_name}目录中的文件:")
-                for file in files:
-                    print(f"- {file}")
+                self.reporter.debug(f"\n{dir_name}目录中的文件:\n" + '\n'.join(f"- {file}" for file in files),
+                                    directory=dir_path, entries=len(files))
         
     def analyze(self):
         """分析项目结构"""
-        print("\n=== 开始项目分析 ===")
-        self._scan_mapper_interfaces()
-        self._scan_mappers()
-        self._scan_entities()
-        self._analyze_naming_patterns()  # 添加命名模式分析
+        # 重复调用analyze时从头开始，避免残留已删除文件的记录
+        self.entity_classes = {}
+        self.existing_mappers = {}
+        self.mapper_interfaces = {}
+        if self.cache:
+            self.cache.begin()
+        with self.reporter.phase('扫描Mapper接口文件'):
+            self._scan_mapper_interfaces()
+        with self.reporter.phase('扫描Mapper XML文件'):
+            self._scan_mappers()
+        with self.reporter.phase('扫描实体类文件'):
+            self._scan_entities()
+        if self.cache:
+            self.cache.save()
+        with self.reporter.phase('分析命名模式'):
+            self._analyze_naming_patterns()  # 添加命名模式分析
         self._match_mapper_info()
         
     def _analyze_naming_patterns(self):
@@ -74,110 +131,181 @@ class ProjectAnalyzer:
         
     def _detect_table_prefix(self) -> str:
         """检测表名前缀模式"""
-        # 从XML中分析表名前缀
+        # 使用解析Mapper XML时提取的表名，每个Mapper中的表只计一次
         prefixes = {}
         for mapper in self.existing_mappers.values():
-            content = mapper['content']
-            # 简单的表名提取逻辑，实际项目中可能需要更复杂的解析
-            table_names = self._extract_table_names(content)
-            for table in table_names:
+            for table in mapper.sql_refs.tables:
                 prefix = table.split('_')[0] if '_' in table else ''
                 prefixes[prefix] = prefixes.get(prefix, 0) + 1
         return max(prefixes.items(), key=lambda x: x[1])[0] if prefixes else ''
         
     def _detect_column_style(self) -> str:
         """检测字段命名风格"""
-        # 从XML中分析字段命名风格
+        # 按语句和resultMap中实际引用的字段名统计，单个小写单词的字段不参与判断
         styles = {'camelCase': 0, 'snake_case': 0}
         for mapper in self.existing_mappers.values():
-            content = mapper['content']
-            if 'column=' in content:
-                # 简单判断是否使用下划线
-                if '_' in content:
+            for column in mapper.sql_refs.columns:
+                if '_' in column.strip('_'):
                     styles['snake_case'] += 1
-                else:
+                elif column != column.lower():
                     styles['camelCase'] += 1
         return max(styles.items(), key=lambda x: x[1])[0]
         
-    def _extract_table_names(self, content: str) -> List[str]:
-        """从SQL中提取表名"""
-        tables = []
-        # 简单的表名提取逻辑
-        keywords = ['FROM', 'JOIN', 'UPDATE', 'INTO']
-        for keyword in keywords:
-            pos = content.find(keyword)
-            if pos != -1:
-                # 提取紧跟在关键字后面的表名
-                # 这里的逻辑可能需要根据实际SQL复杂度调整
-                table = content[pos:].split()[1].strip('`[]"')
-                tables.append(table)
-        return list(set(tables))  # 去重
-        
     def _scan_mapper_interfaces(self):
         """扫描Mapper接口文件"""
-        print("\n=== 扫描Mapper接口文件 ===")
-        for root, _, files in os.walk(self.mapper_java_dir):
+        self.mapper_interfaces.update(self._scan_java_files(self.mapper_java_dir, 'interface'))
+        self.reporter.info(f"当前已解析的接口数量: {len(self.mapper_interfaces)}")
+
+    def _scan_java_files(self, directory: str, kind: str) -> Dict:
+        """
+        扫描目录下的Java文件并返回解析出的记录
+        优先使用缓存；未命中的文件按workers设置串行或在进程池中并行解析
+        :param directory: 扫描的目录
+        :param kind: 'entity' 或 'interface'
+        :return: 类全名 -> 记录
+        """
+        records = {}
+        tasks = []
+        cache_hits = 0
+        # 实体类的包路径由扫描根目录推导，根目录变化后缓存的记录失效
+        scan_root = os.path.abspath(directory)
+        for root, _, files in os.walk(directory):
             for file in files:
-                if file.endswith('.java'):
-                    file_path = os.path.join(root, file)
-                    print(f"\n发现Mapper接口文件: {file_path}")
+                if not file.endswith('.java'):
+                    continue
+                file_path = os.path.join(root, file)
+                if self.reporter.debug_enabled:
+                    self.reporter.event('file', f"发现{'实体类' if kind == 'entity' else 'Mapper接口'}文件: {file_path}",
+                                        scan=kind, file_path=file_path)
+                if self.cache:
                     try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            print("文件内容预览:")
-                            print(content[:200] + "..." if len(content) > 200 else content)
-                        tree = javalang.parse.parse(content)
-                        self._process_mapper_interface(tree, file_path)
-                        print(f"当前已解析的接口数量: {len(self.mapper_interfaces)}")
-                    except Exception as e:
-                        print(f"解析出错: {str(e)}")
-
-    def _process_mapper_interface(self, tree, file_path: str):
-        """处理Mapper接口文件"""
-        try:
-            # 修改包名获取方式
-            package = tree.package.name if tree.package else ''
-            print(f"处理接口文件: {file_path}, 包名: {package}")
-            
-            for _, node in tree.filter(javalang.tree.InterfaceDeclaration):
-                full_interface_name = f"{package}.{node.name}"
-                methods = self._extract_mapper_methods(node)
-                self.mapper_interfaces[full_interface_name] = {
-                    'name': node.name,
-                    'package': package,
-                    'methods': methods,
-                    'file_path': file_path
-                }
-                print(f"添加接口: {full_interface_name}")
-        except Exception as e:
-            print(f"处理Mapper接口文件出错 {file_path}: {str(e)}")
+                        stat = os.stat(file_path)
+                    except OSError as e:
+                        # 扫描期间被删除的文件、失效的符号链接等，只跳过该文件
+                        self.reporter.error(f"读取{kind}文件", str(e), file_path)
+                        continue
+                    entry = self.cache.lookup(kind, file_path, stat, scan_root)
+                    if entry is not None:
+                        # 缓存中只保留紧凑记录，避免同一份数据以字典和对象形式各存一份
+                        entry['records'] = self._compact_records(kind, entry['records'])
+                        records.update(entry['records'])
+                        cache_hits += 1
+                        continue
+                known_digest = self.cache.known_digest(kind, file_path, scan_root) if self.cache else None
+                tasks.append((kind, file_path, self.entity_dir, known_digest))
+
+        if self.workers > 1 and len(tasks) > 1:
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(_parse_java_task, tasks, chunksize=chunksize))
+        else:
+            results = [_parse_java_task(task) for task in tasks]
+
+        for result in results:
+            if result['error']:
+                self.reporter.error(f"解析{kind}文件", result['error'], result['file_path'])
+                continue
+            file_records = result['records']
+            if result['unchanged']:
+                file_records = self.cache.get(kind, result['file_path'])['records']
+                cache_hits += 1
+            file_records = self._compact_records(kind, file_records)
+            if self.cache:
+                self.cache.store(kind, result['file_path'], result['mtime_ns'], result['size'],
+                                 result['sha1'], file_records, scan_root)
+            records.update(file_records)
+
+        parsed = sum(1 for r in results if not r['unchanged'] and not r['error'])
+        self.reporter.count(f'{kind}_files', cache_hits + len(results))
+        self.reporter.count(f'{kind}_cache_hits', cache_hits)
+        self.reporter.count(f'{kind}_parsed', parsed)
+        self.reporter.info(f"缓存命中文件数: {cache_hits}, 重新解析文件数: {parsed}",
+                           scan=kind, cache_hits=cache_hits, parsed=parsed)
+        return records
+
+    @staticmethod
+    def _compact_records(kind: str, records: Dict) -> Dict:
+        """把解析进程返回的（或从缓存文件读取的）字典记录转换为紧凑的记录对象"""
+        record_type = EntityInfo if kind == 'entity' else InterfaceInfo
+        return {name: record if isinstance(record, record_type) else record_type.from_dict(record)
+                for name, record in records.items()}
+
+    @staticmethod
+    def _interface_records(tree, file_path: str) -> Dict:
+        """处理Mapper接口文件，返回 接口全名 -> 接口信息"""
+        records = {}
+        # 修改包名获取方式
+        package = tree.package.name if tree.package else ''
+        for _, node in tree.filter(javalang.tree.InterfaceDeclaration):
+            full_interface_name = f"{package}.{node.name}"
+            records[full_interface_name] = {
+                'name': node.name,
+                'package': package,
+                'methods': ProjectAnalyzer._extract_mapper_methods(node),
+                'file_path': file_path
+            }
+        return records
 
-    def _extract_mapper_methods(self, node) -> List[Dict]:
+    @staticmethod
+    def _extract_mapper_methods(node) -> List[Dict]:
         """提取Mapper接口中的方法信息"""
         methods = []
         for method in node.methods:
             method_info = {
                 'name': method.name,
-                'return_type': self._get_full_type(method.return_type),
-                'parameters': self._extract_parameters(method.parameters),
-                'annotations': self._extract_annotations(method.annotations),
-                'documentation': self._extract_javadoc(method)
+                'return_type': ProjectAnalyzer._get_full_type(method.return_type),
+                'parameters': ProjectAnalyzer._extract_parameters(method.parameters),
+                'annotations': ProjectAnalyzer._extract_annotations(method.annotations),
+                'documentation': ProjectAnalyzer._extract_javadoc(method)
             }
             methods.append(method_info)
         return methods
 
-    def _extract_javadoc(self, method) -> Dict:
+    @staticmethod
+    def _get_full_type(type_node) -> str:
+        """将类型节点还原为类型字符串，如 List<User>、int[]，void方法返回'void'"""
+        if type_node is None:
+            return 'void'
+        name = type_node.name
+        sub_type = getattr(type_node, 'sub_type', None)
+        while sub_type is not None:
+            name = f"{name}.{sub_type.name}"
+            sub_type = getattr(sub_type, 'sub_type', None)
+        arguments = getattr(type_node, 'arguments', None)
+        if arguments:
+            args = [ProjectAnalyzer._get_full_type(arg.type) if arg.type else '?' for arg in arguments]
+            name = f"{name}<{', '.join(args)}>"
+        return name + '[]' * len(type_node.dimensions or [])
+
+    @staticmethod
+    def _extract_parameters(parameters) -> List[Dict]:
+        """提取方法参数信息（含@Param注解）"""
+        result = []
+        for param in parameters:
+            result.append({
+                'name': param.name,
+                'type': ProjectAnalyzer._get_full_type(param.type),
+                'annotations': ProjectAnalyzer._extract_annotations(param.annotations)
+            })
+        return result
+
+    @staticmethod
+    def _extract_javadoc(method) -> Dict:
         """提取方法的JavaDoc注释"""
-        if hasattr(method, 'documentation'):
-            doc = method.documentation
+        if getattr(method, 'documentation', None):
+            try:
+                doc = javalang.javadoc.parse(method.documentation)
+            except Exception:
+                return {}
             return {
-                'description': doc.description if doc else '',
-                'params': {param.name: param.description for param in doc.params} if doc and doc.params else {},
-                'return': doc.return_doc if doc and doc.return_doc else ''
+                'description': doc.description or '',
+                'params': {name: description for name, description in doc.params} if doc.params else {},
+                'return': doc.return_doc or ''
             }
         return {}
 
-    def _extract_annotations(self, annotations) -> List[Dict]:
+    @staticmethod
+    def _extract_annotations(annotations) -> List[Dict]:
         """提取注解信息"""
         result = []
         for ann in annotations:
@@ -185,58 +313,147 @@ class ProjectAnalyzer:
                 'name': ann.name,
                 'elements': {}
             }
-            if ann.element:
+            if isinstance(ann.element, list):
                 for elem in ann.element:
                     if isinstance(elem, javalang.tree.ElementValuePair):
-                        ann_info['elements'][elem.name] = elem.value.value
+                        ann_info['elements'][elem.name] = getattr(elem.value, 'value', None)
                     else:
-                        ann_info['elements']['value'] = elem.value
+                        ann_info['elements']['value'] = getattr(elem, 'value', None)
+            elif ann.element is not None:
+                ann_info['elements']['value'] = getattr(ann.element, 'value', None)
             result.append(ann_info)
         return result
 
     def _match_mapper_info(self):
-        """匹配Mapper接口和XML信息"""
-        print("\n=== 匹配结果统计 ===")
-        print(f"找到的实体类数量: {len(self.entity_classes)}")
-        print(f"找到的Mapper XML数量: {len(self.existing_mappers)}")
-        print(f"找到的Mapper接口数量: {len(self.mapper_interfaces)}")
+        """匹配Mapper接口和XML信息，并为每个Mapper XML解析出对应的实体类"""
+        self.reporter.info(
+            f"\n=== 匹配结果统计 ===\n"
+            f"找到的实体类数量: {len(self.entity_classes)}\n"
+            f"找到的Mapper XML数量: {len(self.existing_mappers)}\n"
+            f"找到的Mapper接口数量: {len(self.mapper_interfaces)}",
+            entities=len(self.entity_classes),
+            mappers=len(self.existing_mappers),
+            interfaces=len(self.mapper_interfaces)
+        )
         
-        print("\n实体类列表:")
-        for class_name in self.entity_classes:
-            print(f"- {class_name}")
-            
-        print("\nMapper XML列表:")
-        for namespace in self.existing_mappers:
-            print(f"- {namespace}")
-            
-        print("\nMapper接口列表:")
-        for interface_name in self.mapper_interfaces:
-            print(f"- {interface_name}")
+        if self.reporter.debug_enabled:
+            for title, names in [("实体类列表", self.entity_classes),
+                                 ("Mapper XML列表", self.existing_mappers),
+                                 ("Mapper接口列表", self.mapper_interfaces)]:
+                self.reporter.debug(f"\n{title}:\n" + '\n'.join(f"- {name}" for name in names),
+                                    names=list(names))
+
+        index = self._build_entity_index()
+        sources = {}
+        unmatched = []
+        for namespace, mapper_info in self.existing_mappers.items():
+            interface = self.mapper_interfaces.get(namespace)
+            mapper_info.interface = interface
+            entity_class, source = self._resolve_entity(mapper_info, index)
+            mapper_info.entity_class = entity_class
+            mapper_info.match_source = source
+            if entity_class:
+                sources[source] = sources.get(source, 0) + 1
+            else:
+                unmatched.append(namespace)
+
+        matched = len(self.existing_mappers) - len(unmatched)
+        coverage = matched / len(self.existing_mappers) if self.existing_mappers else 0.0
+        self.reporter.count('mappers_matched', matched)
+        self.reporter.count('mappers_unmatched', len(unmatched))
+        self.reporter.info(f"Mapper XML匹配到实体类: {matched}/{len(self.existing_mappers)} "
+                           f"({coverage:.1%})，匹配方式: {sources}",
+                           matched=matched, unmatched=len(unmatched), coverage=round(coverage, 4),
+                           sources=sources)
+        if unmatched and self.reporter.debug_enabled:
+            self.reporter.debug("未匹配到实体类的Mapper XML:\n" + '\n'.join(f"- {name}" for name in unmatched),
+                                names=unmatched)
+
+    def _build_entity_index(self) -> Dict[str, List[str]]:
+        """
+        建立实体类的多键索引：类全名、简单类名（小写，兼容MyBatis类型别名）、
+        以及去掉实体后缀（DO/Entity/Model等）后的简单类名
+        :return: 键 -> 类全名列表
+        """
+        index = {}
+        for full_name, entity_info in self.entity_classes.items():
+            simple = entity_info.name.lower()
+            keys = {full_name, simple}
+            for suffix in self.ENTITY_SUFFIXES:
+                if simple.endswith(suffix) and len(simple) > len(suffix):
+                    keys.add(simple[:-len(suffix)])
+            for key in keys:
+                index.setdefault(key, []).append(full_name)
+        return index
+
+    def _resolve_entity(self, mapper_info: MapperInfo, index: Dict[str, List[str]]):
+        """
+        为Mapper XML解析对应的实体类，按可信度依次尝试：
+        entity_type全名 -> XML中引用的类型（resultMap/parameterType/resultType，含别名）
+        -> Mapper接口名 -> Mapper接口方法的参数和返回类型
+        :return: (实体类全名, 匹配方式)，未匹配时实体类全名为None
+        """
+        namespace = mapper_info.namespace or ''
+        entity_type = mapper_info.entity_type
+        if entity_type in self.entity_classes:
+            return entity_type, 'entity_type'
+
+        for type_name in mapper_info.type_refs:
+            found = self._lookup_entity(type_name, index, namespace)
+            if found:
+                return found, 'type_ref'
+
+        interface_name = namespace.split('.')[-1].lower()
+        for suffix in self.MAPPER_SUFFIXES:
+            if interface_name.endswith(suffix) and len(interface_name) > len(suffix):
+                found = self._lookup_entity(interface_name[:-len(suffix)], index, namespace)
+                if found:
+                    return found, 'interface_name'
+                break
+
+        for method in (mapper_info.interface.methods if mapper_info.interface else ()):
+            type_names = [method.return_type] + [param.type for param in method.parameters]
+            for type_name in type_names:
+                for part in type_name.replace('<', ',').replace('>', ',').replace('[]', '').split(','):
+                    found = self._lookup_entity(part.strip(), index, namespace)
+                    if found:
+                        return found, 'interface_method'
+        return None, None
+
+    def _lookup_entity(self, type_name: str, index: Dict[str, List[str]], namespace: str) -> Optional[str]:
+        """按类全名或简单类名查找实体类，同名实体类取与namespace包名最接近的一个"""
+        if not type_name:
+            return None
+        candidates = index.get(type_name) or index.get(type_name.split('.')[-1].lower())
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        return max(candidates, key=lambda name: len(os.path.commonprefix([name, namespace])))
 
     def _scan_mappers(self):
         """扫描所有Mapper XML文件"""
-        print("\n=== 扫描Mapper XML文件 ===")
+        scanned = 0
         for root, _, files in os.walk(self.mapper_dir):
             for file in files:
                 if file.endswith('.xml'):
                     file_path = os.path.join(root, file)
-                    print(f"\n发现Mapper XML文件: {file_path}")
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            print("文件内容预览:")
-                            print(content[:200] + "..." if len(content) > 200 else content)
-                        mapper_info = self._parse_mapper_file(file_path)
-                        if mapper_info:
-                            self.existing_mappers[mapper_info['namespace']] = mapper_info
-                            print(f"解析结果:")
-                            print(f"- namespace: {mapper_info['namespace']}")
-                            print(f"- entity_type: {mapper_info['entity_type']}")
-                    except Exception as e:
-                        print(f"解析出错: {str(e)}")
-
-    def _parse_mapper_file(self, file_path: str) -> Dict:
-        """解析Mapper XML文件"""
+                    scanned += 1
+                    mapper_info = self._parse_mapper_file(file_path)
+                    if mapper_info:
+                        self.existing_mappers[mapper_info.namespace] = mapper_info
+                        if self.reporter.debug_enabled:
+                            self.reporter.event('file', f"解析Mapper XML文件: {file_path}, "
+                                                f"namespace: {mapper_info.namespace}, "
+                                                f"entity_type: {mapper_info.entity_type}",
+                                                scan='mapper', file_path=file_path,
+                                                namespace=mapper_info.namespace,
+                                                entity_type=mapper_info.entity_type)
+        self.reporter.count('mapper_files', scanned)
+        self.reporter.info(f"Mapper XML文件数: {scanned}, 解析成功: {len(self.existing_mappers)}")
+
+    def _parse_mapper_file(self, file_path: str) -> Optional[MapperInfo]:
+        """解析Mapper XML文件（XML全文不驻留内存，需要时通过content从磁盘读取）"""
         try:
             tree = ET.parse(file_path)
             root = tree.getroot()
@@ -245,57 +462,45 @@ class ProjectAnalyzer:
             # 提取实体类型（从resultMap或参数类型中）
             entity_type = self._extract_entity_type(root)
             
-            return {
-                'file_path': file_path,
-                'namespace': namespace,
-                'entity_type': entity_type,
-                'content': ET.tostring(root, encoding='utf-8').decode('utf-8')
-            }
+            return MapperInfo(
+                file_path=file_path,
+                namespace=namespace,
+                entity_type=entity_type,
+                type_refs=self._extract_type_refs(root),
+                sql_refs=SqlRefs(**extract_mapper_refs(root))
+            )
         except Exception as e:
-            print(f"解析XML文件失败 {file_path}: {str(e)}")
+            self.reporter.error('解析Mapper XML文件', str(e), file_path)
             return None
 
     def _scan_entities(self):
         """扫描实体类文件"""
-        print("\n=== 扫描实体类文件 ===")
-        for root, _, files in os.walk(self.entity_dir):
-            for file in files:
-                if file.endswith('.java'):
-                    file_path = os.path.join(root, file)
-                    print(f"\n发现实体类文件: {file_path}")
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            print("文件内容预览:")
-                            print(content[:200] + "..." if len(content) > 200 else content)
-                        tree = javalang.parse.parse(content)
-                        self._process_java_file(tree, file_path)
-                    except Exception as e:
-                        print(f"解析出错: {str(e)}")
-
-    def _process_java_file(self, tree, file_path: str):
-        """处理Java文件"""
-        try:
-            # 修改包名获取方式
-            package = tree.package.name if tree.package else ''
-            if not package:
-                # 如果没有包声明，使用目录结构作为包名
-                rel_path = os.path.relpath(os.path.dirname(file_path), self.entity_dir)
-                package = rel_path.replace(os.sep, '.')
-            
-            # 获取所有类声明
-            for _, node in tree.filter(javalang.tree.ClassDeclaration):
-                full_class_name = f"{package}.{node.name}"
-                self.entity_classes[full_class_name] = {
-                    'name': node.name,
-                    'package': package,
-                    'fields': self._extract_fields(node),
-                    'file_path': file_path
-                }
-        except Exception as e:
-            print(f"处理Java文件出错 {file_path}: {str(e)}")
+        self.entity_classes.update(self._scan_java_files(self.entity_dir, 'entity'))
 
-    def _extract_fields(self, node) -> List[Dict]:
+    @staticmethod
+    def _entity_records(tree, file_path: str, entity_dir: str) -> Dict:
+        """处理实体类Java文件，返回 类全名 -> 类信息"""
+        records = {}
+        # 修改包名获取方式
+        package = tree.package.name if tree.package else ''
+        if not package:
+            # 如果没有包声明，使用目录结构作为包名
+            rel_path = os.path.relpath(os.path.dirname(file_path), entity_dir)
+            package = rel_path.replace(os.sep, '.')
+        
+        # 获取所有类声明
+        for _, node in tree.filter(javalang.tree.ClassDeclaration):
+            full_class_name = f"{package}.{node.name}"
+            records[full_class_name] = {
+                'name': node.name,
+                'package': package,
+                'fields': ProjectAnalyzer._extract_fields(node),
+                'file_path': file_path
+            }
+        return records
+
+    @staticmethod
+    def _extract_fields(node) -> List[Dict]:
         """提取类的字段信息"""
         fields = []
         for field in node.fields:
@@ -306,7 +511,7 @@ class ProjectAnalyzer:
                 }
                 # 添加泛型信息（如果有）
                 if hasattr(field.type, 'arguments') and field.type.arguments:
-                    field_info['generic_type'] = [arg.type.name for arg in field.type.arguments]
+                    field_info['generic_type'] = [arg.type.name for arg in field.type.arguments if arg.type]
                 fields.append(field_info)
         return fields
 
@@ -331,14 +536,25 @@ class ProjectAnalyzer:
             
         return None
 
+    @staticmethod
+    def _extract_type_refs(root) -> List[str]:
+        """按出现顺序提取Mapper XML中引用的类型（resultMap的type、语句的parameterType/resultType）"""
+        refs = []
+        for element in root:
+            for attr in ('type', 'parameterType', 'resultType'):
+                value = element.get(attr)
+                if value and value not in refs:
+                    refs.append(value)
+        return refs
+
     def get_training_pairs(self) -> List[Dict]:
         """获取训练数据对"""
         training_pairs = []
         
         for namespace, mapper_info in self.existing_mappers.items():
-            entity_type = mapper_info['entity_type']
-            if entity_type in self.entity_classes:
-                entity_info = self.entity_classes[entity_type]
+            entity_class = mapper_info.get('entity_class')
+            if entity_class:
+                entity_info = self.entity_classes[entity_class]
                 training_pairs.append({
                     'entity': entity_info,
                     'mapper': mapper_info,
@@ -346,11 +562,12 @@ class ProjectAnalyzer:
                     'patterns': self.naming_patterns
                 })
         
-        print("\n=== 生成的训练数据对 ===")
-        print(f"成功匹配的数据对数量: {len(training_pairs)}")
-        for pair in training_pairs:
-            print(f"\n实体类: {pair['entity']['name']}")
-            print(f"对应的Mapper: {pair['mapper']['namespace']}")
-            print(f"命名模式: {pair['patterns']}")
+        self.reporter.count('training_pairs', len(training_pairs))
+        self.reporter.info(f"\n=== 生成的训练数据对 ===\n成功匹配的数据对数量: {len(training_pairs)}",
+                           training_pairs=len(training_pairs), naming_patterns=self.naming_patterns)
+        if self.reporter.debug_enabled:
+            for pair in training_pairs:
+                self.reporter.event('pair', f"实体类: {pair['entity']['name']} -> Mapper: {pair['mapper']['namespace']}",
+                                    entity=pair['entity']['name'], namespace=pair['mapper']['namespace'])
         
         return training_pairs
\ No newline at end of file
@@ -0,0 +1,29 @@
+import hashlib
+import os
+import tempfile
+
+
+def file_digest(content: bytes) -> str:
+    """计算文件内容的哈希值（用于判断文件是否变化）"""
+    return hashlib.sha1(content).hexdigest()
+
+
+def atomic_write_text(file_path: str, text: str, encoding: str = 'utf-8'):
+    """
+    原子写入文本文件：先写入同目录下的临时文件，再用os.replace替换目标文件，
+    避免进程中断时留下写了一半的文件
+    :param file_path: 目标文件路径
+    :param text: 文件内容
+    :param encoding: 文件编码
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(file_path))
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            f.write(text)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
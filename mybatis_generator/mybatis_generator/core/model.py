@@ -0,0 +1,187 @@
+import sys
+from typing import Dict, Optional, Tuple
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """驻留字符串，类型名、包名等在大项目中大量重复，只保留一份"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """
+    紧凑的分析结果记录基类
+
+    子类通过 __slots__ 声明字段，避免每个对象一个 __dict__；同时保留 record['name'] /
+    record.get('name') 的字典式访问，已有的按字典读取分析结果的代码无需修改
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and getattr(self, key, None) is not None
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def keys(self):
+        return [key for key in self.__slots__ if getattr(self, key, None) is not None]
+
+    def to_dict(self) -> Dict:
+        """转换为可JSON序列化的字典（用于缓存和训练数据导出）"""
+        return {key: _plain(getattr(self, key)) for key in self.keys()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={getattr(self, k)!r}' for k in self.keys())})"
+
+
+def _plain(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+
+class FieldInfo(Record):
+    """实体类字段"""
+    __slots__ = ('name', 'type', 'generic_type')
+
+    def __init__(self, name: str, type: str, generic_type: Optional[Tuple[str, ...]] = None):
+        self.name = _intern(name)
+        self.type = _intern(type)
+        self.generic_type = tuple(_intern(t) for t in generic_type) if generic_type else None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FieldInfo':
+        return cls(data['name'], data['type'], data.get('generic_type'))
+
+
+class EntityInfo(Record):
+    """实体类"""
+    __slots__ = ('name', 'package', 'fields', 'file_path')
+
+    def __init__(self, name: str, package: str, fields: Tuple[FieldInfo, ...], file_path: str):
+        self.name = _intern(name)
+        self.package = _intern(package)
+        self.fields = tuple(fields)
+        self.file_path = file_path
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'EntityInfo':
+        return cls(data['name'], data['package'],
+                   [FieldInfo.from_dict(field) for field in data['fields']], data['file_path'])
+
+
+class AnnotationInfo(Record):
+    """注解"""
+    __slots__ = ('name', 'elements')
+
+    def __init__(self, name: str, elements: Optional[Dict] = None):
+        self.name = _intern(name)
+        self.elements = elements or {}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'AnnotationInfo':
+        return cls(data['name'], data.get('elements'))
+
+
+class ParameterInfo(Record):
+    """方法参数"""
+    __slots__ = ('name', 'type', 'annotations')
+
+    def __init__(self, name: str, type: str, annotations: Tuple[AnnotationInfo, ...] = ()):
+        self.name = _intern(name)
+        self.type = _intern(type)
+        self.annotations = tuple(annotations)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ParameterInfo':
+        return cls(data['name'], data['type'],
+                   [AnnotationInfo.from_dict(ann) for ann in data.get('annotations', [])])
+
+
+class MethodInfo(Record):
+    """Mapper接口方法"""
+    __slots__ = ('name', 'return_type', 'parameters', 'annotations', 'documentation')
+
+    def __init__(self, name: str, return_type: str, parameters: Tuple[ParameterInfo, ...] = (),
+                 annotations: Tuple[AnnotationInfo, ...] = (), documentation: Optional[Dict] = None):
+        self.name = _intern(name)
+        self.return_type = _intern(return_type)
+        self.parameters = tuple(parameters)
+        self.annotations = tuple(annotations)
+        self.documentation = documentation or None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MethodInfo':
+        return cls(data['name'], data['return_type'],
+                   [ParameterInfo.from_dict(param) for param in data.get('parameters', [])],
+                   [AnnotationInfo.from_dict(ann) for ann in data.get('annotations', [])],
+                   data.get('documentation'))
+
+
+class InterfaceInfo(Record):
+    """Mapper接口"""
+    __slots__ = ('name', 'package', 'methods', 'file_path')
+
+    def __init__(self, name: str, package: str, methods: Tuple[MethodInfo, ...], file_path: str):
+        self.name = _intern(name)
+        self.package = _intern(package)
+        self.methods = tuple(methods)
+        self.file_path = file_path
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'InterfaceInfo':
+        return cls(data['name'], data['package'],
+                   [MethodInfo.from_dict(method) for method in data['methods']], data['file_path'])
+
+
+class SqlRefs(Record):
+    """Mapper XML中语句引用的表、字段、表别名和关联"""
+    __slots__ = ('tables', 'columns', 'aliases', 'joins')
+
+    def __init__(self, tables=(), columns=(), aliases=None, joins=()):
+        self.tables = tuple(_intern(t) for t in tables)
+        self.columns = tuple(_intern(c) for c in columns)
+        self.aliases = aliases or {}
+        self.joins = tuple(joins)
+
+
+class MapperInfo(Record):
+    """
+    Mapper XML
+
+    不在内存中保存XML全文，content 在访问时才从 file_path 读取
+    """
+    __slots__ = ('file_path', 'namespace', 'entity_type', 'type_refs', 'sql_refs',
+                 'entity_class', 'match_source', 'interface')
+
+    def __init__(self, file_path: str, namespace: str, entity_type: Optional[str],
+                 type_refs: Tuple[str, ...] = (), sql_refs: Optional[SqlRefs] = None):
+        self.file_path = file_path
+        self.namespace = _intern(namespace)
+        self.entity_type = _intern(entity_type)
+        self.type_refs = tuple(_intern(t) for t in type_refs)
+        self.sql_refs = sql_refs or SqlRefs()
+        # 以下字段在匹配阶段填充
+        self.entity_class = None
+        self.match_source = None
+        self.interface = None
+
+    @property
+    def content(self) -> str:
+        """按需从磁盘读取XML全文"""
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def __getitem__(self, key: str):
+        if key == 'content':
+            return self.content
+        return super().__getitem__(key)
@@ -0,0 +1,100 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class AnalysisReporter:
+    """
+    分析过程的分级事件/进度输出
+
+    - 计数器（counters）、各阶段耗时（timings）和错误列表（errors）始终记录，可通过summary()获取
+    - 终端输出按level过滤：quiet 不输出，info 只输出阶段和汇总信息，debug 输出每个文件/类的明细
+    - 可选的JSONL文件接收同样的结构化事件，便于后续分析
+    调用方在循环中输出明细前应先判断 debug_enabled，默认模式下每个文件没有额外开销。
+    """
+
+    LEVELS = {'quiet': 0, 'info': 1, 'debug': 2}
+
+    def __init__(self, level: str = 'info', jsonl_path: Optional[str] = None,
+                 jsonl_level: str = 'debug', stream=None):
+        """
+        :param level: 终端输出级别 quiet/info/debug
+        :param jsonl_path: JSONL事件文件路径（可选）
+        :param jsonl_level: 写入JSONL文件的事件级别
+        :param stream: 终端输出流，默认sys.stdout
+        """
+        self.level = self.LEVELS[level]
+        self.jsonl_level = self.LEVELS[jsonl_level] if jsonl_path else 0
+        self.stream = stream or sys.stdout
+        self._sink = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self.counters = {}
+        self.timings = {}
+        self.errors = []
+        # 任意输出端需要debug明细时为True，调用方据此决定是否构造明细事件
+        self.debug_enabled = max(self.level, self.jsonl_level) >= self.LEVELS['debug']
+
+    def count(self, name: str, value: int = 1):
+        """累加计数器"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def event(self, kind: str, message: str = '', level: str = 'debug', **data):
+        """
+        输出一个结构化事件
+        :param kind: 事件类型，如 file / phase / error / summary
+        :param message: 终端显示的文本
+        :param level: 事件级别 info/debug
+        :param data: 事件附带的结构化数据
+        """
+        severity = self.LEVELS[level]
+        if message and severity <= self.level:
+            print(message, file=self.stream)
+        if self._sink and severity <= self.jsonl_level:
+            record = {'ts': round(time.time(), 3), 'kind': kind, 'level': level}
+            if message:
+                record['message'] = message
+            record.update(data)
+            self._sink.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    def info(self, message: str, **data):
+        self.event('info', message, level='info', **data)
+
+    def debug(self, message: str, **data):
+        if self.debug_enabled:
+            self.event('debug', message, level='debug', **data)
+
+    def error(self, phase: str, message: str, file_path: Optional[str] = None):
+        """记录错误，错误总是计入errors列表"""
+        self.errors.append({'phase': phase, 'file_path': file_path, 'message': message})
+        self.count('errors')
+        text = f"{phase} 出错 {file_path}: {message}" if file_path else f"{phase} 出错: {message}"
+        self.event('error', text, level='info', phase=phase, file_path=file_path, error=message)
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个分析阶段的耗时"""
+        self.event('phase_start', f"\n=== {name} ===", level='info', phase=name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            self.event('phase_end', f"{name} 完成，耗时 {elapsed:.2f}s", level='info',
+                       phase=name, seconds=round(elapsed, 4))
+
+    def summary(self) -> Dict:
+        """返回计数器、耗时和错误的汇总"""
+        return {
+            'counters': dict(self.counters),
+            'timings': {name: round(seconds, 4) for name, seconds in self.timings.items()},
+            'errors': list(self.errors)
+        }
+
+    def close(self):
+        """输出汇总事件并关闭JSONL文件"""
+        if self._sink:
+            self.event('summary', level='info', **self.summary())
+            self._sink.close()
+            self._sink = None
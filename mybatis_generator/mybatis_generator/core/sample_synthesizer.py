@@ -0,0 +1,228 @@
+import hashlib
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .reporter import AnalysisReporter
+from .templates import (batch_delete, batch_insert, batch_update_field, count_by_condition, delete_by_id,
+                        insert_one, select_by_field_in, select_by_id, select_by_range, select_join, select_list,
+                        select_page, update_field_by_id, upsert)
+
+# 每种操作的需求描述，第一条与原有训练样本（及TemplateEngine可识别的描述）一致，其余为中英文改写
+DESCRIPTIONS = {
+    'update_by_id': [
+        "生成根据id更新{entity}的{field}的sql",
+        "根据主键修改{entity}的{field}",
+        "Generate SQL to update {field} of {entity} by id",
+    ],
+    'batch_update': [
+        "生成批量更新{entity}的{field}的sql",
+        "按id列表批量修改{entity}的{field}",
+        "Generate SQL to batch update {field} of {entity} for a list of ids",
+    ],
+    'select_by_id': [
+        "生成根据id查询{entity}详情的sql",
+        "根据主键查询{entity}",
+        "Generate SQL to select {entity} by id",
+    ],
+    'select_list': [
+        "生成查询{entity}列表的sql，支持多个字段查询条件",
+        "按条件查询{entity}列表",
+        "Generate SQL to list {entity} filtered by any of its fields",
+    ],
+    'select_page': [
+        "生成分页查询{entity}列表的sql",
+        "分页查询{entity}，支持多个字段查询条件",
+        "Generate a paginated query for {entity}",
+    ],
+    'count': [
+        "生成统计{entity}数量的sql",
+        "按条件统计{entity}的记录数",
+        "Generate SQL to count {entity} records matching conditions",
+    ],
+    'select_by_range': [
+        "生成按{field}范围查询{entity}的sql",
+        "查询{field}在指定区间内的{entity}",
+        "Generate SQL to select {entity} where {field} is within a range",
+    ],
+    'select_in': [
+        "生成根据多个{field}查询{entity}的sql",
+        "按{field}列表查询{entity}",
+        "Generate SQL to select {entity} whose {field} is in a list",
+    ],
+    'select_join': [
+        "生成关联{join}查询{entity}的sql",
+        "按{join}的字段查询{entity}",
+        "Generate SQL to select {entity} joined with {join}",
+    ],
+    'insert': [
+        "生成插入{entity}的sql",
+        "新增一条{entity}记录",
+        "Generate SQL to insert a {entity}",
+    ],
+    'batch_insert': [
+        "生成批量插入{entity}的sql",
+        "批量新增{entity}",
+        "Generate SQL to batch insert {entity} records",
+    ],
+    'upsert': [
+        "生成插入或更新{entity}的sql",
+        "新增{entity}，主键冲突时更新",
+        "Generate upsert SQL for {entity}",
+    ],
+    'delete_by_id': [
+        "生成根据id删除{entity}的sql",
+        "根据主键删除{entity}",
+        "Generate SQL to delete {entity} by id",
+    ],
+    'batch_delete': [
+        "生成批量删除{entity}的sql",
+        "按id列表批量删除{entity}",
+        "Generate SQL to delete {entity} records by a list of ids",
+    ],
+}
+
+# 适合范围查询的字段类型
+RANGE_TYPES = {'Date', 'LocalDate', 'LocalDateTime', 'Timestamp', 'Instant', 'BigDecimal', 'Double', 'double',
+               'Float', 'float'}
+# 适合IN查询的字段名后缀（另外xxxId字段也适合）
+IN_SUFFIXES = ('status', 'type', 'code')
+
+_NORMALIZE_PATTERN = re.compile(r'[\W_]+')
+
+
+def sample_fingerprint(sample: Dict) -> bytes:
+    """忽略大小写、空白和标点后的样本哈希，只在这些方面不同的样本视为重复"""
+    description = _NORMALIZE_PATTERN.sub('', sample['description'].lower())
+    xml = _NORMALIZE_PATTERN.sub('', sample['xml'].lower())
+    return hashlib.sha1(f"{description}\0{xml}".encode('utf-8')).digest()
+
+
+def _describe(rng: random.Random, operation: str, paraphrases: int, **names) -> List[str]:
+    """标准描述加上随机选取的paraphrases-1条改写"""
+    templates = DESCRIPTIONS[operation]
+    chosen = [templates[0]] + rng.sample(templates[1:], min(len(templates) - 1, max(0, paraphrases - 1)))
+    return [template.format(**names) for template in chosen]
+
+
+def synthesize_entity_samples(entity_name: str, table_name: str, fields: List[Dict],
+                              join_targets: Optional[Dict[str, Tuple[str, str, List[Dict]]]] = None,
+                              paraphrases: int = 1, seed: int = 0) -> List[Dict]:
+    """
+    为一个实体类合成训练样本
+    :param entity_name: 实体类名
+    :param table_name: 表名
+    :param fields: 字段列表
+    :param join_targets: 外键字段 -> (关联实体类名, 关联表名, 关联实体类字段)
+    :param paraphrases: 每条语句使用的描述数（1为只使用标准描述）
+    :param seed: 随机种子，同一实体类在不同进程中选取的改写相同
+    :return: [{'description', 'xml'}]
+    """
+    rng = random.Random(f"{seed}:{entity_name}")
+    statements = []
+
+    def add(operation: str, xml: str, **names):
+        for description in _describe(rng, operation, paraphrases, entity=entity_name, **names):
+            statements.append({"description": description, "xml": xml})
+
+    for field in fields:
+        field_name = field['name']
+        if field_name == 'id':
+            continue
+        if field_name.lower().endswith('status'):
+            add('update_by_id', update_field_by_id(table_name, field_name), field=field_name)
+        add('batch_update', batch_update_field(table_name, field_name), field=field_name)
+        if field['type'] in RANGE_TYPES:
+            add('select_by_range', select_by_range(table_name, field_name), field=field_name)
+        if field_name.lower().endswith(IN_SUFFIXES) or field_name.endswith('Id'):
+            add('select_in', select_by_field_in(table_name, field_name), field=field_name)
+
+    add('select_by_id', select_by_id(table_name))
+    add('select_list', select_list(table_name, fields))
+    add('select_page', select_page(table_name, fields))
+    add('count', count_by_condition(table_name, fields))
+    add('insert', insert_one(table_name, fields))
+    add('batch_insert', batch_insert(table_name, fields))
+    add('upsert', upsert(table_name, fields))
+    add('delete_by_id', delete_by_id(table_name))
+    add('batch_delete', batch_delete(table_name))
+
+    for foreign_key, (join_entity, join_table, join_fields) in (join_targets or {}).items():
+        add('select_join', select_join(table_name, join_table, foreign_key, join_fields), join=join_entity)
+    return statements
+
+
+def _synthesize_task(task: Tuple) -> List[Dict]:
+    """进程池任务，参数只包含可序列化的基本类型"""
+    return synthesize_entity_samples(*task)
+
+
+class SampleSynthesizer:
+    """
+    并行合成训练样本并去重
+
+    各实体类的样本在进程池中并行生成（workers > 1 时），按输入顺序返回；
+    忽略大小写、空白和标点后相同的样本只保留第一条
+    """
+
+    def __init__(self, workers: int = 1, paraphrases: int = 1, seed: int = 0,
+                 reporter: Optional[AnalysisReporter] = None):
+        """
+        :param workers: 进程数
+        :param paraphrases: 每条语句使用的描述数，大于1时加入中英文改写
+        :param seed: 选取改写的随机种子
+        :param reporter: 统计输出（可选）
+        """
+        self.workers = max(1, workers)
+        self.paraphrases = paraphrases
+        self.seed = seed
+        self.reporter = reporter or AnalysisReporter(level='quiet')
+        self._seen = set()
+
+    @staticmethod
+    def _join_targets(fields: List[Dict], entities: Dict[str, Tuple[str, List[Dict]]]) -> Dict:
+        """userId这样的字段且存在User实体类时，视为关联User的外键"""
+        targets = {}
+        for field in fields:
+            field_name = field['name']
+            if field_name.endswith('Id') and len(field_name) > 2:
+                join_entity = field_name[0].upper() + field_name[1:-2]
+                if join_entity in entities:
+                    join_table, join_fields = entities[join_entity]
+                    targets[field_name] = (join_entity, join_table, join_fields)
+        return targets
+
+    def synthesize(self, entities: Iterable[Tuple[str, str, List[Dict]]]
+                   ) -> Iterator[Tuple[str, str, List[Dict], List[Dict]]]:
+        """
+        :param entities: (实体类名, 表名, 字段列表)
+        :return: 逐个实体类返回 (实体类名, 表名, 字段列表, 去重后的样本)
+        """
+        entities = list(entities)
+        by_name = {name: (table_name, fields) for name, table_name, fields in entities}
+        tasks = [(name, table_name, fields, self._join_targets(fields, by_name), self.paraphrases, self.seed)
+                 for name, table_name, fields in entities]
+
+        if self.workers > 1 and len(tasks) > 1:
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                yield from self._dedup(entities, executor.map(_synthesize_task, tasks, chunksize=chunksize))
+        else:
+            yield from self._dedup(entities, map(_synthesize_task, tasks))
+
+    def dedup(self, samples: Iterable[Dict]) -> List[Dict]:
+        """去掉与之前返回过的样本重复的样本"""
+        unique = []
+        for sample in samples:
+            fingerprint = sample_fingerprint(sample)
+            if fingerprint in self._seen:
+                self.reporter.count('duplicate_samples')
+                continue
+            self._seen.add(fingerprint)
+            unique.append(sample)
+        return unique
+
+    def _dedup(self, entities: List[Tuple[str, str, List[Dict]]], results: Iterable[List[Dict]]) -> Iterator:
+        for (name, table_name, fields), samples in zip(entities, results):
+            yield name, table_name, fields, self.dedup(samples)
@@ -0,0 +1,96 @@
+import json
+import os
+from typing import Dict, Optional
+
+from .io_utils import atomic_write_text
+
+
+class ScanCache:
+    """
+    项目扫描的持久化解析缓存
+
+    以文件路径为键，记录文件的mtime、大小、内容哈希和扫描根目录，以及从该文件中解析出的
+    entity_classes / mapper_interfaces 记录。再次扫描时只有发生变化的文件才需要重新解析；
+    扫描根目录变化时（实体类的包路径由它推导）同样重新解析。
+    """
+
+    VERSION = 2
+
+    def __init__(self, cache_path: str):
+        """
+        :param cache_path: 缓存文件路径（JSON格式）
+        """
+        self.cache_path = cache_path
+        self.entries = {}
+        self._seen = set()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        """从磁盘加载缓存，版本不一致或文件损坏时丢弃旧缓存"""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == self.VERSION:
+            self.entries = data.get('entries', {})
+
+    def begin(self):
+        """开始一次扫描，save()时清理本次扫描中未出现的文件"""
+        self._seen = set()
+
+    @staticmethod
+    def _key(kind: str, file_path: str) -> str:
+        return f"{kind}:{os.path.abspath(file_path)}"
+
+    def lookup(self, kind: str, file_path: str, stat: os.stat_result, root: str = '') -> Optional[Dict]:
+        """
+        根据文件的mtime、大小和扫描根目录查找缓存
+        :return: 命中时返回缓存条目，否则返回None
+        """
+        key = self._key(kind, file_path)
+        self._seen.add(key)
+        entry = self.entries.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size and \
+                entry.get('root', '') == root:
+            return entry
+        return None
+
+    def known_digest(self, kind: str, file_path: str, root: str = '') -> Optional[str]:
+        """返回上次记录的内容哈希，用于mtime变化但内容未变时跳过解析；扫描根目录不同时返回None"""
+        entry = self.entries.get(self._key(kind, file_path))
+        return entry['sha1'] if entry and entry.get('root', '') == root else None
+
+    def get(self, kind: str, file_path: str) -> Optional[Dict]:
+        return self.entries.get(self._key(kind, file_path))
+
+    def store(self, kind: str, file_path: str, mtime_ns: int, size: int, sha1: str, records: Dict,
+              root: str = ''):
+        """记录文件的解析结果"""
+        key = self._key(kind, file_path)
+        self._seen.add(key)
+        self.entries[key] = {
+            'mtime_ns': mtime_ns,
+            'size': size,
+            'sha1': sha1,
+            'root': root,
+            'records': records
+        }
+        self._dirty = True
+
+    def save(self):
+        """保存缓存，并清理本次扫描中已不存在的文件"""
+        stale = [key for key in self.entries if key not in self._seen]
+        for key in stale:
+            del self.entries[key]
+        if not (self._dirty or stale):
+            return
+        atomic_write_text(
+            self.cache_path,
+            json.dumps({'version': self.VERSION, 'entries': self.entries}, ensure_ascii=False,
+                       default=lambda record: record.to_dict())
+        )
+        self._dirty = False
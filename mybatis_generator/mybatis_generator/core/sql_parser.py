@@ -0,0 +1,190 @@
+import re
+from typing import Dict, List
+
+# Mapper XML中包含SQL的语句元素
+STATEMENT_TAGS = ('select', 'insert', 'update', 'delete', 'sql')
+
+_TOKEN_RE = re.compile(r"""
+    (?P<param>[#$]\{[^}]*\})                 # MyBatis参数 #{id} / ${column}
+  | (?P<string>'(?:[^'\\]|\\.|'')*')         # 字符串常量
+  | (?P<quoted>`[^`]+`|"[^"]+"|\[[^\]]+\])   # 带引号的标识符
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><=|>=|<>|!=|[=<>(),.;*+\-/%])
+""", re.VERBOSE)
+
+_KEYWORDS = {
+    'select', 'distinct', 'from', 'where', 'and', 'or', 'not', 'in', 'is', 'null', 'like',
+    'between', 'exists', 'as', 'on', 'using', 'join', 'inner', 'left', 'right', 'full',
+    'outer', 'cross', 'natural', 'straight_join', 'insert', 'into', 'values', 'value',
+    'update', 'set', 'delete', 'replace', 'ignore', 'duplicate', 'key', 'group', 'order',
+    'by', 'having', 'limit', 'offset', 'asc', 'desc', 'union', 'all', 'case', 'when',
+    'then', 'else', 'end', 'true', 'false', 'interval', 'for', 'lock', 'share', 'mode',
+    'escape', 'regexp', 'binary', 'with', 'recursive', 'low_priority', 'high_priority',
+    'sql_calc_found_rows', 'dual', 'if', 'separator',
+}
+
+# 关键字之后紧跟的是表名
+_TABLE_KEYWORDS = {'from', 'join', 'update', 'into', 'straight_join'}
+_JOIN_MODIFIERS = {'inner', 'left', 'right', 'full', 'outer', 'cross', 'natural'}
+# 这些关键字会切换当前子句
+_CLAUSE_KEYWORDS = {'select', 'from', 'where', 'set', 'on', 'using', 'values', 'value', 'group',
+                    'order', 'having', 'limit', 'update', 'into', 'join', 'union', 'duplicate'}
+# 常被用作列名的关键字，出现在标识符位置时按列名处理
+_SOFT_KEYWORDS = {'key', 'value', 'mode', 'end', 'desc', 'asc', 'offset', 'share', 'lock', 'replace', 'ignore',
+                  'separator', 'interval', 'binary', 'escape'}
+# 之后是标识符（列名）的位置
+_IDENT_AFTER = {('op', ','), ('op', '('), ('keyword', 'select'), ('keyword', 'distinct'), ('keyword', 'by'),
+                ('keyword', 'set'), ('keyword', 'where'), ('keyword', 'and'), ('keyword', 'or'), ('keyword', 'on')}
+# 之前是标识符（列名）的运算符和关键字
+_IDENT_BEFORE = {'=', '<', '>', '<=', '>=', '<>', '!=', 'is', 'like', 'between', 'not', 'regexp'}
+
+
+def _is_qualifier(tokens: List[tuple]) -> bool:
+    """前面是 ident . ，当前词是限定名的一段"""
+    return len(tokens) >= 2 and tokens[-1] == ('op', '.') and tokens[-2][0] == 'ident'
+
+
+def _tokenize(sql: str) -> List[tuple]:
+    """
+    把SQL切分为 (类型, 值) 序列，类型为 ident / keyword / op / literal
+    带限定名的标识符（如 u.user_name、u.*）合并为一个ident，值为各段组成的元组；
+    key/value/end/desc 等常用作列名的关键字在标识符位置（限定名中、逗号或select/where之后、比较运算符之前）按ident处理
+    """
+    matches = list(_TOKEN_RE.finditer(sql))
+    tokens = []
+    for index, match in enumerate(matches):
+        kind = match.lastgroup
+        value = match.group()
+        if kind in ('param', 'string', 'number'):
+            tokens.append(('literal', value))
+        elif kind == 'op':
+            if value == '*' and _is_qualifier(tokens):
+                tokens.pop()
+                tokens[-1] = ('ident', tokens[-1][1] + ('*',))
+            else:
+                tokens.append(('op', value))
+        else:
+            if kind == 'quoted':
+                value = value[1:-1]
+            elif value.lower() in _KEYWORDS and not _is_qualifier(tokens):
+                following = matches[index + 1].group().lower() if index + 1 < len(matches) else None
+                identifier = value.lower() in _SOFT_KEYWORDS and (
+                    (tokens and tokens[-1] in _IDENT_AFTER) or following in _IDENT_BEFORE)
+                if not identifier:
+                    tokens.append(('keyword', value.lower()))
+                    continue
+            # 合并 a.b 形式的限定名
+            if _is_qualifier(tokens):
+                tokens.pop()
+                tokens[-1] = ('ident', tokens[-1][1] + (value,))
+            else:
+                tokens.append(('ident', (value,)))
+    return tokens
+
+
+def extract_sql_refs(sql: str) -> Dict:
+    """
+    单遍扫描SQL，提取引用的表、字段、表别名和关联（join）
+    :param sql: SQL文本（MyBatis动态标签已展开为纯文本）
+    :return: {'tables': [...], 'columns': [...], 'aliases': {别名: 表名}, 'joins': [{'type', 'table'}]}
+    """
+    tables, columns, aliases, joins = {}, {}, {}, []
+    tokens = _tokenize(sql)
+    clause = None
+    expect_table = False
+    join_type = []
+    last_table = None  # 刚读取的表名，其后的标识符是别名
+    prev = None
+    for i, (kind, value) in enumerate(tokens):
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else (None, None)
+        if kind == 'keyword':
+            if value in _JOIN_MODIFIERS:
+                join_type.append(value.upper())
+            if value == 'update' and prev == ('keyword', 'key'):
+                # ON DUPLICATE KEY UPDATE 之后是赋值列表
+                clause, expect_table = 'set', False
+            elif value in _CLAUSE_KEYWORDS:
+                clause = value
+                expect_table = value in _TABLE_KEYWORDS
+                if value != 'join':
+                    join_type = []
+            if value != 'as':
+                last_table = None
+        elif kind == 'op':
+            if value == ',' and clause in ('from', 'update'):
+                expect_table = True
+            elif value == '(':
+                expect_table = False
+            if value != '.':
+                last_table = None
+        elif kind == 'ident':
+            name = value[-1]
+            if expect_table:
+                table = name
+                tables[table] = None
+                if clause == 'join':
+                    joins.append({'type': ' '.join(join_type) or 'INNER', 'table': table})
+                    join_type = []
+                expect_table = False
+                last_table = table
+            elif last_table is not None:
+                # 表名后面的 AS alias / alias
+                aliases[name] = last_table
+                last_table = None
+            elif nxt == ('op', '(') and len(value) == 1:
+                pass  # 函数调用
+            elif prev is not None and (prev[0] == 'ident' or prev == ('keyword', 'as') or prev == ('op', ')')):
+                pass  # 字段别名，如 user_name AS name / count(*) total
+            elif name != '*':
+                columns[name] = None
+        prev = (kind, value)
+    return {'tables': list(tables), 'columns': list(columns), 'aliases': aliases, 'joins': joins}
+
+
+def statement_text(element) -> str:
+    """
+    把语句元素（含<where>/<set>/<trim>/<if>/<foreach>等动态标签）还原为纯SQL文本
+    动态标签隐含的关键字（WHERE、SET、trim的prefix）会被补回，<include>只保留引用
+    """
+    parts = []
+
+    def walk(node):
+        tag = node.tag
+        if tag == 'where':
+            parts.append(' WHERE ')
+        elif tag == 'set':
+            parts.append(' SET ')
+        elif tag == 'trim' and node.get('prefix'):
+            parts.append(f" {node.get('prefix')} ")
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+        parts.append(' ')
+
+    walk(element)
+    return ''.join(parts)
+
+
+def extract_mapper_refs(root) -> Dict:
+    """
+    汇总一个Mapper XML中所有语句引用的表、字段、别名和关联，以及resultMap中声明的column
+    :param root: Mapper XML的根元素
+    """
+    # 用dict保持出现顺序并去重
+    tables, columns, aliases, joins = {}, {}, {}, []
+    for element in root:
+        if element.tag in STATEMENT_TAGS:
+            refs = extract_sql_refs(statement_text(element))
+            tables.update(dict.fromkeys(refs['tables']))
+            columns.update(dict.fromkeys(refs['columns']))
+            aliases.update(refs['aliases'])
+            joins.extend(refs['joins'])
+        elif element.tag == 'resultMap':
+            for mapping in element.iter():
+                if mapping.get('column'):
+                    columns[mapping.get('column')] = None
+    return {'tables': list(tables), 'columns': list(columns), 'aliases': aliases, 'joins': joins}
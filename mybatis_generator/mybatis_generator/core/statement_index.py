@@ -0,0 +1,319 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from xml.etree import ElementTree as ET
+
+from .io_utils import atomic_write_text, file_digest
+from .reporter import AnalysisReporter
+from .sql_parser import STATEMENT_TAGS
+from .statement_miner import element_to_xml
+
+# 建立索引的元素：各类语句、<sql>片段和resultMap
+INDEXED_TAGS = STATEMENT_TAGS + ('resultMap',)
+
+_WORD_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9_]*')
+_PART_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+# 汉字、标识符中的每个驼峰/下划线分段、数字和标点各计一个token
+_TOKEN_ESTIMATE_PATTERN = re.compile(r'[\u3400-\u9fff]|[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+|[^\w\s]|_')
+
+# Java/SQL/MyBatis中到处出现、对区分语句没有帮助的词
+STOP_WORDS = {
+    'public', 'private', 'protected', 'class', 'import', 'package', 'static', 'final', 'void', 'return',
+    'new', 'this', 'extends', 'implements', 'interface', 'java', 'lang', 'util', 'lombok',
+    'select', 'from', 'where', 'and', 'or', 'insert', 'into', 'values', 'update', 'set', 'delete',
+    'by', 'as', 'on', 'null', 'not', 'in', 'is', 'like', 'limit',
+    'mapper', 'namespace', 'column', 'property', 'jdbc', 'test', 'if', 'foreach', 'collection', 'separator',
+    'open', 'close', 'include', 'refid', 'sql', 'trim', 'prefix', 'suffix', 'overrides', 'choose', 'when',
+    'otherwise', 'parameter', 'xml', 'version', 'encoding', 'utf', 'lt', 'gt', 'amp',
+}
+
+
+def index_terms(text: str) -> List[str]:
+    """
+    把Java源码、需求或Mapper XML切分为检索词
+    标识符按驼峰和下划线拆分并转为小写，同时保留拼接后的整词，userName 与 user_name 得到相同的词
+    """
+    terms = []
+    for word in _WORD_PATTERN.findall(text):
+        parts = [part.lower() for part in _PART_PATTERN.findall(word)]
+        terms.extend(part for part in parts if len(part) > 1 and part not in STOP_WORDS)
+        if len(parts) > 1:
+            joined = ''.join(parts)
+            if joined not in STOP_WORDS:
+                terms.append(joined)
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数，不需要加载分词器
+    对代码和XML与BPE分词的结果接近，用于控制提示的长度
+    """
+    return len(_TOKEN_ESTIMATE_PATTERN.findall(text))
+
+
+class StatementIndex:
+    """
+    项目已有Mapper语句的BM25检索索引
+
+    为每个Mapper XML中的语句、<sql>片段和resultMap建立倒排索引，按实体类源码或需求检索最相似的语句，
+    作为示例注入生成提示，让模型沿用项目的表名前缀、Base_Column_List和resultMap命名。
+    索引以文件为单位增量更新：mtime和大小未变、或内容哈希未变的文件不重新解析；
+    设置index_path时索引保存为JSON，下次启动直接加载，不需要解析XML
+    """
+
+    VERSION = 1
+
+    def __init__(self, index_path: Optional[str] = None, k1: float = 1.2, b: float = 0.75,
+                 reporter: Optional[AnalysisReporter] = None, max_df_ratio: float = 0.5):
+        """
+        :param index_path: 索引文件路径（可选），设置后update()结束时自动保存
+        :param k1: BM25词频饱和参数
+        :param b: BM25文档长度归一化参数
+        :param max_df_ratio: 出现在超过该比例的语句中的常见词只给其它词检索到的候选加分，不单独引入候选
+        :param reporter: 统计输出（可选）
+        """
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.reporter = reporter or AnalysisReporter(level='quiet')
+        self.files = {}
+        self._docs = {}
+        self._postings = {}
+        self._next_id = 0
+        self._total_length = 0
+        self._weights = None
+        self._max_weights = None
+        if index_path:
+            self._load()
+
+    @classmethod
+    def from_analyzer(cls, analyzer, index_path: Optional[str] = None) -> 'StatementIndex':
+        """使用已完成analyze()的ProjectAnalyzer解析出的Mapper XML构建"""
+        index = cls(index_path, reporter=analyzer.reporter)
+        index.update(mapper_info.file_path for mapper_info in analyzer.existing_mappers.values())
+        return index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _load(self):
+        """加载索引文件，版本不一致或文件损坏时丢弃"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != self.VERSION:
+            return
+        for file_path, entry in data.get('files', {}).items():
+            self._add_file(file_path, entry)
+
+    def save(self):
+        """保存索引（原子写入）"""
+        # doc_ids只在本进程内有效，加载时重新分配
+        files = {path: {key: value for key, value in entry.items() if key != 'doc_ids'}
+                 for path, entry in self.files.items()}
+        atomic_write_text(self.index_path, json.dumps({'version': self.VERSION, 'files': files},
+                                                      ensure_ascii=False))
+
+    def scan_dir(self, mapper_dir: str) -> Dict[str, int]:
+        """索引目录（含子目录）下的所有Mapper XML，目录中已删除的文件从索引中移除"""
+        return self.update(
+            os.path.join(root, file)
+            for root, _, files in os.walk(mapper_dir)
+            for file in files if file.endswith('.xml')
+        )
+
+    def update(self, mapper_files: Iterable[str]) -> Dict[str, int]:
+        """
+        增量更新索引，mapper_files应为项目当前全部的Mapper XML，不在其中的文件从索引中移除
+        :param mapper_files: Mapper XML路径
+        :return: {'added', 'updated', 'removed', 'unchanged'} 文件数
+        """
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        seen = set()
+        touched = False
+        for file_path in mapper_files:
+            file_path = os.path.abspath(file_path)
+            seen.add(file_path)
+            try:
+                stat = os.stat(file_path)
+                entry = self.files.get(file_path)
+                if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                    stats['unchanged'] += 1
+                    continue
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+            except OSError as e:
+                self.reporter.error('索引Mapper XML', str(e), file_path)
+                continue
+            sha1 = file_digest(raw)
+            if entry and entry['sha1'] == sha1:
+                # 只是mtime变了
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                touched = True
+                stats['unchanged'] += 1
+                continue
+            if entry:
+                self._remove_file(file_path)
+                stats['updated'] += 1
+            else:
+                stats['added'] += 1
+            self._add_file(file_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': sha1,
+                                       'docs': self._parse(raw, file_path)})
+        for file_path in [path for path in self.files if path not in seen]:
+            self._remove_file(file_path)
+            stats['removed'] += 1
+
+        for name, value in stats.items():
+            self.reporter.count(f'index_files_{name}', value)
+        self.reporter.info(f"语句索引: {len(self._docs)}条，新增文件{stats['added']}，更新{stats['updated']}，"
+                           f"删除{stats['removed']}，未变化{stats['unchanged']}", documents=len(self._docs), **stats)
+        if self.index_path and (touched or stats['added'] or stats['updated'] or stats['removed']):
+            self.save()
+        return stats
+
+    def _parse(self, raw: bytes, file_path: str) -> List[Dict]:
+        """提取一个Mapper XML中要索引的元素"""
+        try:
+            root = ET.fromstring(raw)
+        except ET.ParseError as e:
+            self.reporter.error('索引Mapper XML', str(e), file_path)
+            return []
+        namespace = root.get('namespace') or ''
+        interface_name = namespace.rsplit('.', 1)[-1]
+        docs = []
+        for element in root:
+            if element.tag not in INDEXED_TAGS or not element.get('id'):
+                continue
+            xml = element_to_xml(element)
+            terms = Counter(index_terms(f"{interface_name} {xml}"))
+            docs.append({
+                'namespace': namespace,
+                'id': element.get('id'),
+                'tag': element.tag,
+                'xml': xml,
+                'tokens': estimate_tokens(xml),
+                'terms': dict(terms),
+                'length': sum(terms.values()),
+            })
+        return docs
+
+    def _add_file(self, file_path: str, entry: Dict):
+        entry['doc_ids'] = []
+        for doc in entry['docs']:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._docs[doc_id] = doc
+            entry['doc_ids'].append(doc_id)
+            self._total_length += doc['length']
+            for term, tf in doc['terms'].items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+        self.files[file_path] = entry
+        self._weights = None
+
+    def _remove_file(self, file_path: str):
+        entry = self.files.pop(file_path)
+        for doc_id in entry['doc_ids']:
+            doc = self._docs.pop(doc_id)
+            self._total_length -= doc['length']
+            for term in doc['terms']:
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+        self._weights = None
+
+    def _term_weights(self) -> Dict[str, Dict[int, float]]:
+        """
+        每个词在各文档中的BM25得分（idf * 词频项），索引变化后第一次检索时重新计算，
+        检索时只需把各检索词的得分相加
+        """
+        if self._weights is None:
+            total = len(self._docs)
+            average = self._total_length / total if total else 1.0
+            norms = {doc_id: self.k1 * (1 - self.b + self.b * doc['length'] / average)
+                     for doc_id, doc in self._docs.items()}
+            self._weights = {}
+            for term, postings in self._postings.items():
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                self._weights[term] = {doc_id: idf * tf * (self.k1 + 1) / (tf + norms[doc_id])
+                                       for doc_id, tf in postings.items()}
+            # 每个词在单个文档中的最高得分，检索时用来提前排除进不了前top_k的文档
+            self._max_weights = {term: max(postings.values()) for term, postings in self._weights.items()}
+        return self._weights
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict]:
+        """
+        检索与query最相似的语句
+        :param query: 实体类源码或自然语言需求
+        :param top_k: 返回的条数
+        :return: 按相似度从高到低的 [{'namespace', 'id', 'tag', 'xml', 'tokens', 'score'}]
+        """
+        if not self._docs:
+            return []
+        weights = self._term_weights()
+        # 从文档最少（idf最高）的词开始累加，出现在大多数语句中的常见词放在最后
+        terms = sorted((term for term in set(index_terms(query)) if term in weights), key=lambda t: len(weights[t]))
+        if not terms:
+            return []
+        # remaining[i]: 第i个及之后的词最多能给一个文档带来的得分
+        remaining = [0.0] * (len(terms) + 1)
+        for i in range(len(terms) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + self._max_weights[terms[i]]
+        scores = {}
+        pruned = False
+        for i, term in enumerate(terms):
+            postings = weights[term]
+            if len(scores) >= top_k:
+                # MaxScore：第top_k名的得分超过剩余词的得分上限时，还没出现的文档不可能进入前top_k；
+                # 加上剩余词的上限也达不到第top_k名的候选直接丢弃
+                kth = heapq.nlargest(top_k, scores.values())[-1]
+                pruned = pruned or kth > remaining[i]
+                scores = {doc_id: score for doc_id, score in scores.items() if score + remaining[i] >= kth}
+            if not pruned and scores:
+                # 常见词（如id、status）的idf接近0，只给已有候选加分，不遍历其整个得分表引入新候选
+                pruned = len(postings) > self.max_df_ratio * len(self._docs)
+            if not pruned:
+                for doc_id, weight in postings.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight
+            elif len(postings) < len(scores):
+                for doc_id, weight in postings.items():
+                    if doc_id in scores:
+                        scores[doc_id] += weight
+            else:
+                # 只给已有的候选累加，不遍历常见词的整个得分表
+                for doc_id in scores:
+                    weight = postings.get(doc_id)
+                    if weight is not None:
+                        scores[doc_id] += weight
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [dict(self._doc_summary(self._docs[doc_id]), score=round(score, 4)) for doc_id, score in best]
+
+    @staticmethod
+    def _doc_summary(doc: Dict) -> Dict:
+        return {key: doc[key] for key in ('namespace', 'id', 'tag', 'xml', 'tokens')}
+
+    def retrieve_examples(self, query: str, top_k: int = 3, max_tokens: int = 192) -> List[str]:
+        """
+        取最相似的top_k条语句作为提示中的示例，总长度（估算的token数）不超过max_tokens
+        放不下的语句跳过，继续尝试相似度更低但更短的语句
+        :return: 语句XML列表
+        """
+        examples, used = [], 0
+        for hit in self.search(query, top_k * 2):
+            if hit['tokens'] + used > max_tokens:
+                continue
+            examples.append(hit['xml'])
+            used += hit['tokens']
+            if len(examples) == top_k:
+                break
+        return examples
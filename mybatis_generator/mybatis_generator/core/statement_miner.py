@@ -0,0 +1,87 @@
+import re
+from typing import Dict, Iterator, List, Optional
+from xml.etree import ElementTree as ET
+
+# 作为训练样本输出的语句标签（<sql>片段只作为被引用的上下文）
+MINED_TAGS = ('select', 'insert', 'update', 'delete')
+
+_INDENT_PATTERN = re.compile(r'^[ \t]*')
+
+
+def element_to_xml(element, indent: str = '    ') -> str:
+    """序列化语句元素，缩进统一为与模板相同的4空格"""
+    tail = element.tail
+    element.tail = None
+    try:
+        lines = ET.tostring(element, encoding='unicode').strip().split('\n')
+    finally:
+        element.tail = tail
+    # 结束标签保留了原文件中开始标签的缩进，其余各行去掉同样的缩进
+    base = len(_INDENT_PATTERN.match(lines[-1]).group()) if len(lines) > 1 else 0
+    body = [lines[0]] + [line[min(base, len(_INDENT_PATTERN.match(line).group())):] for line in lines[1:]]
+    return '\n'.join(indent + line if line.strip() else '' for line in body)
+
+
+def _included_fragments(element, fragments: Dict[str, object], seen: Optional[set] = None) -> List[str]:
+    """语句（含嵌套<include>）引用的本文件<sql>片段id，按出现顺序"""
+    seen = seen if seen is not None else set()
+    refids = []
+    for include in element.iter('include'):
+        refid = include.get('refid', '')
+        # 同一namespace内也可能写成 namespace.id
+        refid = refid if refid in fragments else refid.rsplit('.', 1)[-1]
+        if refid in fragments and refid not in seen:
+            seen.add(refid)
+            refids.append(refid)
+            refids.extend(_included_fragments(fragments[refid], fragments, seen))
+    return refids
+
+
+def _format_signature(method) -> str:
+    params = ', '.join(f"{param['type']} {param['name']}" for param in method['parameters'])
+    return f"{method['return_type']} {method['name']}({params})"
+
+
+def _describe(interface_name: str, statement_id: str, tag: str, method, fragments: List[str]) -> str:
+    """由接口方法的JavaDoc、签名和引用的sql片段组成需求描述"""
+    lines = [f"生成{interface_name}.{statement_id}方法的sql"]
+    documentation = method['documentation'] if method is not None else None
+    if documentation and documentation.get('description'):
+        lines[0] += f": {' '.join(documentation['description'].split())}"
+    if method is not None:
+        lines.append(f"方法签名: {_format_signature(method)}")
+        params = (documentation or {}).get('params') or {}
+        for name, description in params.items():
+            lines.append(f"参数 {name}: {' '.join(description.split())}")
+        if documentation and documentation.get('return'):
+            lines.append(f"返回: {' '.join(documentation['return'].split())}")
+    else:
+        lines[0] = f"生成{interface_name}中id为{statement_id}的{tag}语句"
+    if fragments:
+        lines.append(f"可引用的sql片段: {', '.join(fragments)}")
+    return '\n'.join(lines)
+
+
+def mine_mapper_statements(file_path: str, namespace: str, interface=None) -> Iterator[Dict]:
+    """
+    从一个Mapper XML中提取真实的语句作为训练样本
+    需求描述由对应Mapper接口方法的JavaDoc、签名（参数、返回类型）和语句引用的<sql>片段组成
+    :param file_path: Mapper XML路径
+    :param namespace: Mapper的namespace，用于生成描述中的接口名
+    :param interface: 对应的Mapper接口（InterfaceInfo，可选）
+    :return: 逐条返回 {'description', 'xml'}
+    """
+    root = ET.parse(file_path).getroot()
+    fragments = {element.get('id'): element for element in root if element.tag == 'sql' and element.get('id')}
+    methods = {method['name']: method for method in interface['methods']} if interface else {}
+    interface_name = namespace.rsplit('.', 1)[-1] if namespace else ''
+
+    for element in root:
+        if element.tag not in MINED_TAGS or not element.get('id'):
+            continue
+        statement_id = element.get('id')
+        refids = _included_fragments(element, fragments)
+        yield {
+            "description": _describe(interface_name, statement_id, element.tag, methods.get(statement_id), refids),
+            "xml": element_to_xml(element)
+        }
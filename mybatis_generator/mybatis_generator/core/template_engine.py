@@ -0,0 +1,120 @@
+import re
+from typing import Dict, List, Optional
+
+from .templates import batch_update_field, select_by_id, select_list, table_name_for, update_field_by_id
+
+_NAME = r'[A-Za-z_][A-Za-z0-9_]*'
+
+# 可识别的需求，与TrainingDataGenerator生成的训练样本描述一致
+_INTENTS = [
+    ('batch_update', re.compile(rf'批量更新\s*(?P<entity>{_NAME})\s*的\s*(?P<field>{_NAME})')),
+    ('update_by_id', re.compile(rf'根据\s*id\s*更新\s*(?P<entity>{_NAME})\s*的\s*(?P<field>{_NAME})', re.IGNORECASE)),
+    ('select_by_id', re.compile(rf'根据\s*id\s*查询\s*(?P<entity>{_NAME})', re.IGNORECASE)),
+    ('select_list', re.compile(rf'查询\s*(?P<entity>{_NAME})\s*的?列表')),
+]
+
+# 粘贴的Java源码（包/导入声明、类型声明或实体注解），其中JavaDoc里的“根据id查询xxx”不是需求
+_JAVA_SOURCE = re.compile(rf'^\s*(?:package|import)\s[^;\n]*;'
+                          rf'|\b(?:class|interface|enum)\s+{_NAME}[^;{{}}]*\{{'
+                          rf'|@(?:Table|TableName|Entity)\b', re.MULTILINE)
+
+
+def is_java_source(text: str) -> bool:
+    """输入是否为Java源码而不是自然语言需求"""
+    return _JAVA_SOURCE.search(text) is not None
+
+
+class TemplateEngine:
+    """
+    基于模板的快速生成
+
+    对能识别的常见需求（根据id更新字段、批量更新字段、根据id查询、列表查询），直接用
+    TrainingDataGenerator使用的同一套模板生成XML，不经过模型；无法识别的需求返回None，
+    由调用方回退到模型生成。hits/misses记录命中情况
+    """
+
+    def __init__(self, entities: Optional[Dict] = None, naming_patterns: Optional[Dict] = None):
+        """
+        :param entities: 实体类全名 -> 实体类信息（ProjectAnalyzer.entity_classes），用于校验字段和生成列表查询
+        :param naming_patterns: ProjectAnalyzer.naming_patterns，用于确定表名前缀和实体类后缀
+        """
+        naming_patterns = naming_patterns or {}
+        self.table_prefix = naming_patterns.get('table_prefix', 't')
+        self.entity_suffix = naming_patterns.get('entity_suffix', '')
+        self._entities = {}
+        for entity_info in (entities or {}).values():
+            name = entity_info['name']
+            self._entities[name.lower()] = entity_info
+            if self.entity_suffix and name.endswith(self.entity_suffix):
+                self._entities.setdefault(name[:-len(self.entity_suffix)].lower(), entity_info)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_analyzer(cls, analyzer) -> 'TemplateEngine':
+        """使用已完成analyze()的ProjectAnalyzer构建"""
+        return cls(analyzer.entity_classes, analyzer.naming_patterns)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 4)}
+
+    def generate(self, request: str) -> Optional[str]:
+        """
+        尝试用模板生成
+        :param request: 自然语言需求，如“生成根据id更新User的status的sql”
+        :return: 生成的XML，无法处理时返回None；输入为Java源码时直接返回None，不计入命中统计
+        """
+        if is_java_source(request):
+            return None
+        xml = self._generate(request.strip())
+        if xml is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return xml
+
+    def _generate(self, request: str) -> Optional[str]:
+        for intent, pattern in _INTENTS:
+            match = pattern.search(request)
+            if not match:
+                continue
+            entity_name = match.group('entity')
+            entity_info = self._entities.get(entity_name.lower())
+            if entity_info is not None:
+                entity_name = entity_info['name']
+                if self.entity_suffix and entity_name.endswith(self.entity_suffix):
+                    entity_name = entity_name[:-len(self.entity_suffix)]
+            table_name = table_name_for(entity_name, self.table_prefix)
+
+            if intent == 'select_by_id':
+                return select_by_id(table_name)
+            if intent == 'select_list':
+                # 列表查询需要实体类的字段
+                return select_list(table_name, entity_info['fields']) if entity_info is not None else None
+
+            field_name = self._resolve_field(match.group('field'), entity_info)
+            if field_name is None:
+                return None
+            if intent == 'update_by_id':
+                return update_field_by_id(table_name, field_name)
+            return batch_update_field(table_name, field_name)
+        return None
+
+    @staticmethod
+    def _resolve_field(raw_name: str, entity_info: Optional[Dict]) -> Optional[str]:
+        """把描述中的字段名解析为实体类字段名，实体类已知时字段必须存在"""
+        if entity_info is None:
+            # 实体类未知时不校验，下划线字段名转为驼峰属性名
+            head, *rest = raw_name.split('_')
+            return head + ''.join(part.capitalize() for part in rest)
+        wanted = raw_name.replace('_', '').lower()
+        fields: List[Dict] = entity_info['fields']
+        for field in fields:
+            if field['name'].lower() == wanted:
+                return field['name']
+        return None
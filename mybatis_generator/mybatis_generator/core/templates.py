@@ -0,0 +1,198 @@
+from typing import Dict, List
+
+
+def to_snake_case(name: str) -> str:
+    """驼峰命名转下划线命名"""
+    return ''.join(['_' + c.lower() if c.isupper() else c for c in name]).lstrip('_')
+
+
+def table_name_for(entity_name: str, prefix: str = 't') -> str:
+    """从实体类名生成表名，User -> t_user, UserOrder -> t_user_order"""
+    name = to_snake_case(entity_name)
+    return f"{prefix}_{name}" if prefix else name
+
+
+def update_field_by_id(table_name: str, field_name: str) -> str:
+    """根据id更新单个字段"""
+    column_name = to_snake_case(field_name)
+    return f"""    <update id="update{field_name.capitalize()}ById">
+        UPDATE `{table_name}`
+        SET {column_name} = #{{{field_name}}},
+            update_time = now()
+        WHERE id = #{{id}}
+    </update>"""
+
+
+def batch_update_field(table_name: str, field_name: str) -> str:
+    """根据id列表批量更新单个字段"""
+    column_name = to_snake_case(field_name)
+    return f"""    <update id="batchUpdate{field_name.capitalize()}">
+        UPDATE `{table_name}`
+        SET {column_name} = #{{{field_name}}},
+            update_time = now()
+        WHERE id IN
+        <foreach collection="ids" item="id" open="(" separator="," close=")">
+            #{{id}}
+        </foreach>
+    </update>"""
+
+
+def select_by_id(table_name: str) -> str:
+    """根据id查询详情"""
+    return f"""    <select id="selectById" resultMap="BaseResultMap">
+        SELECT <include refid="Base_Column_List"/>
+        FROM `{table_name}`
+        WHERE id = #{{id}}
+    </select>"""
+
+
+def _where_conditions(fields: List[Dict]) -> str:
+    """<where>中每个非空字段的等值条件（id在前）"""
+    return f"""
+            <if test="id != null">
+                AND id = #{{id}}
+            </if>
+            {''.join([f'''
+            <if test="{field['name']} != null">
+                AND {to_snake_case(field['name'])} = #{{{field['name']}}}
+            </if>''' for field in fields if field['name'] != 'id'])}"""
+
+
+def select_list(table_name: str, fields: List[Dict]) -> str:
+    """按字段条件查询列表"""
+    return f"""    <select id="selectList" resultMap="BaseResultMap">
+        SELECT <include refid="Base_Column_List"/>
+        FROM `{table_name}`
+        <where>{_where_conditions(fields)}
+        </where>
+    </select>"""
+
+
+def select_page(table_name: str, fields: List[Dict]) -> str:
+    """按字段条件分页查询"""
+    return f"""    <select id="selectPage" resultMap="BaseResultMap">
+        SELECT <include refid="Base_Column_List"/>
+        FROM `{table_name}`
+        <where>{_where_conditions(fields)}
+        </where>
+        ORDER BY id DESC
+        LIMIT #{{offset}}, #{{pageSize}}
+    </select>"""
+
+
+def count_by_condition(table_name: str, fields: List[Dict]) -> str:
+    """按字段条件统计数量"""
+    return f"""    <select id="countByCondition" resultType="java.lang.Long">
+        SELECT COUNT(*)
+        FROM `{table_name}`
+        <where>{_where_conditions(fields)}
+        </where>
+    </select>"""
+
+
+def select_by_range(table_name: str, field_name: str) -> str:
+    """按字段范围查询，如时间、金额区间"""
+    column_name = to_snake_case(field_name)
+    capitalized = field_name[0].upper() + field_name[1:]
+    return f"""    <select id="selectBy{capitalized}Range" resultMap="BaseResultMap">
+        SELECT <include refid="Base_Column_List"/>
+        FROM `{table_name}`
+        <where>
+            <if test="{field_name}Start != null">
+                AND {column_name} &gt;= #{{{field_name}Start}}
+            </if>
+            <if test="{field_name}End != null">
+                AND {column_name} &lt;= #{{{field_name}End}}
+            </if>
+        </where>
+    </select>"""
+
+
+def select_by_field_in(table_name: str, field_name: str) -> str:
+    """按字段的多个取值查询（IN）"""
+    column_name = to_snake_case(field_name)
+    capitalized = field_name[0].upper() + field_name[1:]
+    return f"""    <select id="selectBy{capitalized}List" resultMap="BaseResultMap">
+        SELECT <include refid="Base_Column_List"/>
+        FROM `{table_name}`
+        WHERE {column_name} IN
+        <foreach collection="{field_name}List" item="item" open="(" separator="," close=")">
+            #{{item}}
+        </foreach>
+    </select>"""
+
+
+def select_join(table_name: str, join_table_name: str, foreign_key: str, join_fields: List[Dict]) -> str:
+    """
+    通过外键字段关联另一张表，按关联表的字段过滤，如Order.userId关联User，按User的字段查询Order
+    :param foreign_key: 外键字段名，如userId
+    :param join_fields: 关联实体类的字段
+    """
+    column_name = to_snake_case(foreign_key)
+    join_param = foreign_key[:-2]
+    conditions = ''.join([f'''
+            <if test="{join_param}.{field['name']} != null">
+                AND b.{to_snake_case(field['name'])} = #{{{join_param}.{field['name']}}}
+            </if>''' for field in join_fields if field['name'] != 'id'])
+    return f"""    <select id="selectBy{join_param[0].upper() + join_param[1:]}" resultMap="BaseResultMap">
+        SELECT a.*
+        FROM `{table_name}` a
+        INNER JOIN `{join_table_name}` b ON a.{column_name} = b.id
+        <where>{conditions}
+        </where>
+    </select>"""
+
+
+def _insert_columns(fields: List[Dict]) -> List[str]:
+    return [field['name'] for field in fields if field['name'] != 'id']
+
+
+def insert_one(table_name: str, fields: List[Dict]) -> str:
+    """插入一条记录，回填自增id"""
+    names = _insert_columns(fields)
+    return f"""    <insert id="insert" useGeneratedKeys="true" keyProperty="id">
+        INSERT INTO `{table_name}` ({', '.join(to_snake_case(name) for name in names)})
+        VALUES ({', '.join(f'#{{{name}}}' for name in names)})
+    </insert>"""
+
+
+def batch_insert(table_name: str, fields: List[Dict]) -> str:
+    """批量插入"""
+    names = _insert_columns(fields)
+    return f"""    <insert id="batchInsert">
+        INSERT INTO `{table_name}` ({', '.join(to_snake_case(name) for name in names)})
+        VALUES
+        <foreach collection="list" item="item" separator=",">
+            ({', '.join(f'#{{item.{name}}}' for name in names)})
+        </foreach>
+    </insert>"""
+
+
+def upsert(table_name: str, fields: List[Dict]) -> str:
+    """插入，主键或唯一键冲突时更新（MySQL ON DUPLICATE KEY UPDATE）"""
+    names = _insert_columns(fields)
+    return f"""    <insert id="insertOrUpdate">
+        INSERT INTO `{table_name}` (id, {', '.join(to_snake_case(name) for name in names)})
+        VALUES (#{{id}}, {', '.join(f'#{{{name}}}' for name in names)})
+        ON DUPLICATE KEY UPDATE
+        {', '.join(f'{to_snake_case(name)} = VALUES({to_snake_case(name)})' for name in names)}
+    </insert>"""
+
+
+def delete_by_id(table_name: str) -> str:
+    """根据id删除"""
+    return f"""    <delete id="deleteById">
+        DELETE FROM `{table_name}`
+        WHERE id = #{{id}}
+    </delete>"""
+
+
+def batch_delete(table_name: str) -> str:
+    """根据id列表批量删除"""
+    return f"""    <delete id="batchDelete">
+        DELETE FROM `{table_name}`
+        WHERE id IN
+        <foreach collection="ids" item="id" open="(" separator="," close=")">
+            #{{id}}
+        </foreach>
+    </delete>"""
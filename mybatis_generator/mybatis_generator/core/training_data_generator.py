@@ -1,131 +1,276 @@
-from core.code_analyzer import ProjectAnalyzer
-from typing import List, Dict
-from torch.optim.lr_scheduler import CosineAnnealingLR  # 余弦退火
-from torch.optim.lr_scheduler import OneCycleLR  # 单周期学习率
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .code_analyzer import ProjectAnalyzer
+from .io_utils import atomic_write_text
+from .reporter import AnalysisReporter
+from .sample_synthesizer import SampleSynthesizer, synthesize_entity_samples
+from .statement_miner import mine_mapper_statements
+from .templates import table_name_for, to_snake_case
+
+INSTRUCTION = "根据input的内容解析出其中的实体类名，和需要的功能，再通过功能生成对应的Mybatis Mapper XML"
+
+# export_samples输出目录中的文件
+EXPORT_INDEX_FILE = "index.json"
+EXPORT_ENTITY_FILE = "entities"
+EXPORT_SAMPLE_PREFIX = "samples"
+EXPORT_FORMATS = ('jsonl', 'parquet')
+
+
+class _ShardWriter:
+    """
+    把记录按shard_size分片写入 <prefix>-00000.jsonl/.parquet
+    jsonl逐条写入临时文件；parquet最多缓存一个分片的记录。每个分片写完后才改名为正式文件名。
+    digest为所有记录内容的哈希，内容不变时导出结果的digest不变
+    """
+
+    def __init__(self, output_dir: str, prefix: str, shard_size: int, fmt: str):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.fmt = fmt
+        self.shards = []
+        self.count = 0
+        self._buffer = []
+        self._file = None
+        self._tmp_path = None
+        self._in_shard = 0
+        self._digest = hashlib.sha1()
+
+    @property
+    def digest(self) -> str:
+        return self._digest.hexdigest()
+
+    def _shard_path(self) -> str:
+        return os.path.join(self.output_dir, f"{self.prefix}-{len(self.shards):05d}.{self.fmt}")
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self._digest.update(line.encode('utf-8'))
+        if self.fmt == 'jsonl':
+            if self._file is None:
+                self._tmp_path = os.path.join(self.output_dir, f".tmp-{self.prefix}.jsonl")
+                self._file = open(self._tmp_path, 'w', encoding='utf-8')
+            self._file.write(line)
+        else:
+            self._buffer.append(record)
+        self._in_shard += 1
+        self.count += 1
+        if self._in_shard >= self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        if self._in_shard == 0:
+            return
+        shard_path = self._shard_path()
+        if self.fmt == 'jsonl':
+            self._file.close()
+            self._file = None
+            os.replace(self._tmp_path, shard_path)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            tmp_path = os.path.join(self.output_dir, f".tmp-{self.prefix}.parquet")
+            pq.write_table(pa.Table.from_pylist(self._buffer), tmp_path)
+            os.replace(tmp_path, shard_path)
+            self._buffer = []
+        self.shards.append(os.path.basename(shard_path))
+        self._in_shard = 0
+
+    def close(self) -> List[str]:
+        self._flush()
+        return self.shards
+
+
+def _read_records(file_path: str) -> Iterator[Dict]:
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(file_path).iter_batches():
+            yield from batch.to_pylist()
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _entity_key(record: Dict) -> str:
+    """实体类的类全名（不同包下可能有同名实体类），没有entity_class的旧导出结果退回到类名"""
+    return record.get('entity_class') or record['entity_name']
+
+
+def iter_exported_samples(output_dir: str, with_fields: bool = False) -> Iterator[Dict]:
+    """
+    逐条读取export_samples导出的训练样本
+    :param output_dir: 导出目录
+    :param with_fields: 为True时按entity_class把实体类的字段列表补回project_context（与generate_training_data的格式一致）
+    """
+    with open(os.path.join(output_dir, EXPORT_INDEX_FILE), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    fields = {}
+    if with_fields:
+        for shard in index['entity_shards']:
+            for entity in _read_records(os.path.join(output_dir, shard)):
+                fields[_entity_key(entity)] = entity['fields']
+    for shard in index['sample_shards']:
+        for sample in _read_records(os.path.join(output_dir, shard)):
+            if with_fields:
+                sample['project_context']['fields'] = fields.get(_entity_key(sample['project_context']), [])
+            yield sample
+
 
 class TrainingDataGenerator:
-    def __init__(self, mapper_dir: str, entity_dir: str, mapper_java_dir: str):
-        self.analyzer = ProjectAnalyzer(mapper_dir, entity_dir, mapper_java_dir)
+    def __init__(self, mapper_dir: str, entity_dir: str, mapper_java_dir: str,
+                 workers: int = 1, cache_path: Optional[str] = None,
+                 reporter: Optional[AnalysisReporter] = None,
+                 paraphrases: int = 1, seed: int = 0, mine_statements: bool = True):
+        """
+        :param workers: 解析Java文件和合成样本的进程数
+        :param cache_path: 项目扫描的解析缓存路径（可选）
+        :param reporter: 事件/进度输出（可选）
+        :param paraphrases: 每条语句使用的需求描述数，大于1时加入中英文改写
+        :param seed: 选取改写的随机种子
+        :param mine_statements: 是否把项目Mapper XML中的真实语句（配合接口方法的JavaDoc和签名）加入训练样本
+        """
+        self.analyzer = ProjectAnalyzer(mapper_dir, entity_dir, mapper_java_dir,
+                                        workers=workers, cache_path=cache_path,
+                                        reporter=reporter)
+        self.reporter = self.analyzer.reporter
+        self.workers = workers
+        self.paraphrases = paraphrases
+        self.seed = seed
+        self.mine_statements = mine_statements
         
     def generate_training_data(self) -> List[Dict]:
-        """生成训练数据"""
+        """生成训练数据（全部样本保存在内存中，大型项目使用iter_training_data或export_samples）"""
+        return list(self.iter_training_data())
+
+    def iter_training_data(self, with_fields: bool = True) -> Iterator[Dict]:
+        """
+        逐个生成训练样本，不在内存中保存全部样本
+        :param with_fields: project_context中是否包含实体类的字段列表（同一实体类的样本共用同一个列表）
+        """
+        total = 0
+        for entity_class, entity_name, table_name, fields, samples in self._iter_entity_samples():
+            context = {"entity_class": entity_class, "entity_name": entity_name, "table_name": table_name}
+            if with_fields:
+                context["fields"] = fields
+            for sample in samples:
+                total += 1
+                yield {
+                    "instruction": INSTRUCTION,
+                    "input": sample['description'],
+                    "output": sample['xml'],
+                    "project_context": context
+                }
+        self.reporter.info(f"\n总共生成了 {total} 个训练样本", samples=total)
+
+    def _iter_entity_samples(self) -> Iterator[Tuple[str, str, str, List[Dict], List[Dict]]]:
+        """分析项目，逐个实体类返回 (类全名, 实体类名, 表名, 字段列表, 样本列表)"""
         # 分析项目
         self.analyzer.analyze()
         
-        # 获取训练对
-        training_pairs = self.analyzer.get_training_pairs()
-        
-        # 转换为训练数据格式
-        training_data = []
-        
-        # 为每个实体类生成多个不同功能的训练样本
-        for pair in training_pairs:
+        entities, entity_classes, mappers = [], [], []
+        for pair in self.analyzer.get_training_pairs():
             entity = pair['entity']
-            entity_name = entity['name']
-            table_name = self._get_table_name(entity_name)
-            fields = entity['fields']
-            
-            print(f"\n=== 正在处理实体类: {entity_name} ===")
-            
-            # 生成不同类型的操作样本
-            samples = self._generate_operation_samples(entity_name, table_name, fields)
+            entities.append((entity['name'], self._get_table_name(entity['name']),
+                             [field.to_dict() for field in entity['fields']]))
+            entity_classes.append(pair['mapper']['entity_class'])
+            mappers.append((pair['mapper'], pair['interface']))
+
+        # 为每个实体类生成多个不同功能的训练样本，workers > 1 时在进程池中并行合成，重复的样本只保留一条
+        synthesizer = SampleSynthesizer(workers=self.workers, paraphrases=self.paraphrases, seed=self.seed,
+                                        reporter=self.reporter)
+        for (entity_name, table_name, fields, samples), entity_class, (mapper, interface) in zip(
+                synthesizer.synthesize(entities), entity_classes, mappers):
+            if self.mine_statements:
+                mined = synthesizer.dedup(self._mine_statements(mapper, interface))
+                self.reporter.count('mined_samples', len(mined))
+                samples = samples + mined
+            self.reporter.debug(f"\n=== 正在处理实体类: {entity_name} ===", entity=entity_name)
+            self.reporter.count('training_samples', len(samples))
             
+            if self.reporter.debug_enabled:
+                for sample in samples:
+                    self.reporter.event('sample', f"\n--- 训练样本 ---\nInput:\n{sample['description']}\n"
+                                        f"\nOutput:\n{sample['xml']}\n-------------",
+                                        entity=entity_name, input=sample['description'])
+
+            yield entity_class, entity_name, table_name, fields, samples
+
+    def _mine_statements(self, mapper, interface) -> List[Dict]:
+        """提取Mapper XML中的真实语句，每次只解析一个文件"""
+        try:
+            return list(mine_mapper_statements(mapper['file_path'], mapper['namespace'], interface or None))
+        except Exception as e:
+            self.reporter.error('提取Mapper语句', str(e), mapper['file_path'])
+            return []
+
+    def export_samples(self, output_dir: str, shard_size: int = 10000, fmt: str = 'jsonl') -> Dict:
+        """
+        流式导出训练样本，内存占用只与单个实体类的样本数（parquet为一个分片）有关
+        样本的project_context只记录entity_class/entity_name/table_name，字段列表按实体类（类全名）去重写入entities分片，
+        读取时用iter_exported_samples(output_dir, with_fields=True)还原
+        :param output_dir: 导出目录
+        :param shard_size: 每个分片的记录数
+        :param fmt: jsonl 或 parquet（需要pyarrow）
+        :return: 导出说明（同index.json）
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_FORMATS)}")
+        os.makedirs(output_dir, exist_ok=True)
+        index_path = os.path.join(output_dir, EXPORT_INDEX_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        # 清理上次导出的分片，避免分片数减少时残留旧文件
+        for file_name in os.listdir(output_dir):
+            if file_name.startswith((EXPORT_SAMPLE_PREFIX + '-', EXPORT_ENTITY_FILE + '-')):
+                os.remove(os.path.join(output_dir, file_name))
+
+        entity_writer = _ShardWriter(output_dir, EXPORT_ENTITY_FILE, shard_size, fmt)
+        sample_writer = _ShardWriter(output_dir, EXPORT_SAMPLE_PREFIX, shard_size, fmt)
+        for entity_class, entity_name, table_name, fields, samples in self._iter_entity_samples():
+            context = {"entity_class": entity_class, "entity_name": entity_name, "table_name": table_name}
+            entity_writer.write(dict(context, fields=fields))
             for sample in samples:
-                print("\n--- 训练样本 ---")
-                print("Input:")
-                print(sample['description'])
-                print("\nOutput:")
-                print(sample['xml'])
-                print("-------------")
-
-                training_data.append({
-                    "instruction": "根据input的内容解析出其中的实体类名，和需要的功能，再通过功能生成对应的Mybatis Mapper XML",
+                sample_writer.write({
+                    "instruction": INSTRUCTION,
                     "input": sample['description'],
                     "output": sample['xml'],
-                    "project_context": {
-                        "entity_name": entity_name,
-                        "table_name": table_name,
-                        "fields": fields
-                    }
+                    "project_context": context
                 })
-        
-        print(f"\n总共生成了 {len(training_data)} 个训练样本")
-        return training_data
+
+        index = {
+            'format': fmt,
+            'entities': entity_writer.count,
+            'samples': sample_writer.count,
+            'digest': hashlib.sha1((entity_writer.digest + sample_writer.digest).encode('ascii')).hexdigest(),
+            'entity_shards': entity_writer.close(),
+            'sample_shards': sample_writer.close(),
+        }
+        # 说明文件最后写入，导出中断时不会读到不完整的结果
+        atomic_write_text(index_path, json.dumps(index, ensure_ascii=False, indent=2))
+        self.reporter.info(f"\n总共导出了 {index['samples']} 个训练样本，{len(index['sample_shards'])} 个分片",
+                           samples=index['samples'], shards=len(index['sample_shards']))
+        return index
     
     def _get_table_name(self, entity_name: str) -> str:
         """从实体类名生成表名"""
         # User -> t_user, UserOrder -> t_user_order
-        name = ''.join(['_' + c.lower() if c.isupper() else c for c in entity_name]).lstrip('_')
-        return f"t_{name}"
+        return table_name_for(entity_name)
     
     def _generate_operation_samples(self, entity_name: str, table_name: str, fields: List[Dict]) -> List[Dict]:
-        """生成不同类型的操作样本"""
-        samples = []
-        
-        # 遍历字段生成更新操作
-        for field in fields:
-            field_name = field['name']
-            column_name = self._to_snake_case(field_name)
-            
-            # 生成更新状态的样本
-            if field_name.lower().endswith('status'):
-                samples.append({
-                    "description": f"生成根据id更新{entity_name}的{field_name}的sql",
-                    "xml": f"""    <update id="update{field_name.capitalize()}ById">
-        UPDATE `{table_name}`
-        SET {column_name} = #{{{field_name}}},
-            update_time = now()
-        WHERE id = #{id}
-    </update>"""
-                })
-            
-            # 生成批量更新的样本
-            samples.append({
-                "description": f"生成批量更新{entity_name}的{field_name}的sql",
-                "xml": f"""    <update id="batchUpdate{field_name.capitalize()}">
-        UPDATE `{table_name}`
-        SET {column_name} = #{{{field_name}}},
-            update_time = now()
-        WHERE id IN
-        <foreach collection="ids" item="id" open="(" separator="," close=")">
-            #{id}
-        </foreach>
-    </update>"""
-            })
-        
-        # 生成查询样本
-        samples.append({
-            "description": f"生成根据id查询{entity_name}详情的sql",
-            "xml": f"""    <select id="selectById" resultMap="BaseResultMap">
-        SELECT <include refid="Base_Column_List"/>
-        FROM `{table_name}`
-        WHERE id = #{id}
-    </select>"""
-        })
-        
-        # 生成列表查询样本
-        samples.append({
-            "description": f"生成查询{entity_name}列表的sql，支持多个字段查询条件",
-            "xml": f"""    <select id="selectList" resultMap="BaseResultMap">
-        SELECT <include refid="Base_Column_List"/>
-        FROM `{table_name}`
-        <where>
-            <if test="id != null">
-                AND id = #{id}
-            </if>
-            {''.join([f'''
-            <if test="{field['name']} != null">
-                AND {self._to_snake_case(field['name'])} = #{{{field['name']}}}
-            </if>''' for field in fields])}
-        </where>
-    </select>"""
-        })
-        
-        return samples
+        """生成不同类型的操作样本（不含关联查询和去重，见SampleSynthesizer）"""
+        return synthesize_entity_samples(entity_name, table_name, fields, paraphrases=self.paraphrases,
+                                         seed=self.seed)
     
     def _to_snake_case(self, name: str) -> str:
         """驼峰命名转下划线命名"""
-        return ''.join(['_' + c.lower() if c.isupper() else c for c in name]).lstrip('_')
+        return to_snake_case(name)
     
     def _format_entity_class(self, entity_info: Dict) -> str:
         """格式化实体类信息"""
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+# 标签中不计算损失的位置
+IGNORE_INDEX = -100
+DEFAULT_DATASET_CACHE_DIR = "./.dataset_cache"
+
+
+def tokenize_example(tokenizer, prompt: str, target: str, max_length: int = 512) -> Dict[str, List[int]]:
+    """
+    把提示和目标拼接成一条训练序列，提示部分的标签置为IGNORE_INDEX，只在目标部分计算损失
+    超出max_length时优先保留目标（至少一半长度），提示从开头截断，保留靠近输出的输入部分
+    :param tokenizer: 分词器
+    :param prompt: 提示（指令、输入，以“### 输出:”结尾）
+    :param target: 期望的输出
+    :param max_length: 序列最大token数
+    :return: {'input_ids', 'labels', 'length'}
+    """
+    prompt_ids = tokenizer(prompt, add_special_tokens=True)["input_ids"]
+    target_ids = tokenizer(target, add_special_tokens=False)["input_ids"] + [tokenizer.eos_token_id]
+
+    if len(prompt_ids) + len(target_ids) > max_length:
+        target_ids = target_ids[:max(max_length - len(prompt_ids), max_length // 2)]
+        prompt_ids = prompt_ids[len(prompt_ids) - (max_length - len(target_ids)):]
+
+    input_ids = prompt_ids + target_ids
+    return {
+        "input_ids": input_ids,
+        "labels": [IGNORE_INDEX] * len(prompt_ids) + target_ids,
+        "length": len(input_ids),
+    }
+
+
+def pack_examples(examples: List[Dict[str, List[int]]], max_length: int = 512) -> List[Dict[str, List[int]]]:
+    """
+    把多条短序列拼接进同一条max_length长的序列（按长度从长到短首次适应），减少填充
+    拼接后的序列之间不做注意力隔离，适合样本较短、数量较多的数据集
+    """
+    bins = []
+    for example in sorted(examples, key=lambda e: e["length"], reverse=True):
+        for packed in bins:
+            if packed["length"] + example["length"] <= max_length:
+                break
+        else:
+            packed = {"input_ids": [], "labels": [], "length": 0}
+            bins.append(packed)
+        packed["input_ids"] += example["input_ids"]
+        packed["labels"] += example["labels"]
+        packed["length"] += example["length"]
+    return bins
+
+
+def dataset_fingerprint(tokenizer, pairs: List[Dict[str, str]], max_length: int, packing: bool) -> str:
+    """分词结果的缓存键：数据内容、分词器和序列长度任一变化都会重新分词"""
+    digest = hashlib.sha1()
+    digest.update(json.dumps({
+        'version': 1,
+        'tokenizer': tokenizer.name_or_path,
+        'vocab_size': len(tokenizer),
+        'max_length': max_length,
+        'packing': packing,
+    }, sort_keys=True).encode('utf-8'))
+    for pair in pairs:
+        digest.update(json.dumps([pair['input_text'], pair['output_text']], ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_tokenized_dataset(tokenizer, pairs: List[Dict[str, str]], max_length: int = 512,
+                            packing: bool = False, cache_dir: Optional[str] = DEFAULT_DATASET_CACHE_DIR,
+                            rebuild: bool = False):
+    """
+    分词并缓存训练数据集
+    分词结果以Arrow格式保存在cache_dir下，再次训练时数据未变化则直接内存映射加载，不再分词
+    :param tokenizer: 分词器
+    :param pairs: [{'input_text': 提示, 'output_text': 目标}]
+    :param max_length: 序列最大token数
+    :param packing: 是否把短序列拼接成max_length长的序列
+    :param cache_dir: 缓存目录，为None时不缓存
+    :param rebuild: 忽略已有的缓存重新分词
+    :return: datasets.Dataset，列为input_ids/labels/length
+    """
+    from datasets import Dataset, load_from_disk
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, dataset_fingerprint(tokenizer, pairs, max_length, packing))
+        if os.path.isdir(cache_path) and not rebuild:
+            return load_from_disk(cache_path)
+
+    examples = [tokenize_example(tokenizer, pair['input_text'], pair['output_text'], max_length) for pair in pairs]
+    if packing:
+        examples = pack_examples(examples, max_length)
+    dataset = Dataset.from_list(examples)
+
+    if cache_path:
+        # 先保存到临时目录再改名，中断时不会留下不完整的缓存
+        tmp_path = cache_path + ".tmp"
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        dataset.save_to_disk(tmp_path)
+        if os.path.isdir(cache_path):
+            shutil.rmtree(cache_path)
+        os.replace(tmp_path, cache_path)
+        dataset = load_from_disk(cache_path)
+    return dataset
+
+
+class PaddingCollator:
+    """
+    按批内最长序列动态填充（而不是统一填充到max_length）
+    配合TrainingArguments(group_by_length=True, length_column_name="length")，长度相近的样本分到同一批
+    """
+
+    def __init__(self, tokenizer, pad_to_multiple_of: Optional[int] = 8):
+        """
+        :param tokenizer: 分词器
+        :param pad_to_multiple_of: 填充后的长度取整到该倍数
+        """
+        self.pad_token_id = tokenizer.pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, List[int]]]) -> Dict:
+        import torch
+
+        batch_length = max(len(feature["input_ids"]) for feature in features)
+        if self.pad_to_multiple_of:
+            batch_length = -(-batch_length // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        input_ids, attention_mask, labels = [], [], []
+        for feature in features:
+            padding = batch_length - len(feature["input_ids"])
+            input_ids.append(list(feature["input_ids"]) + [self.pad_token_id] * padding)
+            attention_mask.append([1] * len(feature["input_ids"]) + [0] * padding)
+            labels.append(list(feature["labels"]) + [IGNORE_INDEX] * padding)
+        return {
+            "input_ids": torch.tensor(input_ids, dtype=torch.long),
+            "attention_mask": torch.tensor(attention_mask, dtype=torch.long),
+            "labels": torch.tensor(labels, dtype=torch.long),
+        }
@@ -0,0 +1,206 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from .xml_constraint import XmlConstraintProcessor
+
+# 可选的解码配置
+# fast: 贪心解码，每步只计算一条序列，适合日常生成
+# sampled: 单序列采样，输出更多样
+# quality: 原有的5束束搜索 + n-gram去重，最慢但最稳妥
+# speculative: 与fast输出相同的贪心解码，由模板/n-gram草稿一次验证多个token（见speculative.py），
+#              批量接口逐个生成
+DECODING_PROFILES = {
+    'fast': dict(
+        max_new_tokens=1024,
+        num_beams=1,
+        do_sample=False,
+        repetition_penalty=1.1,
+    ),
+    'sampled': dict(
+        max_new_tokens=1024,
+        num_beams=1,
+        do_sample=True,
+        temperature=0.7,
+        top_p=0.9,
+        repetition_penalty=1.2,
+    ),
+    'quality': dict(
+        max_new_tokens=1024,
+        num_beams=5,
+        do_sample=True,
+        temperature=0.7,
+        top_p=0.9,
+        repetition_penalty=1.2,
+        no_repeat_ngram_size=3,
+        early_stopping=True,
+    ),
+    'speculative': dict(
+        max_new_tokens=1024,
+        num_beams=1,
+        do_sample=False,
+        repetition_penalty=1.1,
+    ),
+}
+
+# 使用草稿+验证解码的配置，只支持单条序列的贪心解码
+SPECULATIVE_PROFILES = ('speculative',)
+
+DEFAULT_PROFILE = 'fast'
+
+# 生成完整Mapper XML时的结束标签
+MAPPER_STOP_TAGS = ('</mapper>',)
+# 只生成单条语句时的结束标签
+STATEMENT_STOP_TAGS = ('</select>', '</insert>', '</update>', '</delete>')
+
+
+class _LazyStoppingCriteria:
+    """
+    停止条件的基类：实例化时才导入transformers，创建的实例同时继承transformers.StoppingCriteria，
+    导入本模块不依赖transformers
+    """
+
+    _subclasses = {}
+
+    def __new__(cls, *args, **kwargs):
+        from transformers import StoppingCriteria
+
+        if not issubclass(cls, StoppingCriteria):
+            if cls not in _LazyStoppingCriteria._subclasses:
+                _LazyStoppingCriteria._subclasses[cls] = type(cls.__name__, (cls, StoppingCriteria), {
+                    '__module__': cls.__module__, '__qualname__': cls.__qualname__, '__doc__': cls.__doc__})
+            cls = _LazyStoppingCriteria._subclasses[cls]
+        return super().__new__(cls)
+
+
+class XmlStopCriteria(_LazyStoppingCriteria):
+    """
+    生成出结束标签后停止的停止条件（transformers StoppingCriteria）
+
+    每步只解码每条序列最后几个token来检查，不重复解码整段输出；
+    只检查提示之后新生成的部分，提示中出现的标签不会触发停止
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, stop_tags=MAPPER_STOP_TAGS, window: int = 8):
+        """
+        :param tokenizer: 分词器
+        :param prompt_length: 输入提示的token数（批量时为填充后的长度）
+        :param stop_tags: 出现任一标签即停止
+        :param window: 每步解码的末尾token数，需覆盖最长的结束标签
+        """
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_tags = tuple(stop_tags)
+        self.window = window
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        start = max(self.prompt_length, input_ids.shape[1] - self.window)
+        if start >= input_ids.shape[1]:
+            return done
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        for i, tail in enumerate(tails):
+            done[i] = any(tag in tail for tag in self.stop_tags)
+        return done
+
+
+class InterruptCriteria(_LazyStoppingCriteria):
+    """
+    外部请求中断时停止生成的停止条件（transformers StoppingCriteria）
+
+    generate在后台线程运行时，前台线程调用interrupt()后生成在下一步结束，已生成的部分照常返回
+    """
+
+    def __init__(self, should_stop: Optional[Callable[[], bool]] = None):
+        """
+        :param should_stop: 额外的中断条件（可选），每步检查一次，如服务中请求已超时或客户端已断开
+        """
+        self._event = threading.Event()
+        self._should_stop = should_stop
+
+    def interrupt(self):
+        self._event.set()
+
+    @property
+    def interrupted(self) -> bool:
+        if not self._event.is_set() and self._should_stop is not None and self._should_stop():
+            self._event.set()
+        return self._event.is_set()
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        return torch.full((input_ids.shape[0],), self.interrupted, dtype=torch.bool, device=input_ids.device)
+
+
+class TimingStreamer:
+    """
+    记录首token时间和新token数的streamer（transformers streamer接口），可包装另一个streamer并原样转发
+    generate先put整个提示，之后每步put新生成的token；草稿+验证解码一步可能put多个token，
+    因此按put的token数计数，而不是按步数
+    """
+
+    def __init__(self, inner=None):
+        """
+        :param inner: 被包装的streamer（如TextIteratorStreamer，可选）
+        """
+        self.inner = inner
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        # 首次输出的token数，首token之后的解码速度不计入这部分
+        self.first_tokens = 0
+        self.new_tokens = 0
+        self._prompt_seen = False
+
+    def put(self, value):
+        if self.inner is not None:
+            self.inner.put(value)
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            self.first_tokens = value.numel()
+        self.new_tokens += value.numel()
+
+    def end(self):
+        if self.inner is not None:
+            self.inner.end()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.first_token_at - self.start if self.first_token_at is not None else None
+
+
+def generation_kwargs(tokenizer, profile: str, prompt_length: int, stop_tags=MAPPER_STOP_TAGS,
+                      xml_roots=None) -> dict:
+    """
+    构建model.generate的参数
+    :param tokenizer: 分词器
+    :param profile: 解码配置名，见DECODING_PROFILES
+    :param prompt_length: 输入提示的token数
+    :param stop_tags: 结束标签，为空时只在eos或max_new_tokens处停止
+    :param xml_roots: 允许的根元素（可选），设置后用XmlConstraintProcessor约束输出为格式正确的XML
+    """
+    from transformers import LogitsProcessorList, StoppingCriteriaList
+
+    if profile not in DECODING_PROFILES:
+        raise ValueError(f"未知的解码配置: {profile}，可选: {', '.join(DECODING_PROFILES)}")
+    kwargs = dict(
+        DECODING_PROFILES[profile],
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+    )
+    if stop_tags:
+        kwargs['stopping_criteria'] = StoppingCriteriaList([XmlStopCriteria(tokenizer, prompt_length, stop_tags)])
+    if xml_roots:
+        kwargs['logits_processor'] = LogitsProcessorList([XmlConstraintProcessor(tokenizer, prompt_length, xml_roots)])
+    return kwargs
+
+
+def truncate_at_stop_tag(text: str, stop_tags=MAPPER_STOP_TAGS) -> str:
+    """截掉结束标签之后多生成的内容"""
+    ends = [text.find(tag) + len(tag) for tag in stop_tags if tag in text]
+    return text[:min(ends)] if ends else text
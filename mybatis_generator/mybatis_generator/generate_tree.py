@@ -0,0 +1,399 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from .core.code_analyzer import ProjectAnalyzer
+from .core.io_utils import atomic_write_text, file_digest
+from .core.reporter import AnalysisReporter
+from .decoding import DECODING_PROFILES, DEFAULT_PROFILE
+from .inference import MapperGenerator
+from .model_export import DEFAULT_EXPORT_PATH
+from .model_loader import LazyModel
+from .prompt_compactor import COMPACT_MODES, parse_entity
+
+PENDING, DONE, FAILED, SKIPPED = 'pending', 'done', 'failed', 'skipped'
+
+# 遍历源码树时跳过的目录（构建输出、版本控制、IDE配置）
+_SKIPPED_DIRS = {'.git', '.svn', '.idea', '.vscode', 'target', 'build', 'out', 'node_modules'}
+# 实体类常见的包名
+_ENTITY_PACKAGES = {'entity', 'entities', 'domain', 'model', 'models', 'po', 'pojo', 'dataobject', 'do'}
+
+
+def is_entity(entity: Optional[Dict]) -> bool:
+    """
+    parse_entity的结果是否像实体类：有对应数据库列的字段，并且用注解声明了表名、
+    类名带实体后缀（DO/Entity/Model/PO）或位于entity/domain/model等包中
+    """
+    if not entity or not entity['fields']:
+        return False
+    if entity['table_name']:
+        return True
+    if entity['name'].lower().endswith(ProjectAnalyzer.ENTITY_SUFFIXES):
+        return True
+    return bool(set(entity['package'].split('.')) & _ENTITY_PACKAGES)
+
+
+def available_memory_mb() -> Optional[int]:
+    """当前可用内存（MB），无法获取时返回None"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_workers(worker_memory_mb: int = 2048, threads_per_worker: int = 2) -> int:
+    """
+    按CPU核数和可用内存确定工作进程数：每个进程持有一份模型（opt-350m约1.5GB）并使用threads_per_worker个线程
+    :param worker_memory_mb: 每个工作进程预计占用的内存
+    :param threads_per_worker: 每个工作进程的计算线程数
+    """
+    cpus = os.cpu_count() or 1
+    by_cpu = max(1, cpus // threads_per_worker)
+    memory = available_memory_mb()
+    by_memory = max(1, memory // worker_memory_mb) if memory else by_cpu
+    return min(by_cpu, by_memory)
+
+
+class JobManifest:
+    """
+    generate-tree的任务清单
+
+    以源码树中的相对路径为键，记录每个Java文件的内容哈希、状态（pending/done/failed/skipped）、输出路径、
+    耗时和错误信息，以及生成时的配置标识（模型权重、解码配置等）。每批结果完成后原子写入，
+    中断后再次运行时，内容和配置都未变、输出文件仍在的实体类直接跳过；不是实体类的文件也记录下来，内容不变时不再解析
+    """
+
+    VERSION = 1
+
+    def __init__(self, manifest_path: str, config: Dict):
+        """
+        :param manifest_path: 清单文件路径（JSON格式）
+        :param config: 影响生成结果的配置，变化后已完成的任务需要重新生成
+        """
+        self.manifest_path = manifest_path
+        self.config = config
+        self.config_id = hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.jobs = {}
+        self._load()
+
+    def _load(self):
+        """加载清单，版本不一致或文件损坏时从头开始"""
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == self.VERSION:
+            self.jobs = data.get('jobs', {})
+
+    def save(self):
+        """保存清单（原子写入）"""
+        atomic_write_text(self.manifest_path, json.dumps({
+            'version': self.VERSION,
+            'config': self.config,
+            'summary': self.summary(),
+            'jobs': self.jobs,
+        }, ensure_ascii=False, indent=1, sort_keys=True))
+
+    def up_to_date(self, rel_path: str, sha1: str) -> bool:
+        """已用当前配置为相同内容生成过，且输出文件仍然存在"""
+        job = self.jobs.get(rel_path)
+        return bool(job) and job['status'] == DONE and job['sha1'] == sha1 and \
+            job.get('config') == self.config_id and os.path.exists(job['output'])
+
+    def known_non_entity(self, rel_path: str, sha1: str) -> bool:
+        """上次解析时不是实体类，且内容未变"""
+        job = self.jobs.get(rel_path)
+        return bool(job) and job['status'] == SKIPPED and job['sha1'] == sha1
+
+    def update(self, rel_path: str, **fields):
+        job = self.jobs.setdefault(rel_path, {})
+        job.update(fields)
+
+    def remove_missing(self, rel_paths) -> int:
+        """删除源码树中已不存在的文件的记录，返回删除数"""
+        missing = [rel_path for rel_path in self.jobs if rel_path not in rel_paths]
+        for rel_path in missing:
+            del self.jobs[rel_path]
+        return len(missing)
+
+    def summary(self) -> Dict[str, int]:
+        counts = {status: 0 for status in (PENDING, DONE, FAILED, SKIPPED)}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+
+# 工作进程中的生成器，每个进程只加载一次模型
+_worker_generator = None
+
+
+def _init_worker(generator_kwargs: Dict, num_threads: int):
+    """工作进程初始化：限制计算线程数避免多个进程争抢CPU，创建生成器并加载模型"""
+    global _worker_generator
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    _worker_generator = MapperGenerator(**generator_kwargs)
+    _worker_generator.warmup()
+
+
+def _generate_task(task) -> List[Dict]:
+    """
+    在工作进程中为一批实体类生成Mapper XML并原子写入输出文件
+    :param task: [(相对路径, 源码路径, 输出路径)]
+    :return: 每个实体类的 {'rel_path', 'sha1', 'status', 'seconds', 'error'}
+    """
+    start = time.perf_counter()
+    # readable: 能读取和解码的实体类在task中的下标，与contents一一对应
+    readable, contents, results = [], [], []
+    for index, (rel_path, source_path, _) in enumerate(task):
+        result = {'rel_path': rel_path, 'sha1': None, 'status': DONE, 'error': None}
+        results.append(result)
+        try:
+            with open(source_path, 'rb') as f:
+                raw = f.read()
+            # 记录实际用于生成的内容的哈希，生成期间源码被修改时下次运行会重新生成
+            result['sha1'] = file_digest(raw)
+            contents.append(raw.decode('utf-8'))
+            readable.append(index)
+        except (OSError, UnicodeDecodeError) as e:
+            # 源码已删除或不是UTF-8编码时只有这个实体类失败
+            result.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+
+    # 已写入输出文件的位置，整批失败后只重试其余的实体类
+    written = set()
+
+    def write_result(position: int, mapper_content: str):
+        atomic_write_text(task[readable[position]][2], mapper_content)
+        written.add(position)
+
+    try:
+        if contents:
+            _worker_generator.generate_mappers(contents, batch_size=len(contents), on_result=write_result)
+    except Exception:
+        # 整批失败时逐个重试尚未完成的实体类，只把出错的实体类标记为失败
+        for position, content in enumerate(contents):
+            if position in written:
+                continue
+            try:
+                write_result(position, _worker_generator.generate_mapper(content))
+            except Exception as e:
+                results[readable[position]].update(status=FAILED, error=f"{type(e).__name__}: {e}")
+    seconds = (time.perf_counter() - start) / len(task)
+    for result in results:
+        result['seconds'] = round(seconds, 3)
+    return results
+
+
+class TreeGenerator:
+    """
+    为整个源码树中的实体类批量生成Mapper XML
+
+    遍历源码树找出实体类，跳过清单中已是最新的，其余按batch_size分批交给一组各自持有模型的工作进程；
+    输出按源码的相对目录放在output_dir下，原子写入，每批完成后更新清单，中断后再次运行从未完成的部分继续
+    """
+
+    def __init__(self, source_dir: str, output_dir: str = "./generated_mappers", manifest_path: str = None,
+                 generator_kwargs: Dict = None, workers: int = None, batch_size: int = 4,
+                 worker_memory_mb: int = 2048, reporter: AnalysisReporter = None):
+        """
+        :param source_dir: 源码树根目录
+        :param output_dir: 输出目录
+        :param manifest_path: 任务清单路径，默认为 output_dir/.generate_tree.json
+        :param generator_kwargs: 工作进程中创建MapperGenerator的参数
+        :param workers: 工作进程数，默认按CPU核数和可用内存确定（见default_workers），为1时在当前进程中生成
+        :param batch_size: 每个任务（一次批量前向计算）的实体类数
+        :param worker_memory_mb: 每个工作进程预计占用的内存，用于确定默认进程数
+        :param reporter: 统计输出（可选）
+        """
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.generator_kwargs = dict(generator_kwargs or {})
+        self.workers = workers or default_workers(worker_memory_mb)
+        self.batch_size = batch_size
+        self.reporter = reporter or AnalysisReporter()
+        self.manifest = JobManifest(manifest_path or os.path.join(output_dir, '.generate_tree.json'),
+                                    self._config())
+
+    def _config(self) -> Dict:
+        """影响生成结果的配置，与MapperGenerator的默认值保持一致"""
+        kwargs = self.generator_kwargs
+        loader = LazyModel(kwargs.get('base_model_name', 'facebook/opt-350m'),
+                           kwargs.get('checkpoint_path', './mybatis_mapper_generator'),
+                           kwargs.get('export_path', DEFAULT_EXPORT_PATH),
+                           kwargs.get('allow_export_without_adapter', False))
+        decoding = kwargs.get('decoding', DEFAULT_PROFILE)
+        return {
+            'model': loader.fingerprint(),
+            'decoding': decoding,
+            'decoding_params': DECODING_PROFILES[decoding],
+            'compact': kwargs.get('compact', 'auto'),
+            'constrained': kwargs.get('constrained', False),
+        }
+
+    def _java_files(self):
+        for root, dirs, files in os.walk(self.source_dir):
+            dirs[:] = sorted(d for d in dirs if d not in _SKIPPED_DIRS and not d.startswith('.'))
+            for file in sorted(files):
+                if file.endswith('.java'):
+                    yield os.path.join(root, file)
+
+    def _output_path(self, rel_path: str) -> str:
+        # 保留源码的相对目录，不同包中的同名实体类不会互相覆盖
+        return MapperGenerator._output_path(rel_path, os.path.join(self.output_dir, os.path.dirname(rel_path)))
+
+    def plan(self) -> List[tuple]:
+        """
+        找出需要生成的实体类，并在清单中记录非实体类和已删除的文件
+        :return: [(相对路径, 源码路径, 输出路径)]
+        """
+        pending = []
+        seen = set()
+        with self.reporter.phase('扫描源码树'):
+            for source_path in self._java_files():
+                rel_path = os.path.relpath(source_path, self.source_dir)
+                seen.add(rel_path)
+                try:
+                    with open(source_path, 'rb') as f:
+                        raw = f.read()
+                except OSError as e:
+                    self.reporter.error('读取源码', str(e), source_path)
+                    continue
+                sha1 = file_digest(raw)
+                if self.manifest.known_non_entity(rel_path, sha1):
+                    self.reporter.count('tree_non_entity')
+                    continue
+                if self.manifest.up_to_date(rel_path, sha1):
+                    self.reporter.count('tree_up_to_date')
+                    continue
+                if not is_entity(parse_entity(raw.decode('utf-8', errors='replace'))):
+                    self.manifest.update(rel_path, sha1=sha1, status=SKIPPED)
+                    self.reporter.count('tree_non_entity')
+                    continue
+                output_path = self._output_path(rel_path)
+                self.manifest.update(rel_path, sha1=sha1, status=PENDING, output=output_path, error=None)
+                pending.append((rel_path, source_path, output_path))
+            removed = self.manifest.remove_missing(seen)
+        self.reporter.count('tree_pending', len(pending))
+        self.reporter.info(f"待生成实体类: {len(pending)}，已是最新: {self.reporter.counters.get('tree_up_to_date', 0)}，"
+                           f"非实体类: {self.reporter.counters.get('tree_non_entity', 0)}，清单中删除: {removed}",
+                           pending=len(pending), removed=removed)
+        self.manifest.save()
+        return pending
+
+    def run(self) -> Dict[str, int]:
+        """
+        生成全部待处理的实体类，按Ctrl+C中断时保存已完成的结果
+        :return: 清单中各状态的任务数
+        """
+        pending = self.plan()
+        tasks = [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+        if not tasks:
+            return self.manifest.summary()
+
+        workers = min(self.workers, len(tasks))
+        # 各进程平分CPU核数
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        self.reporter.info(f"工作进程数: {workers}，每个进程{num_threads}个线程，任务数: {len(tasks)}",
+                           workers=workers, threads=num_threads, tasks=len(tasks))
+        with self.reporter.phase('生成Mapper'):
+            if workers == 1:
+                _init_worker(self.generator_kwargs, num_threads)
+                try:
+                    for task in tasks:
+                        try:
+                            results = _generate_task(task)
+                        except Exception as e:
+                            results = self._failed_results(task, e)
+                        self._record(results)
+                except KeyboardInterrupt:
+                    self.reporter.info("已中断，再次运行将从未完成的实体类继续")
+            else:
+                self._run_pool(tasks, workers, num_threads)
+        summary = self.manifest.summary()
+        self.reporter.info(f"完成: {summary[DONE]}，失败: {summary[FAILED]}，未完成: {summary[PENDING]}", **summary)
+        return summary
+
+    def _run_pool(self, tasks: List[List[tuple]], workers: int, num_threads: int):
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(self.generator_kwargs, num_threads))
+        futures = {executor.submit(_generate_task, task): task for task in tasks}
+        interrupted = False
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = futures.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # 工作进程异常退出（如内存不足）时这一批标记为失败，下次运行重试
+                        results = self._failed_results(task, e)
+                    self._record(results)
+        except KeyboardInterrupt:
+            interrupted = True
+            self.reporter.info("已中断，再次运行将从未完成的实体类继续")
+        finally:
+            executor.shutdown(wait=not interrupted, cancel_futures=True)
+
+    def _failed_results(self, task: List[tuple], error: Exception) -> List[Dict]:
+        """整批出错时把这一批的实体类都标记为失败"""
+        return [{'rel_path': rel_path, 'sha1': self.manifest.jobs[rel_path]['sha1'], 'status': FAILED,
+                 'seconds': None, 'error': f"{type(error).__name__}: {error}"} for rel_path, _, _ in task]
+
+    def _record(self, results: List[Dict]):
+        """记录一批结果并保存清单"""
+        for result in results:
+            rel_path = result['rel_path']
+            self.manifest.update(rel_path, sha1=result['sha1'], status=result['status'], error=result['error'],
+                                 seconds=result['seconds'], config=self.manifest.config_id)
+            self.reporter.count(f"tree_{result['status']}")
+            if result['error']:
+                self.reporter.error('生成Mapper', result['error'], os.path.join(self.source_dir, rel_path))
+        self.manifest.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为整个源码树中的实体类批量生成Mapper XML，中断后可继续")
+    parser.add_argument("source_dir", help="源码树根目录")
+    parser.add_argument("--output-dir", default="./generated_mappers")
+    parser.add_argument("--manifest", help="任务清单路径，默认为 输出目录/.generate_tree.json")
+    parser.add_argument("--workers", type=int, help="工作进程数，默认按CPU核数和可用内存确定")
+    parser.add_argument("--worker-memory-mb", type=int, default=2048, help="每个工作进程预计占用的内存")
+    parser.add_argument("--batch-size", type=int, default=4, help="每次前向计算的实体类数")
+    parser.add_argument("--base-model", default="facebook/opt-350m")
+    parser.add_argument("--checkpoint", default="./mybatis_mapper_generator")
+    parser.add_argument("--decoding", default=DEFAULT_PROFILE, choices=list(DECODING_PROFILES))
+    parser.add_argument("--compact", default="auto", choices=COMPACT_MODES,
+                        help="实体类源码压缩为字段摘要: off/auto(源码较长时)/always")
+    parser.add_argument("--constrain", action="store_true", help="约束解码为格式正确的XML")
+    parser.add_argument("--log-level", default="info", choices=list(AnalysisReporter.LEVELS))
+    args = parser.parse_args()
+
+    generator_kwargs = dict(base_model_name=args.base_model, checkpoint_path=args.checkpoint,
+                            decoding=args.decoding, compact=args.compact, constrained=args.constrain)
+    tree_generator = TreeGenerator(args.source_dir, args.output_dir, args.manifest, generator_kwargs,
+                                   args.workers, args.batch_size, args.worker_memory_mb,
+                                   AnalysisReporter(level=args.log_level))
+    summary = tree_generator.run()
+    raise SystemExit(1 if summary[FAILED] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,363 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from peft import PeftModel
+from typing import Callable, List
 import os
+import threading
+
+from .core.io_utils import atomic_write_text
+from .core.statement_index import StatementIndex
+from .core.template_engine import TemplateEngine
+from .decoding import (DECODING_PROFILES, DEFAULT_PROFILE, MAPPER_STOP_TAGS, SPECULATIVE_PROFILES,
+                       STATEMENT_STOP_TAGS, XmlStopCriteria, generation_kwargs, truncate_at_stop_tag)
+from .model_export import DEFAULT_EXPORT_PATH
+from .model_loader import LazyModel
+from .prefix_cache import PrefixCache
+from .prompt_compactor import COMPACT_MODES, entity_prompt_text
+from .prompts import MAPPER_INSTRUCTION, build_entity_prompt, build_mapper_prompt, build_statement_prompt
+from .result_cache import ResultCache
+from .speculative import DraftStats, NgramDrafter, greedy_logits_processor, mapper_draft_texts, speculative_generate
+from .xml_constraint import MAPPER_ROOTS, STATEMENT_ROOTS, XmlConstraintProcessor, close_xml
+
+
+def _interrupted(stopping_criteria) -> bool:
+    """额外的停止条件中是否有已中断的（如InterruptCriteria），被中断的输出不完整，不写入结果缓存"""
+    return any(getattr(criteria, 'interrupted', False) for criteria in stopping_criteria or [])
+
 
 class MapperGenerator:
-    def __init__(self, base_model_name="facebook/opt-350m", checkpoint_path="./mybatis_mapper_generator"):
+    def __init__(self, base_model_name="facebook/opt-350m", checkpoint_path="./mybatis_mapper_generator",
+                 use_prefix_cache: bool = True, decoding: str = DEFAULT_PROFILE,
+                 stop_tags=MAPPER_STOP_TAGS, template_engine: TemplateEngine = None,
+                 export_path: str = DEFAULT_EXPORT_PATH, result_cache: ResultCache = None,
+                 statement_index: StatementIndex = None, context_top_k: int = 3, context_max_tokens: int = 192,
+                 compact: str = 'auto', naming_patterns: dict = None, compact_threshold: int = 224,
+                 num_draft_tokens: int = 8, constrained: bool = False, allow_export_without_adapter: bool = False):
         """
         初始化生成器
         :param base_model_name: 基础模型名称
         :param checkpoint_path: 训练后的检查点路径
+        :param use_prefix_cache: 是否缓存固定指令前缀的KV，每个请求只预填充实体类部分
+        :param decoding: 解码配置 fast(贪心)/sampled(采样)/quality(束搜索)，见DECODING_PROFILES
+        :param stop_tags: 生成出这些结束标签后停止，只生成单条语句时可用STATEMENT_STOP_TAGS
+        :param template_engine: generate_statement使用的模板引擎，默认使用不依赖项目分析结果的TemplateEngine()，
+                                传入TemplateEngine.from_analyzer(analyzer)可使用项目的表名前缀和实体类字段
+        :param export_path: model_export导出的合并（可量化）模型路径，存在且与检查点一致时优先加载
+        :param result_cache: Mapper XML结果缓存（可选），相同实体类、模型和解码配置直接返回上次的结果，命中时不加载模型；
+                             采样的解码配置（sampled/quality）每次结果不同，不使用缓存
+        :param statement_index: 项目已有语句的检索索引（可选），检索到的相似语句作为示例注入提示
+        :param context_top_k: 最多注入的相似语句数
+        :param context_max_tokens: 注入的相似语句总长度上限（估算的token数）
+        :param compact: 实体类源码压缩为字段摘要的模式 off/auto/always，见prompt_compactor.COMPACT_MODES
+        :param naming_patterns: ProjectAnalyzer.naming_patterns（可选），字段摘要中的表名前缀和列名风格
+        :param compact_threshold: auto模式下源码超过该长度（估算的token数）时使用字段摘要，
+                                  与指令和context_max_tokens合计不超过512个token的提示窗口
+        :param num_draft_tokens: speculative解码每步最多草稿的token数
+        :param constrained: 是否约束解码（见xml_constraint.py）：只允许保持XML格式正确的token，
+                            达到max_new_tokens被截断的输出补全结束标签；每步需要检查候选token，默认关闭
+        :param allow_export_without_adapter: checkpoint_path不存在时是否直接使用export_path的导出模型
+                                             （只分发了导出的模型的部署），默认不使用
         """
-        # 设置环境变量
-        os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            base_model_name,
-            use_fast=True  # 使用快速分词器
-        )
-        base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_name,
-            torch_dtype=torch.float32,
-            device_map="auto",
-            low_cpu_mem_usage=True,  # 减少CPU内存使用
-        )
-        self.model = PeftModel.from_pretrained(base_model, checkpoint_path)
-        self.model.eval()  # 设置为评估模式
-        
-        # 预热模型
+        if decoding not in DECODING_PROFILES:
+            raise ValueError(f"未知的解码配置: {decoding}，可选: {', '.join(DECODING_PROFILES)}")
+        if compact not in COMPACT_MODES:
+            raise ValueError(f"未知的压缩模式: {compact}，可选: {', '.join(COMPACT_MODES)}")
+        # 模型在第一次需要时才加载，可调用warmup(background=True)提前在后台加载
+        self._loader = LazyModel(base_model_name, checkpoint_path, export_path, allow_export_without_adapter)
+        self.use_prefix_cache = use_prefix_cache
+        self.decoding = decoding
+        self.stop_tags = tuple(stop_tags)
+        self.template_engine = template_engine if template_engine is not None else TemplateEngine()
+        self.result_cache = result_cache
+        self.statement_index = statement_index
+        self.context_top_k = context_top_k
+        self.context_max_tokens = context_max_tokens
+        self.compact = compact
+        self.naming_patterns = naming_patterns
+        self.compact_threshold = compact_threshold
+        self.num_draft_tokens = num_draft_tokens
+        self.constrained = constrained
+        # speculative解码的累计草稿接受情况
+        self.draft_stats = DraftStats()
+        self._prefix_cache = None
+        self._prefix_cache_lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        return self._loader.get()[0]
+
+    @property
+    def model(self):
+        return self._loader.get()[1]
+
+    @property
+    def loaded(self) -> bool:
+        """模型是否已加载"""
+        return self._loader.loaded
+
+    def warmup(self, background: bool = False):
+        """
+        预热：加载模型、计算固定指令前缀的KV缓存，并做一次短输入的前向计算
+        :param background: 为True时在后台线程中预热并返回该线程，调用方可以同时做别的事（如等待用户输入）
+        """
+        if background:
+            thread = threading.Thread(target=self._warmup, name="mapper-generator-warmup", daemon=True)
+            thread.start()
+            return thread
         self._warmup()
-        
+        return None
+
     def _warmup(self):
         """预热模型，第一次推理通常较慢"""
-        dummy_input = "public class Test {}"
-        _ = self.generate_mapper(dummy_input)
+        self._loader.warmup()
+        if self.use_prefix_cache:
+            self._get_prefix_cache()
+
+    def _entity_text(self, entity_content: str) -> str:
+        """放入提示的实体类内容：源码或压缩后的字段摘要"""
+        return entity_prompt_text(entity_content, self.compact, self.naming_patterns, self.compact_threshold)
+
+    def _retrieve_examples(self, entity_content: str) -> List[str]:
+        """从项目已有语句中检索与实体类最相似的几条，作为提示中的示例"""
+        if self.statement_index is None or not self.context_top_k:
+            return []
+        return self.statement_index.retrieve_examples(entity_content, self.context_top_k, self.context_max_tokens)
 
-    def generate_mapper(self, entity_content: str, package_info: dict = None) -> str:
+    def _build_prompt(self, entity_content: str, package_info: dict = None, examples: List[str] = None) -> str:
+        """构建输入提示"""
+        return build_mapper_prompt(entity_content, package_info, examples)
+
+    def _get_prefix_cache(self):
+        """固定指令前缀的KV缓存，每个加载的模型只计算一次"""
+        if self._prefix_cache is None and PrefixCache.supported():
+            with self._prefix_cache_lock:
+                if self._prefix_cache is None:
+                    self._prefix_cache = PrefixCache(self.model, self.tokenizer, MAPPER_INSTRUCTION)
+        return self._prefix_cache
+
+    def _generation_kwargs(self, prompt_length: int, decoding: str = None, stop_tags=None,
+                           xml_roots=MAPPER_ROOTS) -> dict:
+        """生成参数，decoding/stop_tags未指定时使用初始化时的设置"""
+        return generation_kwargs(self.tokenizer, decoding or self.decoding, prompt_length,
+                                 stop_tags or self.stop_tags, xml_roots if self.constrained else None)
+
+    def _extract_xml(self, generated_text: str, stop_tags=None, xml_roots=MAPPER_ROOTS) -> str:
+        """提取XML部分"""
+        generated_text = truncate_at_stop_tag(generated_text, stop_tags or self.stop_tags)
+        try:
+            xml_start = generated_text.index('<?xml')
+            generated_text = generated_text[xml_start:]
+        except ValueError:
+            # 如果没有找到XML标记，使用整个生成的文本
+            pass
+        if self.constrained:
+            # 约束解码的输出只可能因max_new_tokens被截断，补全打开的元素
+            return close_xml(generated_text, xml_roots)
+        return generated_text
+
+    def _use_result_cache(self, decoding: str = None) -> bool:
+        """只有确定性的解码（不采样）才能复用上次的结果"""
+        return self.result_cache is not None and not DECODING_PROFILES[decoding or self.decoding].get('do_sample')
+
+    def _cache_key(self, entity_content: str, package_info: dict = None, decoding: str = None,
+                   examples: List[str] = None) -> str:
+        return self.result_cache.key(entity_content, package_info, self._loader.fingerprint(),
+                                     decoding or self.decoding, self.stop_tags, examples, self.constrained)
+
+    def generate_mapper(self, entity_content: str, package_info: dict = None, decoding: str = None,
+                        streamer=None, stopping_criteria: list = None) -> str:
         """
         为给定的实体类生成Mapper XML
         :param entity_content: 实体类的内容
         :param package_info: 包信息（可选）
+        :param decoding: 本次使用的解码配置（可选），见DECODING_PROFILES
+        :param streamer: transformers的streamer（可选），生成过程中逐步接收新token，只支持单束解码
+        :param stopping_criteria: 额外的停止条件（可选），如交互式生成中的InterruptCriteria
         :return: 生成的Mapper XML内容
         """
-        # 构建输入提示
-        prompt = f"""请根据以下Java实体类生成对应的MyBatis Mapper XML文件。
-
-Java实体类:
-{entity_content}
+        source = entity_content
+        entity_content = self._entity_text(source)
+        examples = self._retrieve_examples(entity_content)
+        # 流式请求需要逐步输出生成过程，不使用结果缓存
+        cache_key = None
+        if self._use_result_cache(decoding) and streamer is None:
+            cache_key = self._cache_key(entity_content, package_info, decoding, examples)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-生成的Mapper XML应该包含:
-1. 基本的CRUD操作
-2. ResultMap映射
-3. 正确的namespace
-4. 所有字段的映射
+        mapper_xml = self._generate(source, entity_content, package_info, examples, decoding or self.decoding,
+                                    streamer, stopping_criteria)
+        if cache_key is not None and not _interrupted(stopping_criteria):
+            self.result_cache.put(cache_key, mapper_xml)
+        return mapper_xml
 
-Mapper XML:
-"""
-        
-        # 如果提供了包信息，添加到提示中
-        if package_info:
-            package_context = f"""包信息:
-实体类包名: {package_info.get('entity_package', '')}
-Mapper包名: {package_info.get('mapper_package', '')}
+    def _generate(self, source: str, entity_content: str, package_info: dict, examples: List[str],
+                  decoding: str, streamer=None, stopping_criteria: list = None) -> str:
+        """
+        调用模型生成单个Mapper XML
+        :param source: 实体类源码（speculative解码用来渲染草稿模板）
+        :param entity_content: 放入提示的实体类内容（源码或字段摘要）
+        """
+        import torch
+        from transformers import StoppingCriteriaList
 
-"""
-            prompt = package_context + prompt
+        prefix_cache = self._get_prefix_cache() if self.use_prefix_cache else None
+        if prefix_cache is not None:
+            # 固定指令部分复用缓存，只需预填充实体类相关的提示
+            inputs = prefix_cache.build_inputs(build_entity_prompt(entity_content, package_info, examples),
+                                               max_length=512, num_beams=DECODING_PROFILES[decoding]['num_beams'])
+        else:
+            prompt = self._build_prompt(entity_content, package_info, examples)
+            encoded = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+            inputs = {"input_ids": encoded["input_ids"].to(self.model.device)}
 
         # 生成输出
-        inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
-        outputs = self.model.generate(
-            input_ids=inputs["input_ids"].to(self.model.device),
-            max_new_tokens=1024,  # 只使用 max_new_tokens
-            num_beams=5,  # 使用束搜索
-            temperature=0.7,
-            do_sample=True,
-            top_p=0.9,
-            repetition_penalty=1.2,
-            no_repeat_ngram_size=3,
-            pad_token_id=self.tokenizer.pad_token_id,
-            eos_token_id=self.tokenizer.eos_token_id,
-            early_stopping=True  # 现在可以使用 early_stopping，因为我们设置了 num_beams > 1
-        )
-        
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # 提取XML部分
-        try:
-            xml_start = generated_text.index('<?xml')
-            return generated_text[xml_start:]
-        except ValueError:
-            # 如果没有找到XML标记，返回整个生成的文本
-            return generated_text
+        if decoding in SPECULATIVE_PROFILES:
+            outputs = self._speculative_generate(source, package_info, inputs, decoding, streamer,
+                                                 stopping_criteria)
+        else:
+            kwargs = self._generation_kwargs(inputs["input_ids"].shape[1], decoding)
+            if stopping_criteria:
+                kwargs.setdefault('stopping_criteria', StoppingCriteriaList()).extend(stopping_criteria)
+            with torch.no_grad():
+                outputs = self.model.generate(**inputs, **kwargs, streamer=streamer)
+
+        generated_text = self.tokenizer.decode(outputs[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        return self._extract_xml(generated_text)
+
+    def _speculative_generate(self, source: str, package_info: dict, inputs: dict, decoding: str, streamer=None,
+                              stopping_criteria: list = None):
+        """草稿+验证解码，草稿来自为该实体类渲染的模板、提示和已生成的输出"""
+        from transformers import LogitsProcessorList, StoppingCriteriaList
+
+        drafter = NgramDrafter()
+        for text in mapper_draft_texts(source, package_info, self.naming_patterns):
+            drafter.add(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+        # 每步可能接受多个token，检查结束标签的窗口要覆盖整步
+        prompt_length = inputs["input_ids"].shape[1]
+        stop = XmlStopCriteria(self.tokenizer, prompt_length, self.stop_tags, window=8 + self.num_draft_tokens + 1)
+        logits_processor = greedy_logits_processor(decoding)
+        forced_draft = None
+        if self.constrained:
+            constraint = XmlConstraintProcessor(self.tokenizer, prompt_length, MAPPER_ROOTS)
+            logits_processor = LogitsProcessorList(list(logits_processor or []) + [constraint])
+            encoded = {}
+
+            def forced_draft(context: List[int]) -> List[int]:
+                # 结束标签的剩余部分等结构上确定的文本直接作为草稿，一次前向即可验证
+                text = constraint.forced_text(context[prompt_length:])
+                if text and text not in encoded:
+                    encoded[text] = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+                return list(encoded[text]) if text else []
+        return speculative_generate(self.model, inputs, drafter, DECODING_PROFILES[decoding]['max_new_tokens'],
+                                    self.tokenizer.eos_token_id, logits_processor,
+                                    StoppingCriteriaList([stop] + list(stopping_criteria or [])),
+                                    self.num_draft_tokens, streamer, self.draft_stats, forced_draft)
+
+    def generate_statement(self, request: str, decoding: str = None) -> str:
+        """
+        按自然语言需求生成单条语句，如“生成根据id更新User的status的sql”
+        模板引擎能识别的需求直接用模板生成，其余的回退到模型
+        :param request: 自然语言需求
+        :param decoding: 本次使用的解码配置（可选）
+        :return: 生成的语句XML
+        """
+        if self.template_engine is not None:
+            xml = self.template_engine.generate(request)
+            if xml is not None:
+                return xml
+
+        import torch
+
+        inputs = self.tokenizer(build_statement_prompt(request), return_tensors="pt", truncation=True, max_length=512)
+        prompt_length = inputs["input_ids"].shape[1]
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids=inputs["input_ids"].to(self.model.device),
+                **self._generation_kwargs(prompt_length, decoding, STATEMENT_STOP_TAGS, STATEMENT_ROOTS)
+            )
+        generated_text = self.tokenizer.decode(outputs[0][prompt_length:], skip_special_tokens=True)
+        return self._extract_xml(generated_text, STATEMENT_STOP_TAGS, STATEMENT_ROOTS).strip()
+
+    def generate_mappers(self, entity_contents: List[str], package_infos: List[dict] = None,
+                         batch_size: int = 4, on_result: Callable[[int, str], None] = None,
+                         decoding: str = None, stopping_criteria: list = None) -> List[str]:
+        """
+        批量为多个实体类生成Mapper XML
+        提示按token长度排序后分批，同一批内长度接近，左侧填充的token最少；每批生成完成后立即回调
+        :param entity_contents: 实体类内容列表
+        :param package_infos: 与entity_contents一一对应的包信息（可选）
+        :param batch_size: 每次前向计算的序列数
+        :param on_result: 每个结果生成后的回调 on_result(输入下标, Mapper XML)
+        :param decoding: 本次使用的解码配置（可选），见DECODING_PROFILES
+        :param stopping_criteria: 每批额外的停止条件（可选），如服务中所有请求都已超时时中断的InterruptCriteria
+        :return: 与输入顺序一致的Mapper XML列表
+        """
+        package_infos = package_infos or [None] * len(entity_contents)
+        sources = entity_contents
+        entity_contents = [self._entity_text(content) for content in sources]
+        examples = [self._retrieve_examples(content) for content in entity_contents]
+        results = [None] * len(entity_contents)
+        cache_keys = [None] * len(entity_contents)
+        pending = list(range(len(entity_contents)))
+        if self._use_result_cache(decoding):
+            # 命中缓存的实体类直接返回，只为其余的调用模型
+            pending = []
+            for index, (content, info) in enumerate(zip(entity_contents, package_infos)):
+                cache_keys[index] = self._cache_key(content, info, decoding, examples[index])
+                results[index] = self.result_cache.get(cache_keys[index])
+                if results[index] is None:
+                    pending.append(index)
+                elif on_result:
+                    on_result(index, results[index])
+        if not pending:
+            return results
+
+        if (decoding or self.decoding) in SPECULATIVE_PROFILES:
+            # 草稿解码只支持单条序列，逐个生成
+            for index in pending:
+                results[index] = self._generate(sources[index], entity_contents[index], package_infos[index],
+                                                examples[index], decoding or self.decoding,
+                                                stopping_criteria=stopping_criteria)
+                if cache_keys[index] is not None and not _interrupted(stopping_criteria):
+                    self.result_cache.put(cache_keys[index], results[index])
+                if on_result:
+                    on_result(index, results[index])
+            return results
+
+        import torch
+        from transformers import StoppingCriteriaList
+
+        prompts = {i: self._build_prompt(entity_contents[i], package_infos[i], examples[i]) for i in pending}
+        encoded = dict(zip(pending, self.tokenizer([prompts[i] for i in pending], truncation=True,
+                                                   max_length=512)["input_ids"]))
+        order = sorted(pending, key=lambda i: len(encoded[i]))
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = self.tokenizer.pad({"input_ids": [encoded[i] for i in batch]}, return_tensors="pt")
+            prompt_length = inputs["input_ids"].shape[1]
+            kwargs = self._generation_kwargs(prompt_length, decoding)
+            if stopping_criteria:
+                kwargs.setdefault('stopping_criteria', StoppingCriteriaList()).extend(stopping_criteria)
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_ids=inputs["input_ids"].to(self.model.device),
+                    attention_mask=inputs["attention_mask"].to(self.model.device),
+                    **kwargs
+                )
+            for index, output in zip(batch, outputs):
+                generated_text = self.tokenizer.decode(output[prompt_length:], skip_special_tokens=True)
+                results[index] = self._extract_xml(generated_text)
+                if cache_keys[index] is not None and not _interrupted(stopping_criteria):
+                    self.result_cache.put(cache_keys[index], results[index])
+                if on_result:
+                    on_result(index, results[index])
+        return results
+
+    @staticmethod
+    def _output_path(java_file_path: str, output_dir: str) -> str:
+        """生成输出文件名"""
+        file_name = os.path.basename(java_file_path)
+        return os.path.join(output_dir, file_name.replace('.java', 'Mapper.xml'))
 
     def generate_mapper_for_file(self, java_file_path: str, output_dir: str = "./generated_mappers"):
         """
@@ -107,12 +375,40 @@ Mapper包名: {package_info.get('mapper_package', '')}
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
 
-        # 生成输出文件名
-        file_name = os.path.basename(java_file_path)
-        output_file = os.path.join(output_dir, file_name.replace('.java', 'Mapper.xml'))
-
         # 保存生成的Mapper
+        output_file = self._output_path(java_file_path, output_dir)
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(mapper_content)
 
-        return output_file 
\ No newline at end of file
+        return output_file
+
+    def generate_mappers_for_dir(self, entity_dir: str, output_dir: str = "./generated_mappers",
+                                 batch_size: int = 4) -> List[str]:
+        """
+        批量为目录（含子目录）下的所有Java实体类生成Mapper XML
+        输出保留实体类相对entity_dir的子目录，不同包中的同名实体类不会互相覆盖
+        :param entity_dir: 实体类所在目录
+        :param output_dir: 输出目录
+        :param batch_size: 每次前向计算的序列数
+        :return: 生成的文件路径列表
+        """
+        java_files = sorted(
+            os.path.join(root, file)
+            for root, _, files in os.walk(entity_dir)
+            for file in files if file.endswith('.java')
+        )
+        entity_contents = []
+        for java_file_path in java_files:
+            with open(java_file_path, 'r', encoding='utf-8') as f:
+                entity_contents.append(f.read())
+
+        output_files = [self._output_path(path, os.path.join(output_dir, os.path.relpath(os.path.dirname(path),
+                                                                                           entity_dir)))
+                        for path in java_files]
+
+        def write_result(index: int, mapper_content: str):
+            # 每个结果生成后立即写入，不必等整个目录处理完
+            atomic_write_text(output_files[index], mapper_content)
+
+        self.generate_mappers(entity_contents, batch_size=batch_size, on_result=write_result)
+        return output_files
@@ -1,80 +1,118 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from peft import PeftModel
+import argparse
 import os
+import threading
+import time
+from typing import Tuple
+
+from .core.statement_index import StatementIndex
+from .decoding import DECODING_PROFILES, DEFAULT_PROFILE, InterruptCriteria, TimingStreamer
+from .inference import MapperGenerator
+from .model_export import DEFAULT_EXPORT_PATH
+from .prompt_compactor import COMPACT_MODES
 
 class InteractiveMapperGenerator:
-    def __init__(self, base_model_name="facebook/opt-350m", checkpoint_path="./mybatis_mapper_generator"):
-        """初始化生成器并预热"""
-        print("正在加载模型...")
-        os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            base_model_name,
-            use_fast=True
-        )
-        base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_name,
-            torch_dtype=torch.float32,
-            device_map="auto",
-            low_cpu_mem_usage=True,
-        )
-        self.model = PeftModel.from_pretrained(base_model, checkpoint_path)
-        self.model.eval()
+    def __init__(self, base_model_name="facebook/opt-350m", checkpoint_path="./mybatis_mapper_generator",
+                 decoding: str = DEFAULT_PROFILE, export_path: str = DEFAULT_EXPORT_PATH,
+                 statement_index: StatementIndex = None, compact: str = 'auto', constrained: bool = False):
+        """
+        初始化生成器并在后台预热，模型加载、提示构建和解码都交给MapperGenerator
+        :param decoding: 解码配置 fast/sampled/quality
+        :param export_path: model_export导出的合并模型路径，存在且与检查点一致时优先加载
+        :param statement_index: 项目已有语句的检索索引（可选），相似语句作为示例注入提示
+        :param compact: 实体类源码压缩为字段摘要的模式 off/auto/always，见prompt_compactor.COMPACT_MODES
+        :param constrained: 是否约束解码为格式正确的XML，中断或截断的输出补全结束标签
+        """
+        self.generator = MapperGenerator(base_model_name, checkpoint_path, decoding=decoding,
+                                         export_path=export_path, statement_index=statement_index,
+                                         compact=compact, constrained=constrained)
+        self.template_engine = self.generator.template_engine
         
-        print("模型加载完成，正在预热...")
-        self._warmup()
-        print("预热完成，可以开始生成了！")
+        # 模型在后台线程中加载和预热，用户可以同时输入实体类代码
+        print("正在后台加载模型，可以直接开始输入...")
+        self._warmup_thread = threading.Thread(target=self._warmup, name="mapper-warmup", daemon=True)
+        self._warmup_thread.start()
 
     def _warmup(self):
-        """预热模型"""
-        dummy_input = "public class Test {}"
-        _ = self.generate_mapper(dummy_input)
+        """预热模型：加载模型、计算固定指令前缀的KV缓存并做一次短输入的前向计算"""
+        try:
+            self.generator.warmup()
+        except Exception as e:
+            # 预热失败不影响会话，第一次生成时会重新尝试加载并报告错误
+            print(f"\n模型预热失败: {str(e)}")
 
     def generate_mapper(self, entity_content: str) -> str:
         """生成Mapper XML"""
-        prompt = f"""请根据以下Java实体类生成对应的MyBatis Mapper XML文件。
+        return self.generator.generate_mapper(entity_content)
 
-Java实体类:
-{entity_content}
+    def stream_mapper(self, entity_content: str) -> Tuple[str, dict]:
+        """
+        流式生成Mapper XML，新生成的文本立即输出到终端
+        生成过程中按Ctrl+C提前结束生成，保留已生成的部分
+        :param entity_content: 实体类代码或需求描述
+        :return: (Mapper XML, 统计信息: ttft首token延迟秒数, tokens新生成token数, tokens_per_second, interrupted)
+        """
+        from transformers import TextIteratorStreamer
 
-生成的Mapper XML应该包含:
-1. 基本的CRUD操作
-2. ResultMap映射
-3. 正确的namespace
-4. 所有字段的映射
+        start = time.perf_counter()
+        if DECODING_PROFILES[self.generator.decoding]['num_beams'] > 1:
+            # streamer不支持束搜索，quality配置生成完成后一次性输出
+            mapper_xml = self.generate_mapper(entity_content)
+            print(mapper_xml)
+            return mapper_xml, {'ttft': None, 'tokens': None, 'tokens_per_second': None, 'interrupted': False,
+                                'seconds': time.perf_counter() - start}
 
-Mapper XML:
-"""
-        
-        with torch.no_grad():
-            inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
-            outputs = self.model.generate(
-                input_ids=inputs["input_ids"].to(self.model.device),
-                max_new_tokens=1024,
-                num_beams=5,
-                temperature=0.7,
-                do_sample=True,
-                top_p=0.9,
-                repetition_penalty=1.2,
-                no_repeat_ngram_size=3,
-                pad_token_id=self.tokenizer.pad_token_id,
-                eos_token_id=self.tokenizer.eos_token_id,
-                early_stopping=True
-            )
-        
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
+        interrupt = InterruptCriteria()
+        streamer = TextIteratorStreamer(self.generator.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        # 按streamer收到的token计数：草稿+验证解码一步可能接受多个token，停止条件的调用次数不等于token数
+        timing = TimingStreamer(streamer)
+        results, errors = [], []
+
+        def run():
+            try:
+                results.append(self.generator.generate_mapper(entity_content, streamer=timing,
+                                                              stopping_criteria=[interrupt]))
+            except Exception as e:
+                errors.append(e)
+                # 出错时结束streamer，避免前台线程一直等待
+                streamer.end()
+
+        worker = threading.Thread(target=run, name="mapper-generate", daemon=True)
+        worker.start()
+
+        first_token_at = None
         try:
-            xml_start = generated_text.index('<?xml')
-            return generated_text[xml_start:]
-        except ValueError:
-            return generated_text
+            for text in streamer:
+                if text and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                print(text, end='', flush=True)
+        except KeyboardInterrupt:
+            # 生成在下一步结束，剩余的文本不再输出
+            interrupt.interrupt()
+            print("\n[已中断，保留已生成的部分]")
+            for _ in streamer:
+                pass
+        worker.join()
+        print()
+        if errors:
+            raise errors[0]
+
+        end = time.perf_counter()
+        # 首token之后的解码速度，预填充的耗时体现在ttft中
+        decode_seconds = end - timing.first_token_at if timing.first_token_at is not None else 0.0
+        decoded_tokens = timing.new_tokens - timing.first_tokens
+        stats = {
+            'ttft': first_token_at - start if first_token_at is not None else None,
+            'tokens': timing.new_tokens,
+            'tokens_per_second': decoded_tokens / decode_seconds if decode_seconds > 0 else None,
+            'interrupted': interrupt.interrupted,
+            'seconds': end - start,
+        }
+        return results[0], stats
 
     def interactive_session(self):
         """交互式生成会话"""
         print("\n=== MyBatis Mapper 交互式生成器 ===")
-        print("请输入Java实体类代码 (输入 'exit' 结束，输入 'done' 完成当前输入)")
+        print("请输入Java实体类代码或需求描述 (输入 'exit' 结束，输入 'done' 完成当前输入)")
         
         while True:
             print("\n等待输入...")
@@ -101,12 +139,23 @@ Mapper XML:
             entity_content = '\n'.join(lines)
             
             try:
-                print("\n正在生成Mapper XML...")
-                mapper_xml = self.generate_mapper(entity_content)
+                # 能识别的常见需求（如“生成根据id更新User的status的sql”）直接用模板生成
+                mapper_xml = self.template_engine.generate(entity_content)
+                if mapper_xml is not None:
+                    print(f"\n模板命中，无需调用模型 (命中率: {self.template_engine.hit_rate:.0%})")
+                else:
+                    if not self.generator.loaded:
+                        print("\n模型仍在加载，请稍候...")
+                    print("\n正在生成Mapper XML (按Ctrl+C可提前结束)...")
                 print("\n生成的Mapper XML:")
                 print("=" * 50)
-                print(mapper_xml)
-                print("=" * 50)
+                if mapper_xml is not None:
+                    print(mapper_xml)
+                    print("=" * 50)
+                else:
+                    mapper_xml, stats = self.stream_mapper(entity_content)
+                    print("=" * 50)
+                    print(self._format_stats(stats))
                 
                 save = input("\n是否保存到文件? (y/n): ")
                 if save.lower() == 'y':
@@ -119,11 +168,41 @@ Mapper XML:
                         f.write(mapper_xml)
                     print(f"已保存到: {file_path}")
             
+            except KeyboardInterrupt:
+                # 束搜索不能流式输出，中断后没有可保留的部分
+                print("\n已取消本次生成")
             except Exception as e:
                 print(f"生成过程中出现错误: {str(e)}")
 
+    @staticmethod
+    def _format_stats(stats: dict) -> str:
+        parts = [f"耗时: {stats['seconds']:.2f}s"]
+        if stats['ttft'] is not None:
+            parts.append(f"首token: {stats['ttft']:.2f}s")
+        if stats['tokens'] is not None:
+            parts.append(f"生成token: {stats['tokens']}")
+        if stats['tokens_per_second'] is not None:
+            parts.append(f"速度: {stats['tokens_per_second']:.1f} tokens/s")
+        if stats['interrupted']:
+            parts.append("已中断")
+        return " | ".join(parts)
+
 def main():
-    generator = InteractiveMapperGenerator()
+    parser = argparse.ArgumentParser(description="MyBatis Mapper 交互式生成器")
+    parser.add_argument("--decoding", default=DEFAULT_PROFILE, choices=list(DECODING_PROFILES),
+                        help="解码配置: fast(贪心)/sampled(采样)/quality(束搜索)")
+    parser.add_argument("--compact", default="auto", choices=COMPACT_MODES,
+                        help="实体类源码压缩为字段摘要: off/auto(源码较长时)/always")
+    parser.add_argument("--mapper-dir", help="项目的Mapper XML目录，检索其中的相似语句注入提示")
+    parser.add_argument("--index-path", default=".statement_index.json", help="语句索引文件，再次启动时增量更新")
+    parser.add_argument("--constrain", action="store_true", help="约束解码为格式正确的XML")
+    args = parser.parse_args()
+    statement_index = None
+    if args.mapper_dir:
+        statement_index = StatementIndex(args.index_path)
+        statement_index.scan_dir(args.mapper_dir)
+    generator = InteractiveMapperGenerator(decoding=args.decoding, statement_index=statement_index,
+                                           compact=args.compact, constrained=args.constrain)
     generator.interactive_session()
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+# 导出目录中的说明文件，记录基础模型、量化方式和导出时LoRA适配器的哈希
+EXPORT_INFO_FILE = "export_info.json"
+# 动态int8量化后的权重文件（未量化时使用save_pretrained的标准格式）
+QUANTIZED_WEIGHTS_FILE = "model_int8.pt"
+DEFAULT_EXPORT_PATH = "./mybatis_mapper_generator_merged"
+
+
+def adapter_digest(checkpoint_path: str) -> str:
+    """计算LoRA适配器配置和权重的哈希，用于判断导出的模型是否过期"""
+    digest = hashlib.sha1()
+    for file_name in sorted(os.listdir(checkpoint_path)):
+        if file_name.startswith('adapter_'):
+            with open(os.path.join(checkpoint_path, file_name), 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_export_info(export_path: str) -> Optional[dict]:
+    """读取导出说明，目录不是导出的模型时返回None"""
+    info_path = os.path.join(export_path, EXPORT_INFO_FILE)
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def is_export_current(export_path: str, checkpoint_path: str, base_model_name: str,
+                      allow_without_adapter: bool = False) -> bool:
+    """
+    导出的模型存在，基于同一个基础模型，且与当前的LoRA适配器一致（重新训练后需要重新导出）
+    :param export_path: 导出目录
+    :param checkpoint_path: LoRA适配器路径
+    :param base_model_name: 要求的基础模型名称，与导出时记录的不同则视为过期
+    :param allow_without_adapter: 适配器目录不存在时是否信任导出的模型（只分发了导出的模型的部署）
+    """
+    info = read_export_info(export_path)
+    if info is None or info.get('base_model_name') != base_model_name:
+        return False
+    if not os.path.isdir(checkpoint_path):
+        # 没有适配器可供比较，只有调用方明确允许时才使用
+        return allow_without_adapter
+    return info.get('adapter_digest') == adapter_digest(checkpoint_path)
+
+
+def _prepare_export_dir(output_path: str) -> str:
+    """
+    创建导出用的临时目录（与导出目录同级），导出完成后由_commit_export_dir替换导出目录
+    导出目录已存在但不是导出的模型（没有说明文件）且不为空时拒绝覆盖，避免误删其他文件
+    :return: 临时目录
+    """
+    if os.path.isdir(output_path) and os.listdir(output_path) and read_export_info(output_path) is None:
+        raise ValueError(f"导出目录不为空且不是导出的模型，拒绝覆盖: {output_path}")
+    tmp_path = os.path.normpath(output_path) + ".tmp"
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    return tmp_path
+
+
+def _commit_export_dir(tmp_path: str, output_path: str):
+    """用临时目录整体替换导出目录，上次导出的权重文件（如切换--quantize后的model_int8.pt）不会残留"""
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    os.replace(tmp_path, output_path)
+
+
+def export_merged_model(base_model_name: str, checkpoint_path: str, output_path: str = DEFAULT_EXPORT_PATH,
+                        quantize: Optional[str] = None) -> str:
+    """
+    把LoRA适配器合并进基础模型权重并保存为单独的推理模型
+    合并后推理时不再有LoRA的额外矩阵乘法，也不需要在每次启动时加载peft
+    :param base_model_name: 基础模型名称
+    :param checkpoint_path: LoRA适配器（训练输出）路径
+    :param output_path: 导出目录
+    :param quantize: 'int8' 时对Linear层做动态int8量化（适用于CPU推理）
+    :return: 导出目录
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    from peft import PeftModel
+
+    if quantize not in (None, 'int8'):
+        raise ValueError(f"不支持的量化方式: {quantize}")
+    # 先导出到临时目录，完成后整体替换导出目录
+    export_path = _prepare_export_dir(output_path)
+
+    tokenizer = AutoTokenizer.from_pretrained(base_model_name, use_fast=True)
+    base_model = AutoModelForCausalLM.from_pretrained(base_model_name, torch_dtype=torch.float32,
+                                                      low_cpu_mem_usage=True)
+    model = PeftModel.from_pretrained(base_model, checkpoint_path).merge_and_unload()
+    model.eval()
+
+    tokenizer.save_pretrained(export_path)
+    if quantize == 'int8':
+        # 量化模型不能用save_pretrained保存：保存配置和量化后的state_dict，加载时按相同方式量化后载入
+        model.config.save_pretrained(export_path)
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        torch.save(quantized.state_dict(), os.path.join(export_path, QUANTIZED_WEIGHTS_FILE))
+    else:
+        model.save_pretrained(export_path)
+
+    info = {
+        'base_model_name': base_model_name,
+        'checkpoint_path': os.path.abspath(checkpoint_path),
+        'adapter_digest': adapter_digest(checkpoint_path),
+        'quantize': quantize,
+    }
+    # 说明文件最后写入，导出中断时临时目录不会被当作可用的模型
+    with open(os.path.join(export_path, EXPORT_INFO_FILE), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    _commit_export_dir(export_path, output_path)
+    return output_path
+
+
+def load_exported_model(export_path: str):
+    """
+    加载export_merged_model导出的模型
+    :return: (tokenizer, model)
+    """
+    import torch
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForCausalLM
+
+    info = read_export_info(export_path)
+    tokenizer = AutoTokenizer.from_pretrained(export_path, use_fast=True)
+    if info.get('quantize') == 'int8':
+        config = AutoConfig.from_pretrained(export_path)
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        state_dict = torch.load(os.path.join(export_path, QUANTIZED_WEIGHTS_FILE), map_location="cpu")
+        model.load_state_dict(state_dict)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            export_path,
+            torch_dtype=torch.float32,
+            device_map="auto",
+            low_cpu_mem_usage=True,
+        )
+    model.eval()
+    return tokenizer, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并LoRA适配器并导出推理模型")
+    parser.add_argument("--base-model", default="facebook/opt-350m")
+    parser.add_argument("--checkpoint", default="./mybatis_mapper_generator", help="LoRA适配器路径")
+    parser.add_argument("--output", default=DEFAULT_EXPORT_PATH, help="导出目录")
+    parser.add_argument("--quantize", choices=["int8"], help="对Linear层做动态int8量化（CPU推理）")
+    args = parser.parse_args()
+    output_path = export_merged_model(args.base_model, args.checkpoint, args.output, args.quantize)
+    print(f"已导出到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import threading
+from typing import Optional
+
+from .model_export import adapter_digest, is_export_current, load_exported_model, read_export_info
+
+
+class LazyModel:
+    """
+    延迟加载的分词器和模型
+
+    torch/transformers/peft 只在第一次使用模型时才导入和加载，导入本模块和创建生成器都不需要等待；
+    get() 线程安全，后台预热线程和前台请求同时触发时只会加载一次
+    """
+
+    def __init__(self, base_model_name: str, checkpoint_path: str, export_path: Optional[str] = None,
+                 allow_export_without_adapter: bool = False):
+        """
+        :param base_model_name: 基础模型名称
+        :param checkpoint_path: 训练后的检查点路径
+        :param export_path: model_export导出的合并模型路径，存在且与基础模型、检查点一致时优先加载
+        :param allow_export_without_adapter: 检查点目录不存在时是否直接使用导出的模型（只分发了导出的模型）
+        """
+        self.base_model_name = base_model_name
+        self.checkpoint_path = checkpoint_path
+        self.export_path = export_path
+        self.allow_export_without_adapter = allow_export_without_adapter
+        self._tokenizer = None
+        self._model = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def fingerprint(self) -> str:
+        """
+        标识将要加载的权重（基础模型 + LoRA适配器或导出的模型），不需要加载模型
+        用作结果缓存键的一部分，重新训练或重新导出后随之变化
+        """
+        if self._fingerprint is None:
+            if self._use_export():
+                info = read_export_info(self.export_path)
+                weights = f"export:{info.get('adapter_digest')}:{info.get('quantize')}"
+            elif os.path.isdir(self.checkpoint_path):
+                weights = f"adapter:{adapter_digest(self.checkpoint_path)}"
+            else:
+                weights = "base"
+            self._fingerprint = f"{self.base_model_name}|{weights}"
+        return self._fingerprint
+
+    def _use_export(self) -> bool:
+        """是否加载导出的模型"""
+        return bool(self.export_path) and is_export_current(self.export_path, self.checkpoint_path,
+                                                            self.base_model_name, self.allow_export_without_adapter)
+
+    def get(self):
+        """返回 (tokenizer, model)，第一次调用时加载"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load()
+        return self._tokenizer, self._model
+
+    def _load(self):
+        # 设置环境变量
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        if self._use_export():
+            # 已合并LoRA（可能已量化）的模型：加载更快、内存更少、每个token少了LoRA的计算
+            tokenizer, model = load_exported_model(self.export_path)
+        else:
+            tokenizer, model = self._load_with_adapter()
+        # 仅解码器模型批量生成时需要在左侧填充
+        tokenizer.padding_side = "left"
+        self._tokenizer = tokenizer
+        self._model = model
+
+    def _load_with_adapter(self):
+        """加载基础模型并套上LoRA适配器"""
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        from peft import PeftModel
+
+        tokenizer = AutoTokenizer.from_pretrained(
+            self.base_model_name,
+            use_fast=True  # 使用快速分词器
+        )
+        base_model = AutoModelForCausalLM.from_pretrained(
+            self.base_model_name,
+            torch_dtype=torch.float32,
+            device_map="auto",
+            low_cpu_mem_usage=True,  # 减少CPU内存使用
+        )
+        model = PeftModel.from_pretrained(base_model, self.checkpoint_path)
+        model.eval()  # 设置为评估模式
+        return tokenizer, model
+
+    def warmup(self):
+        """加载模型并做一次短输入的前向计算，第一次推理通常较慢"""
+        import torch
+
+        tokenizer, model = self.get()
+        inputs = tokenizer("public class Test {}", return_tensors="pt")
+        with torch.no_grad():
+            model(input_ids=inputs["input_ids"].to(model.device))
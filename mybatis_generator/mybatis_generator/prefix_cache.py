@@ -0,0 +1,70 @@
+import copy
+
+
+class PrefixCache:
+    """
+    固定提示前缀的KV缓存
+
+    每个加载的模型只对前缀做一次前向计算，之后每个请求复用前缀的past_key_values，
+    预填充（prefill）只需要计算随请求变化的那部分提示
+    """
+
+    def __init__(self, model, tokenizer, prefix: str):
+        """
+        :param model: 已加载的模型
+        :param tokenizer: 分词器
+        :param prefix: 所有请求共用的提示前缀
+        """
+        import torch
+        from transformers import DynamicCache
+
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"].to(model.device)
+        with torch.no_grad():
+            self.past_key_values = model(
+                input_ids=self.prefix_ids,
+                past_key_values=DynamicCache(),
+                use_cache=True
+            ).past_key_values
+
+    @staticmethod
+    def supported() -> bool:
+        """旧版本transformers不支持把预先计算的缓存传给generate（束搜索复制缓存需要4.42+的batch_repeat_interleave）"""
+        try:
+            from transformers import DynamicCache
+        except ImportError:
+            return False
+        return hasattr(DynamicCache, 'batch_repeat_interleave')
+
+    @property
+    def prefix_length(self) -> int:
+        return self.prefix_ids.shape[1]
+
+    def build_inputs(self, text: str, max_length: int = 512, num_beams: int = 1) -> dict:
+        """
+        构建带前缀缓存的generate输入
+        :param text: 前缀之后的提示文本
+        :param max_length: 整个提示（含前缀）的最大token数
+        :param num_beams: 束搜索的束数，缓存需要按束数复制
+        :return: 可直接传给model.generate的参数
+        """
+        import torch
+
+        suffix_ids = self.tokenizer(
+            text,
+            return_tensors="pt",
+            add_special_tokens=False,
+            truncation=True,
+            max_length=max(1, max_length - self.prefix_length)
+        )["input_ids"].to(self.model.device)
+        input_ids = torch.cat([self.prefix_ids, suffix_ids], dim=1)
+        # generate会在缓存上继续追加，每个请求使用一份副本
+        past_key_values = copy.deepcopy(self.past_key_values)
+        if num_beams > 1:
+            past_key_values.batch_repeat_interleave(num_beams)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "past_key_values": past_key_values
+        }
@@ -0,0 +1,142 @@
+from typing import Dict, List, Optional
+
+import javalang
+
+from .core.code_analyzer import ProjectAnalyzer
+from .core.statement_index import estimate_tokens
+from .core.templates import table_name_for, to_snake_case
+
+# off: 始终使用实体类源码；auto: 源码较长时使用字段摘要；always: 始终使用字段摘要
+COMPACT_MODES = ('off', 'auto', 'always')
+
+# 声明表名/列名的注解（JPA、MyBatis-Plus）
+_TABLE_ANNOTATIONS = {'Table', 'TableName'}
+_COLUMN_ANNOTATIONS = {'Column', 'TableField', 'TableId'}
+# 不对应数据库列的字段
+_SKIPPED_MODIFIERS = {'static', 'transient'}
+
+
+def _unquote(value: Optional[str]) -> Optional[str]:
+    if isinstance(value, str) and len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _annotated_name(annotations: List[Dict], names: set) -> Optional[str]:
+    """从 @Column(name = "...") / @TableField("...") 这类注解中取出声明的名称"""
+    for annotation in annotations:
+        if annotation['name'] in names:
+            elements = annotation['elements']
+            name = _unquote(elements.get('name') or elements.get('value'))
+            if name:
+                return name
+    return None
+
+
+def _is_mapped(field_declaration) -> bool:
+    """静态、transient以及 @Transient / @TableField(exist = false) 的字段不对应数据库列"""
+    if field_declaration.modifiers & _SKIPPED_MODIFIERS:
+        return False
+    for annotation in ProjectAnalyzer._extract_annotations(field_declaration.annotations):
+        if annotation['name'] == 'Transient':
+            return False
+        if annotation['name'] == 'TableField' and annotation['elements'].get('exist') == 'false':
+            return False
+    return True
+
+
+def _format_type(field: Dict) -> str:
+    if field.get('generic_type'):
+        return f"{field['type']}<{', '.join(field['generic_type'])}>"
+    return field['type']
+
+
+def parse_entity(entity_content: str, naming_patterns: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    解析实体类源码中与生成Mapper有关的信息
+    :param entity_content: 实体类的内容
+    :param naming_patterns: ProjectAnalyzer.naming_patterns（可选），用于推断表名和列名
+    :return: {'name', 'package', 'table_name', 'fields': [{'name', 'type', 'generic_type', 'column'}]}，
+             源码无法解析或没有类声明时返回None；没有注解声明表名且未提供naming_patterns时table_name为None
+    """
+    try:
+        tree = javalang.parse.parse(entity_content)
+    except Exception:
+        return None
+    node = next((node for node in tree.types if isinstance(node, javalang.tree.ClassDeclaration)), None)
+    if node is None:
+        return None
+
+    naming_patterns = naming_patterns or {}
+    column_style = naming_patterns.get('column_style', 'snake_case')
+    table_name = _annotated_name(ProjectAnalyzer._extract_annotations(node.annotations), _TABLE_ANNOTATIONS)
+    if table_name is None and 'table_prefix' in naming_patterns:
+        entity_suffix = naming_patterns.get('entity_suffix', '')
+        entity_name = node.name[:-len(entity_suffix)] if entity_suffix and node.name.endswith(entity_suffix) \
+            else node.name
+        table_name = table_name_for(entity_name, naming_patterns['table_prefix'])
+
+    fields = []
+    for declaration in node.fields:
+        if not _is_mapped(declaration):
+            continue
+        column = _annotated_name(ProjectAnalyzer._extract_annotations(declaration.annotations), _COLUMN_ANNOTATIONS)
+        for field in ProjectAnalyzer._extract_fields(_SingleField(declaration)):
+            name = field['name']
+            field['column'] = column or (to_snake_case(name) if column_style == 'snake_case' else name)
+            fields.append(field)
+    return {
+        'name': node.name,
+        'package': tree.package.name if tree.package else '',
+        'table_name': table_name,
+        'fields': fields,
+    }
+
+
+def compact_entity(entity_content: str, naming_patterns: Optional[Dict] = None) -> Optional[str]:
+    """
+    把实体类源码压缩为字段摘要：类全名、表名、命名规则，以及每个字段的属性名、类型和列名
+    注释、注解、getter/setter等与生成Mapper无关的内容都不再进入提示
+    :param entity_content: 实体类的内容
+    :param naming_patterns: ProjectAnalyzer.naming_patterns（可选），用于推断表名和列名
+    :return: 字段摘要，源码无法解析或没有类声明时返回None
+    """
+    entity = parse_entity(entity_content, naming_patterns)
+    if entity is None:
+        return None
+    package = entity['package']
+    lines = [f"实体类: {package + '.' if package else ''}{entity['name']}"]
+    if entity['table_name']:
+        lines.append(f"表名: {entity['table_name']}")
+    if naming_patterns:
+        lines.append(f"命名规则: 表名前缀 {naming_patterns.get('table_prefix') or '无'}，"
+                     f"列名 {naming_patterns.get('column_style', 'snake_case')}")
+    lines.append("字段（属性 类型 列名）:")
+    for field in entity['fields']:
+        lines.append(f"{field['name']} {_format_type(field)} {field['column']}")
+    return '\n'.join(lines)
+
+
+class _SingleField:
+    """让ProjectAnalyzer._extract_fields只处理一个字段声明（同一声明中的多个变量共用注解）"""
+
+    def __init__(self, declaration):
+        self.fields = [declaration]
+
+
+def entity_prompt_text(entity_content: str, mode: str = 'auto', naming_patterns: Optional[Dict] = None,
+                       max_tokens: int = 224) -> str:
+    """
+    选择放入提示的实体类内容
+    :param entity_content: 实体类的内容
+    :param mode: off/auto/always，见COMPACT_MODES
+    :param naming_patterns: ProjectAnalyzer.naming_patterns（可选）
+    :param max_tokens: auto模式下源码超过该长度（估算的token数）时改用字段摘要，
+                       避免提示超过512个token被截断、丢掉源码后面的字段
+    :return: 实体类源码或字段摘要
+    """
+    if mode not in COMPACT_MODES:
+        raise ValueError(f"未知的压缩模式: {mode}，可选: {', '.join(COMPACT_MODES)}")
+    if mode == 'off' or (mode == 'auto' and estimate_tokens(entity_content) <= max_tokens):
+        return entity_content
+    return compact_entity(entity_content, naming_patterns) or entity_content
@@ -0,0 +1,59 @@
+from typing import List
+
+# 所有生成请求共用的固定指令，放在提示的最前面，便于缓存其KV（见prefix_cache.py）
+MAPPER_INSTRUCTION = """请根据以下Java实体类生成对应的MyBatis Mapper XML文件。
+
+生成的Mapper XML应该包含:
+1. 基本的CRUD操作
+2. ResultMap映射
+3. 正确的namespace
+4. 所有字段的映射
+
+"""
+
+
+def build_entity_prompt(entity_content: str, package_info: dict = None, examples: List[str] = None) -> str:
+    """
+    构建固定指令之后、随请求变化的那部分提示
+    :param entity_content: 实体类的内容
+    :param package_info: 包信息（可选）
+    :param examples: 项目中已有的相似语句（可选），见StatementIndex.retrieve_examples
+    """
+    prompt = ""
+    # 如果提供了包信息，添加到提示中
+    if package_info:
+        prompt += f"""包信息:
+实体类包名: {package_info.get('entity_package', '')}
+Mapper包名: {package_info.get('mapper_package', '')}
+
+"""
+    if examples:
+        prompt += "项目中已有的相似语句（沿用其中的表名、列名、resultMap和sql片段）:\n"
+        prompt += "\n".join(examples) + "\n\n"
+    prompt += f"""Java实体类:
+{entity_content}
+
+Mapper XML:
+"""
+    return prompt
+
+
+def build_mapper_prompt(entity_content: str, package_info: dict = None, examples: List[str] = None) -> str:
+    """构建完整的输入提示"""
+    return MAPPER_INSTRUCTION + build_entity_prompt(entity_content, package_info, examples)
+
+
+# 与训练数据（TrainingDataGenerator / train.py）一致的指令
+STATEMENT_INSTRUCTION = "根据input的内容解析出其中的实体类名，和需要的功能，再通过功能生成对应的Mybatis Mapper XML"
+
+
+def build_statement_prompt(request: str) -> str:
+    """构建按自然语言需求生成单条语句的提示，格式与train.py的训练提示一致"""
+    return f"""
+### 指令: {STATEMENT_INSTRUCTION}
+
+### 输入: 
+{request}
+
+### 输出:
+"""
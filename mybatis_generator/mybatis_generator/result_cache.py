@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List, Optional
+
+from .core.io_utils import atomic_write_text
+from .decoding import DECODING_PROFILES
+from .prompts import build_mapper_prompt
+
+DEFAULT_CACHE_DIR = "./.mapper_cache"
+
+# Java源码切分为：字符串字面量（原样保留）、注释、空白、其它字符
+_JAVA_TOKEN_PATTERN = re.compile(
+    r'(?P<string>"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'
+    r'|(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<space>\s+)'
+    r'|(?P<code>[^"\'/\s]+|.)',
+    re.DOTALL
+)
+_WORD_CHAR = re.compile(r'[\w$]')
+
+
+def normalize_source(source: str, ignore_comments: bool = False) -> str:
+    """
+    规范化实体类源码，用于计算缓存键
+    默认只统一换行符并去掉行尾和首尾空白；ignore_comments为True时还会去掉注释并合并所有空白，
+    只改了格式或注释的实体类也能命中缓存
+    """
+    if ignore_comments:
+        return _strip_comments_and_spaces(source)
+    lines = source.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def _strip_comments_and_spaces(source: str) -> str:
+    """去掉注释，空白只在分隔两个标识符/关键字时保留为一个空格"""
+    result = []
+    separated = False
+    for match in _JAVA_TOKEN_PATTERN.finditer(source):
+        if match.lastgroup in ('comment', 'space'):
+            separated = True
+            continue
+        text = match.group()
+        if separated and result and _WORD_CHAR.match(result[-1][-1]) and _WORD_CHAR.match(text[0]):
+            result.append(' ')
+        separated = False
+        result.append(text)
+    return ''.join(result)
+
+
+class ResultCache:
+    """
+    按内容寻址的Mapper XML结果缓存
+
+    键由规范化后的实体类源码、完整提示、模型权重标识（基础模型+LoRA适配器/导出模型）、
+    解码配置和结束标签共同计算，任何一项变化都不会命中旧结果。
+    每个结果保存为缓存目录下的一个文件，以文件修改时间记录最近使用时间，
+    条目数或总大小超过上限时淘汰最久未使用的条目
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = 1000,
+                 max_bytes: int = 64 * 1024 * 1024, ignore_comments: bool = False):
+        """
+        :param cache_dir: 缓存目录
+        :param max_entries: 最多保留的条目数
+        :param max_bytes: 所有条目的总大小上限（字节）
+        :param ignore_comments: 计算键时忽略注释和空白差异
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ignore_comments = ignore_comments
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 缓存文件名 -> 大小，第一次写入时扫描目录建立，之后随写入更新，超过上限时才重新扫描
+        self._sizes: Optional[dict] = None
+        self._total_bytes = 0
+
+    def key(self, entity_content: str, package_info: Optional[dict], model_fingerprint: str,
+            decoding: str, stop_tags, examples: Optional[List[str]] = None, constrained: bool = False) -> str:
+        """
+        计算缓存键
+        :param entity_content: 实体类内容
+        :param package_info: 包信息（可选）
+        :param model_fingerprint: 模型权重标识，见LazyModel.fingerprint
+        :param decoding: 解码配置名
+        :param stop_tags: 结束标签
+        :param examples: 注入提示的项目相似语句（可选），项目Mapper变化后旧结果失效
+        :param constrained: 是否使用了XML约束解码
+        """
+        payload = {
+            'prompt': build_mapper_prompt(normalize_source(entity_content, self.ignore_comments), package_info,
+                                          examples),
+            'model': model_fingerprint,
+            'decoding': decoding,
+            # 解码配置的内容改动后旧结果失效
+            'decoding_params': DECODING_PROFILES[decoding],
+            'stop_tags': list(stop_tags),
+            'constrained': constrained,
+            'ignore_comments': self.ignore_comments,
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.xml")
+
+    def get(self, key: str) -> Optional[str]:
+        """查找缓存，命中时更新该条目的最近使用时间"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                mapper_xml = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return mapper_xml
+
+    def put(self, key: str, mapper_xml: str):
+        """保存结果并按上限淘汰最久未使用的条目"""
+        path = self._path(key)
+        with self._lock:
+            if self._sizes is None:
+                self._scan()
+            atomic_write_text(path, mapper_xml)
+            self._total_bytes += os.path.getsize(path) - self._sizes.get(path, 0)
+            self._sizes[path] = os.path.getsize(path)
+            if len(self._sizes) > self.max_entries or self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> list:
+        """扫描缓存目录，重建条目大小的记录，返回按最近使用时间排序的 (mtime, size, path)"""
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                # 跳过atomic_write_text写入中的临时文件
+                if entry.name.endswith('.xml') and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+        self._sizes = {path: size for _, size, path in entries}
+        self._total_bytes = sum(self._sizes.values())
+        return entries
+
+    def _evict(self):
+        """重新扫描（读取命中会更新修改时间，其它进程也可能写入）后淘汰最久未使用的条目"""
+        entries = self._scan()
+        while entries and (len(self._sizes) > self.max_entries or self._total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._sizes[path]
+            self._total_bytes -= size
+
+    def clear(self):
+        """删除所有缓存条目"""
+        with self._lock:
+            if os.path.isdir(self.cache_dir):
+                for entry in os.scandir(self.cache_dir):
+                    if entry.name.endswith('.xml'):
+                        os.remove(entry.path)
+            self._sizes = {}
+            self._total_bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 4)}
@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .decoding import DECODING_PROFILES, InterruptCriteria
+from .prompt_compactor import COMPACT_MODES
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+                504: 'Gateway Timeout'}
+
+
+class _Job:
+    """队列中的一个生成请求"""
+    __slots__ = ('entity', 'package_info', 'decoding', 'future', 'chunks', 'cancelled', 'enqueued_at')
+
+    def __init__(self, entity: str, package_info: Optional[dict], decoding: str, future: asyncio.Future,
+                 chunks: Optional[asyncio.Queue] = None):
+        self.entity = entity
+        self.package_info = package_info
+        self.decoding = decoding
+        self.future = future
+        self.chunks = chunks  # 流式请求接收新生成文本的队列
+        self.cancelled = False
+        self.enqueued_at = time.perf_counter()
+
+    def cancel(self):
+        """请求超时或客户端断开：排队中的不再生成，正在生成的在下一步中断（见_stop_when）"""
+        self.cancelled = True
+
+    def fail(self, error: Exception):
+        """以错误结束请求，流式请求同时结束输出"""
+        if not self.future.done():
+            self.future.set_exception(error)
+        if self.chunks is not None:
+            self.chunks.put_nowait(None)
+
+
+def _stop_when(jobs: List[_Job]):
+    """一批请求全部取消后中断生成的停止条件；批内各序列一起解码，只有部分取消时继续生成其余请求"""
+    return InterruptCriteria(lambda: all(job.cancelled for job in jobs))
+
+
+class GenerationServer:
+    """
+    本地生成服务
+
+    多个客户端（IDE插件、CI任务）共享同一个已加载的MapperGenerator：
+    - 请求进入有界的asyncio队列，队列满时直接返回503（背压），不会无限堆积
+    - 单个工作线程执行生成；取出一个请求后在max_wait_ms内继续收集同时到达的请求，
+      相同解码配置的请求合并成一批调用generate_mappers
+    - 每个请求有超时，超时的请求如果还在排队就不再生成；正在生成的一批请求全部超时（流式请求的客户端断开）时中断生成
+    - stream=true 时以分块传输（每行一个JSON）逐步返回新生成的文本，流式请求单独执行
+    """
+
+    def __init__(self, generator, max_batch_size: int = 4, max_wait_ms: int = 20, max_queue: int = 64,
+                 request_timeout: float = 300.0, max_body_bytes: int = 1 << 20):
+        """
+        :param generator: MapperGenerator
+        :param max_batch_size: 一批最多合并的请求数
+        :param max_wait_ms: 收集同一批请求的最长等待时间
+        :param max_queue: 排队请求上限，超过时返回503
+        :param request_timeout: 单个请求的超时时间（秒）
+        :param max_body_bytes: 请求体大小上限
+        """
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+        self._queue: Optional[asyncio.Queue] = None
+        # 模型不是线程安全的，所有生成都在这一个线程里执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mapper-generate')
+        self.stats = {'requests': 0, 'batches': 0, 'rejected': 0, 'timeouts': 0, 'template_hits': 0}
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, unix_socket: Optional[str] = None):
+        """启动服务并一直运行"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        worker = asyncio.ensure_future(self._batch_worker())
+        if unix_socket:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+            print(f"服务已启动: unix:{unix_socket}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            print(f"服务已启动: http://{host}:{port}")
+        # 在后台加载和预热模型，服务启动后立即可以接受请求
+        asyncio.get_event_loop().run_in_executor(self._executor, self.generator.warmup)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+            self._executor.shutdown(wait=False)
+
+    # ---------- 批处理 ----------
+
+    async def _batch_worker(self):
+        loop = asyncio.get_event_loop()
+        # 上一轮取出但不能合并的请求，本轮最先处理；不放回有界队列，既不会因队列已满出错，也不会排到队尾
+        carry: Optional[_Job] = None
+        while True:
+            if carry is not None:
+                job, carry = carry, None
+            else:
+                job = await self._queue.get()
+            batch = [job]
+            try:
+                if job.cancelled:
+                    continue
+                if job.chunks is not None:
+                    await self._run_stream(loop, job)
+                    continue
+
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if nxt.cancelled:
+                        continue
+                    if nxt.chunks is not None or nxt.decoding != job.decoding:
+                        # 流式请求和不同解码配置的请求不能合并，留到下一轮处理
+                        carry = nxt
+                        break
+                    batch.append(nxt)
+                await self._run_batch(loop, batch)
+            except Exception as e:
+                # 只结束这一轮的请求，工作协程继续处理之后的请求
+                for failed in batch:
+                    failed.fail(e)
+
+    async def _run_batch(self, loop, batch: List[_Job]):
+        self.stats['batches'] += 1
+        try:
+            results = await loop.run_in_executor(
+                self._executor,
+                lambda: self.generator.generate_mappers(
+                    [job.entity for job in batch],
+                    package_infos=[job.package_info for job in batch],
+                    batch_size=len(batch),
+                    decoding=batch[0].decoding,
+                    stopping_criteria=[_stop_when(batch)]
+                )
+            )
+        except Exception as e:
+            for job in batch:
+                job.fail(e)
+            return
+        for job, result in zip(batch, results):
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _run_stream(self, loop, job: _Job):
+        self.stats['batches'] += 1
+        readers = []
+
+        def generate():
+            from transformers import TextIteratorStreamer
+
+            # 在生成线程中创建streamer：模型尚未加载完时访问tokenizer会等待加载，不能阻塞事件循环
+            streamer = TextIteratorStreamer(self.generator.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+            def forward_chunks():
+                # 在线程中读取streamer，把新文本交给事件循环
+                for text in streamer:
+                    loop.call_soon_threadsafe(job.chunks.put_nowait, text)
+
+            reader = threading.Thread(target=forward_chunks, daemon=True)
+            reader.start()
+            readers.append(reader)
+            try:
+                return self.generator.generate_mapper(job.entity, job.package_info, job.decoding, streamer=streamer,
+                                                      stopping_criteria=[_stop_when([job])])
+            except Exception:
+                streamer.end()
+                raise
+
+        try:
+            result = await loop.run_in_executor(self._executor, generate)
+        except Exception as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        for reader in readers:
+            await loop.run_in_executor(None, reader.join)
+        job.chunks.put_nowait(None)
+
+    # ---------- HTTP ----------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self._read_request(reader)
+            if path == '/health' and method == 'GET':
+                await self._send_json(writer, 200, {
+                    'status': 'ok',
+                    'model_loaded': self.generator.loaded,
+                    'queued': self._queue.qsize(),
+                    'stats': self.stats
+                })
+            elif path in ('/generate', '/statement'):
+                if method != 'POST':
+                    await self._send_json(writer, 405, {'error': '只支持POST'})
+                else:
+                    await self._handle_generate(writer, path, body)
+            else:
+                await self._send_json(writer, 404, {'error': f'未知路径: {path}'})
+        except _HttpError as e:
+            await self._send_json(writer, e.status, {'error': e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        parts = request_line.split()
+        if len(parts) < 2:
+            raise _HttpError(400, '请求格式错误')
+        method, path = parts[0].upper(), parts[1].split('?')[0]
+        length = 0
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    raise _HttpError(400, 'Content-Length不是合法的整数')
+                if length < 0:
+                    raise _HttpError(400, 'Content-Length不能为负数')
+        if length > self.max_body_bytes:
+            raise _HttpError(413, '请求体过大')
+        body = await reader.readexactly(length) if length else b''
+        return method, path, body
+
+    async def _handle_generate(self, writer: asyncio.StreamWriter, path: str, body: bytes):
+        try:
+            payload = json.loads(body.decode('utf-8') or '{}')
+        except ValueError:
+            raise _HttpError(400, '请求体不是合法的JSON')
+        if not isinstance(payload, dict):
+            raise _HttpError(400, '请求体必须是JSON对象')
+        self.stats['requests'] += 1
+        decoding = payload.get('decoding') or self.generator.decoding
+        if decoding not in DECODING_PROFILES:
+            raise _HttpError(400, f"未知的解码配置: {decoding}")
+
+        if path == '/statement':
+            request = payload.get('request')
+            if not request:
+                raise _HttpError(400, '缺少request字段')
+            # 模板能处理的需求直接返回，不进入队列
+            xml = self.generator.template_engine.generate(request)
+            if xml is None:
+                raise _HttpError(400, '无法用模板生成该需求，请使用/generate并提供实体类')
+            self.stats['template_hits'] += 1
+            await self._send_json(writer, 200, {'mapper': xml, 'source': 'template'})
+            return
+
+        entity = payload.get('entity')
+        if not entity:
+            raise _HttpError(400, '缺少entity字段')
+        stream = bool(payload.get('stream'))
+        if stream and DECODING_PROFILES[decoding]['num_beams'] > 1:
+            raise _HttpError(400, '流式输出只支持单束解码配置（fast/sampled）')
+
+        loop = asyncio.get_event_loop()
+        job = _Job(entity, payload.get('package_info'), decoding, loop.create_future(),
+                   asyncio.Queue() if stream else None)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            raise _HttpError(503, '排队请求过多，请稍后重试')
+
+        if stream:
+            await self._stream_response(writer, job)
+            return
+        try:
+            result = await asyncio.wait_for(asyncio.shield(job.future), self.request_timeout)
+        except asyncio.TimeoutError:
+            job.cancel()
+            self.stats['timeouts'] += 1
+            raise _HttpError(504, '生成超时')
+        except Exception as e:
+            raise _HttpError(500, str(e))
+        await self._send_json(writer, 200, {
+            'mapper': result,
+            'source': 'model',
+            'seconds': round(time.perf_counter() - job.enqueued_at, 3)
+        })
+
+    async def _stream_response(self, writer: asyncio.StreamWriter, job: _Job):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n'
+                     b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        deadline = time.perf_counter() + self.request_timeout
+        try:
+            while True:
+                try:
+                    text = await asyncio.wait_for(job.chunks.get(), max(0.0, deadline - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    self.stats['timeouts'] += 1
+                    await self._write_chunk(writer, {'error': '生成超时'})
+                    break
+                if text is None:
+                    if job.future.exception() is not None:
+                        await self._write_chunk(writer, {'error': str(job.future.exception())})
+                    else:
+                        await self._write_chunk(writer, {'done': True, 'mapper': job.future.result()})
+                    break
+                if text:
+                    await self._write_chunk(writer, {'text': text})
+        finally:
+            # 超时或客户端断开（写入出错）时，排队中的请求不再生成，正在生成的在下一步中断
+            if not job.future.done():
+                job.cancel()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    async def _write_chunk(writer: asyncio.StreamWriter, data: Dict):
+        line = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+        writer.write(f'{len(line):x}\r\n'.encode('ascii') + line + b'\r\n')
+        await writer.drain()
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, data: Dict):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {_STATUS_TEXT.get(status, "")}\r\n'
+                     f'Content-Type: application/json; charset=utf-8\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地Mapper生成服务，多个客户端共享同一个已加载的模型")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="监听Unix socket而不是TCP端口")
+    parser.add_argument("--base-model", default="facebook/opt-350m")
+    parser.add_argument("--checkpoint", default="./mybatis_mapper_generator")
+    parser.add_argument("--decoding", default="fast", choices=list(DECODING_PROFILES))
+    parser.add_argument("--batch-size", type=int, default=4, help="一批最多合并的请求数")
+    parser.add_argument("--max-wait-ms", type=int, default=20, help="收集同一批请求的最长等待时间")
+    parser.add_argument("--max-queue", type=int, default=64, help="排队请求上限")
+    parser.add_argument("--timeout", type=float, default=300.0, help="单个请求的超时时间（秒）")
+    parser.add_argument("--cache-dir", help="Mapper XML结果缓存目录，不指定时不缓存")
+    parser.add_argument("--cache-ignore-comments", action="store_true", help="缓存键忽略实体类的注释和空白差异")
+    parser.add_argument("--compact", default="auto", choices=COMPACT_MODES,
+                        help="实体类源码压缩为字段摘要: off/auto(源码较长时)/always")
+    parser.add_argument("--mapper-dir", help="项目的Mapper XML目录，检索其中的相似语句注入提示")
+    parser.add_argument("--index-path", default=".statement_index.json", help="语句索引文件，再次启动时增量更新")
+    parser.add_argument("--constrain", action="store_true", help="约束解码为格式正确的XML")
+    args = parser.parse_args()
+
+    from .inference import MapperGenerator
+    from .core.statement_index import StatementIndex
+    from .result_cache import ResultCache
+    result_cache = ResultCache(args.cache_dir, ignore_comments=args.cache_ignore_comments) if args.cache_dir else None
+    statement_index = None
+    if args.mapper_dir:
+        statement_index = StatementIndex(args.index_path)
+        statement_index.scan_dir(args.mapper_dir)
+    generator = MapperGenerator(base_model_name=args.base_model, checkpoint_path=args.checkpoint,
+                                decoding=args.decoding, result_cache=result_cache, statement_index=statement_index,
+                                compact=args.compact, constrained=args.constrain)
+    server = GenerationServer(generator, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms,
+                              max_queue=args.max_queue, request_timeout=args.timeout)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        print("服务已停止")
+
+
+if __name__ == "__main__":
+    main()
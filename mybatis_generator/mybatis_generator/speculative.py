@@ -0,0 +1,257 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .core.sample_synthesizer import synthesize_entity_samples
+from .core.templates import table_name_for
+from .decoding import DECODING_PROFILES
+from .prompt_compactor import parse_entity
+
+MAPPER_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE mapper PUBLIC "-//mybatis.org//DTD Mapper 3.0//EN" "http://mybatis.org/dtd/mybatis-3-mapper.dtd">
+"""
+
+
+class NgramDrafter:
+    """
+    n-gram草稿生成器
+
+    记录若干token序列（模板渲染出的语句、提示、已生成的输出）中每个n-gram之后出现的token，
+    草稿时用当前输出末尾最长能匹配上的n-gram，直接复制其在原序列中的后续token。
+    同一n-gram以最近加入的出现位置为准，已生成的输出优先于提示和模板
+    """
+
+    def __init__(self, max_ngram: int = 3):
+        """
+        :param max_ngram: 匹配的最长n-gram，匹配不上时逐步缩短到1
+        """
+        self.max_ngram = max_ngram
+        self._sequences = []
+        self._index = {}
+
+    def add(self, tokens: List[int]) -> int:
+        """加入一条序列，返回其编号（可用extend继续追加）"""
+        self._sequences.append(list(tokens))
+        sequence_id = len(self._sequences) - 1
+        self._index_range(sequence_id, 1)
+        return sequence_id
+
+    def extend(self, sequence_id: int, tokens: List[int]):
+        """在已加入的序列末尾追加token"""
+        sequence = self._sequences[sequence_id]
+        start = len(sequence)
+        sequence.extend(tokens)
+        self._index_range(sequence_id, start)
+
+    def _index_range(self, sequence_id: int, start: int):
+        """索引以位置p结尾（p之后还有token）的各阶n-gram"""
+        sequence = self._sequences[sequence_id]
+        for position in range(max(1, start), len(sequence)):
+            for n in range(1, min(self.max_ngram, position) + 1):
+                self._index[tuple(sequence[position - n:position])] = (sequence_id, position)
+
+    def draft(self, context: List[int], max_tokens: int) -> List[int]:
+        """
+        :param context: 当前的完整序列
+        :param max_tokens: 最多草稿的token数
+        :return: 草稿token，没有匹配时为空
+        """
+        if max_tokens <= 0:
+            return []
+        for n in range(min(self.max_ngram, len(context)), 0, -1):
+            hit = self._index.get(tuple(context[-n:]))
+            if hit is not None:
+                sequence_id, position = hit
+                return self._sequences[sequence_id][position:position + max_tokens]
+        return []
+
+
+def mapper_draft_texts(entity_content: str, package_info: dict = None,
+                       naming_patterns: Optional[Dict] = None) -> List[str]:
+    """
+    为实体类渲染草稿语料：Mapper文件头、resultMap和Base_Column_List骨架，
+    以及TrainingDataGenerator使用的各类语句模板
+    :param entity_content: 实体类源码
+    :param package_info: 包信息（可选），用于namespace
+    :param naming_patterns: ProjectAnalyzer.naming_patterns（可选），用于表名和列名
+    :return: 文本列表，源码无法解析时只有Mapper文件头
+    """
+    entity = parse_entity(entity_content, naming_patterns)
+    if entity is None:
+        return [MAPPER_HEADER]
+    name = entity['name']
+    entity_package = (package_info or {}).get('entity_package') or entity['package']
+    mapper_package = (package_info or {}).get('mapper_package') or entity_package.replace('entity', 'mapper')
+    table_name = entity['table_name'] or table_name_for(name, (naming_patterns or {}).get('table_prefix', 't'))
+    fields = entity['fields']
+
+    mappings = '\n'.join(
+        f'        <{"id" if field["name"] == "id" else "result"} column="{field["column"]}" '
+        f'property="{field["name"]}"/>'
+        for field in fields
+    )
+    skeleton = f"""{MAPPER_HEADER}<mapper namespace="{mapper_package}.{name}Mapper">
+    <resultMap id="BaseResultMap" type="{entity_package}.{name}">
+{mappings}
+    </resultMap>
+
+    <sql id="Base_Column_List">
+        {', '.join(field['column'] for field in fields)}
+    </sql>
+"""
+    statements = synthesize_entity_samples(name, table_name, [dict(field) for field in fields])
+    return [skeleton] + [statement['xml'] for statement in statements]
+
+
+class DraftStats:
+    """草稿解码的累计统计：验证步数、草稿token数、被接受的草稿token数和生成的token数"""
+
+    def __init__(self):
+        self.steps = 0
+        self.drafted = 0
+        self.accepted = 0
+        self.new_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, steps: int, drafted: int, accepted: int, new_tokens: int):
+        with self._lock:
+            self.steps += steps
+            self.drafted += drafted
+            self.accepted += accepted
+            self.new_tokens += new_tokens
+
+    @property
+    def acceptance_rate(self) -> float:
+        """草稿token被接受的比例"""
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def tokens_per_step(self) -> float:
+        """每次前向计算平均生成的token数（普通贪心解码为1）"""
+        return self.new_tokens / self.steps if self.steps else 0.0
+
+    def stats(self) -> Dict:
+        return {'steps': self.steps, 'drafted': self.drafted, 'accepted': self.accepted,
+                'new_tokens': self.new_tokens, 'acceptance_rate': round(self.acceptance_rate, 4),
+                'tokens_per_step': round(self.tokens_per_step, 4)}
+
+
+def greedy_logits_processor(profile: str):
+    """与generate对该解码配置所做的相同的logits处理（目前只有重复惩罚），不需要时返回None"""
+    from transformers import LogitsProcessorList, RepetitionPenaltyLogitsProcessor
+
+    penalty = DECODING_PROFILES[profile].get('repetition_penalty')
+    if penalty is None or penalty == 1.0:
+        return None
+    return LogitsProcessorList([RepetitionPenaltyLogitsProcessor(penalty)])
+
+
+def _greedy_token(context: List[int], logits, logits_processor) -> int:
+    """对一个位置的logits应用与generate相同的处理（如重复惩罚）后取最大值"""
+    import torch
+
+    scores = logits.float()
+    if logits_processor is not None:
+        scores = logits_processor(torch.tensor([context], device=logits.device), scores)
+    return int(scores.argmax(dim=-1)[0])
+
+
+def speculative_generate(model, inputs: dict, drafter: NgramDrafter, max_new_tokens: int, eos_token_id: int,
+                         logits_processor=None, stopping_criteria=None, num_draft_tokens: int = 8,
+                         streamer=None, stats: Optional[DraftStats] = None,
+                         forced_draft: Optional[Callable[[List[int]], List[int]]] = None):
+    """
+    草稿+验证的贪心解码
+
+    每步由drafter草稿若干token，与上一步确定的token一起做一次前向计算，
+    从头逐个比较模型在各位置的贪心选择，接受一致的最长前缀，KV缓存截回到已接受的位置。
+    输出与逐token的贪心解码相同，草稿越准每次前向生成的token越多。
+    草稿全部被接受时下一步多草稿2个token，否则少草稿1个（不超过num_draft_tokens）
+    :param model: 已加载的模型
+    :param inputs: {'input_ids', 可选 'past_key_values'}，batch大小为1（可直接使用PrefixCache.build_inputs的结果）
+    :param drafter: 草稿生成器，已加入模板等语料；提示和生成的输出会追加进去
+    :param max_new_tokens: 最多生成的token数
+    :param eos_token_id: 结束token
+    :param logits_processor: 与generate一致的logits处理（LogitsProcessorList，可选）
+    :param stopping_criteria: 停止条件（StoppingCriteriaList，可选），每步接受后检查
+    :param num_draft_tokens: 每步最多草稿的token数
+    :param streamer: transformers的streamer（可选）
+    :param stats: 累计统计（可选）
+    :param forced_draft: 给出结构上确定的后续token（可选），如约束解码时结束标签的剩余部分，
+                         放在草稿最前面，其后再接drafter的草稿
+    :return: 提示和生成的输出 [1, 长度] 张量
+    """
+    import torch
+    from transformers import DynamicCache
+
+    if not hasattr(DynamicCache, 'crop'):
+        # 回退被拒绝的草稿需要裁剪缓存
+        raise RuntimeError("speculative解码需要transformers>=4.42.0（DynamicCache.crop）")
+
+    input_ids = inputs["input_ids"]
+    past_key_values = inputs.get("past_key_values")
+    if past_key_values is None:
+        past_key_values = DynamicCache()
+    elif not isinstance(past_key_values, DynamicCache):
+        past_key_values = DynamicCache.from_legacy_cache(past_key_values)
+
+    sequence = input_ids[0].tolist()
+    prompt_length = len(sequence)
+    live = drafter.add(sequence)
+    if streamer is not None:
+        streamer.put(input_ids.cpu())
+
+    steps = drafted = accepted_drafts = 0
+    draft_limit = num_draft_tokens
+    with torch.no_grad():
+        cached = past_key_values.get_seq_length()
+        outputs = model(input_ids=input_ids[:, cached:], past_key_values=past_key_values, use_cache=True)
+        past_key_values = outputs.past_key_values
+        next_token = _greedy_token(sequence, outputs.logits[:, -1, :], logits_processor)
+
+        while len(sequence) - prompt_length < max_new_tokens:
+            if next_token == eos_token_id:
+                sequence.append(next_token)
+                break
+            remaining = max_new_tokens - (len(sequence) - prompt_length)
+            limit = min(draft_limit, remaining - 1)
+            draft = forced_draft(sequence + [next_token])[:limit] if forced_draft is not None and limit > 0 else []
+            draft += drafter.draft(sequence + [next_token] + draft, limit - len(draft))
+            candidate = [next_token] + draft
+            outputs = model(input_ids=torch.tensor([candidate], device=input_ids.device),
+                            past_key_values=past_key_values, use_cache=True)
+            past_key_values = outputs.past_key_values
+            steps += 1
+            drafted += len(draft)
+
+            accepted = [next_token]
+            for position, token in enumerate(draft):
+                predicted = _greedy_token(sequence + accepted, outputs.logits[:, position, :], logits_processor)
+                if predicted != token:
+                    next_token = predicted
+                    break
+                accepted.append(token)
+            else:
+                next_token = _greedy_token(sequence + accepted, outputs.logits[:, len(draft), :], logits_processor)
+            accepted_drafts += len(accepted) - 1
+            draft_limit = min(draft_limit + 2, num_draft_tokens) if draft and len(accepted) > len(draft) \
+                else max(1, draft_limit - 1)
+
+            if eos_token_id in accepted:
+                accepted = accepted[:accepted.index(eos_token_id) + 1]
+            # 缓存中多出的是未被接受的草稿
+            past_key_values.crop(len(sequence) + len(accepted))
+            sequence.extend(accepted)
+            drafter.extend(live, accepted)
+            if streamer is not None:
+                streamer.put(torch.tensor(accepted))
+            if accepted[-1] == eos_token_id:
+                break
+            if stopping_criteria is not None and \
+                    torch.as_tensor(stopping_criteria(torch.tensor([sequence], device=input_ids.device), None)).any():
+                break
+
+    if streamer is not None:
+        streamer.end()
+    if stats is not None:
+        stats.add(steps, drafted, accepted_drafts, len(sequence) - prompt_length)
+    return torch.tensor([sequence], device=input_ids.device)
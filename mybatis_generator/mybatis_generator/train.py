@@ -1,25 +1,58 @@
+import argparse
+import copy
+import hashlib
+import json
 import os
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments
-from datasets import Dataset, DatasetDict
-from peft import LoraConfig, get_peft_model
-from trl import SFTTrainer
-from core.training_data_generator import TrainingDataGenerator
 import random
+from typing import Dict, Iterable, List, Optional
 
-# 限制PyTorch使用的线程数
-os.environ["OMP_NUM_THREADS"] = "1"
-os.environ["MKL_NUM_THREADS"] = "1"
+from .core.io_utils import atomic_write_text, file_digest
+from .core.reporter import AnalysisReporter
+from .core.training_data_generator import EXPORT_INDEX_FILE, iter_exported_samples
+from .dataset_pipeline import DEFAULT_DATASET_CACHE_DIR, PaddingCollator, build_tokenized_dataset
 
-# 1. 生成训练数据
-data_generator = TrainingDataGenerator(
-    mapper_dir="/Users/haochidebingqilinkaobulei/IdeaProjects/finance/finance-core/finance-core-dao/src/main/resources",
-    entity_dir="/Users/haochidebingqilinkaobulei/IdeaProjects/finance/finance-core/finance-core-dao/src/main/java/com/yangt/finance/core/db/entity",
-    mapper_java_dir="/Users/haochidebingqilinkaobulei/IdeaProjects/finance/finance-core/finance-core-dao/src/main/java/com/yangt/finance/core/db/mapper"
-)
-training_data = data_generator.generate_training_data()
+# 训练配置，可用YAML/JSON文件或命令行参数覆盖
+DEFAULT_CONFIG = {
+    # 项目路径
+    'mapper_dir': None,
+    'entity_dir': None,
+    'mapper_java_dir': None,
+    'analyze_workers': 1,  # 解析Java文件和合成样本的进程数
+    'paraphrases': 1,  # 每条语句的需求描述数，大于1时加入中英文改写
+    'mine_statements': True,  # 加入项目Mapper XML中的真实语句
+    'scan_cache_path': './.mapper_scan_cache.json',
+    # 各阶段的中间结果目录
+    'work_dir': './train_work',
+    'dataset_cache_dir': DEFAULT_DATASET_CACHE_DIR,
+    # 模型
+    'model_name': 'facebook/opt-350m',
+    'max_length': 512,
+    'packing': False,
+    'lora': {
+        'r': 16,
+        'alpha': 32,
+        'dropout': 0.1,
+        'target_modules': ['q_proj', 'v_proj'],
+    },
+    # 训练
+    'num_threads': None,  # CPU训练使用的线程数，None时使用torch的默认值（全部物理核）
+    'num_epochs': 3,
+    'batch_size': 4,
+    'gradient_accumulation_steps': 4,
+    'learning_rate': 2e-4,
+    'warmup_ratio': 0.1,
+    'eval_ratio': 0.1,
+    'seed': 42,
+    'output_dir': './results',
+    'save_path': './mybatis_mapper_generator',
+    # 导出（export_path为None时跳过）
+    'export_path': None,
+    'quantize': None,
+}
 
-# 2. 准备提示模板
+STAGES = ('analyze', 'build_dataset', 'tokenize', 'train', 'export')
+
+# 提示模板
 PROMPT_TEMPLATE = """
 ### 项目上下文
 实体类: {entity_name}
@@ -34,7 +67,39 @@ PROMPT_TEMPLATE = """
 {output}
 """
 
-def load_training_data(training_data):
+
+def load_config(config_path: Optional[str] = None, overrides: Optional[Dict] = None) -> Dict:
+    """
+    加载训练配置：DEFAULT_CONFIG <- 配置文件（.yaml/.yml/.json） <- overrides
+    :param config_path: 配置文件路径（可选）
+    :param overrides: 覆盖的配置项，值为None的项忽略
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            if config_path.endswith(('.yaml', '.yml')):
+                import yaml
+                loaded = yaml.safe_load(f) or {}
+            else:
+                loaded = json.load(f)
+        _merge(config, loaded)
+    if overrides:
+        _merge(config, {key: value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def _merge(config: Dict, updates: Dict):
+    for key, value in updates.items():
+        if key not in config:
+            raise ValueError(f"未知的配置项: {key}")
+        if isinstance(config[key], dict) and isinstance(value, dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+
+
+def load_training_data(training_data: Iterable[Dict]) -> List[Dict]:
+    """把训练样本格式化为 {'input_text': 提示, 'output_text': 目标}"""
     formatted_data = []
     for item in training_data:
         context = item['project_context']
@@ -51,147 +116,327 @@ def load_training_data(training_data):
         })
     return formatted_data
 
-# 3. 准备模型和分词器
-model_name = "facebook/opt-350m"
-
-tokenizer = AutoTokenizer.from_pretrained(
-    model_name,
-    trust_remote_code=True,
-    padding_side="right",
-    model_max_length=512
-)
-# 确保有pad token
-if tokenizer.pad_token is None:
-    tokenizer.pad_token = tokenizer.eos_token
-
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float32,
-    device_map="auto",
-    trust_remote_code=True
-)
-model.config.pad_token_id = tokenizer.pad_token_id
-
-# 4. 准备数据集
-train_data = load_training_data(training_data)
-
-# 划分训练集和验证集
-random.shuffle(train_data)
-split_point = int(len(train_data) * 0.9)
-
-def format_dataset(examples):
-    """格式化数据集"""
-    texts = examples["input_text"]
-    targets = examples["output_text"]
-    
-    # 对输入文本进行编码
-    inputs = tokenizer(
-        texts,
-        padding="max_length",
-        truncation=True,
-        max_length=512,
-        return_tensors="pt"
-    )
-    
-    # 对目标文本进行编码
-    labels = tokenizer(
-        targets,
-        padding="max_length",
-        truncation=True,
-        max_length=512,
-        return_tensors="pt"
-    )
-    
-    return {
-        "input_ids": inputs["input_ids"],
-        "attention_mask": inputs["attention_mask"],
-        "labels": labels["input_ids"]
-    }
-
-# 创建和格式化数据集
-train_dataset = Dataset.from_list(train_data[:split_point]).map(
-    format_dataset,
-    batched=True,
-    remove_columns=["input_text", "output_text"]
-)
-eval_dataset = Dataset.from_list(train_data[split_point:]).map(
-    format_dataset,
-    batched=True,
-    remove_columns=["input_text", "output_text"]
-)
-
-# 5. LoRA配置
-lora_config = LoraConfig(
-    r=16,
-    lora_alpha=32,
-    target_modules=["q_proj", "v_proj"],
-    lora_dropout=0.1,
-    bias="none",
-    task_type="CAUSAL_LM"
-)
-
-# 6. 应用LoRA
-model = get_peft_model(model, lora_config)
-
-# 7. 训练参数
-num_epochs = 3
-total_steps = len(train_dataset) * num_epochs
-warmup_steps = total_steps // 10
-
-training_args = TrainingArguments(
-    output_dir="./results",
-    num_train_epochs=num_epochs,
-    per_device_train_batch_size=4,
-    per_device_eval_batch_size=4,
-    gradient_accumulation_steps=4,
-    
-    # 学习率调度
-    learning_rate=2e-4,
-    warmup_steps=warmup_steps,
-    lr_scheduler_type="cosine_with_restarts",
-    
-    # 梯度裁剪和权重衰减
-    max_grad_norm=1.0,
-    weight_decay=0.01,
-    
-    # 评估和保存
-    save_strategy="steps",
-    save_steps=100,
-    evaluation_strategy="steps",
-    eval_steps=100,
-    
-    # 日志
-    logging_dir="./logs",
-    logging_steps=10,
-    
-    # 其他优化
-    fp16=False,
-    optim="adamw_torch",
-    adam_beta1=0.9,
-    adam_beta2=0.999,
-    adam_epsilon=1e-8,
-    
-    # 早停策略
-    load_best_model_at_end=True,
-    metric_for_best_model="loss",
-    greater_is_better=False,
-    
-    # 移除评估策略，因为我们现在提供验证集
-    remove_unused_columns=False,  # 防止删除必要的列
-)
-
-# 8. 训练器
-trainer = SFTTrainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_dataset,
-    eval_dataset=eval_dataset,
-    tokenizer=tokenizer,
-    max_seq_length=512,
-)
-
-# 9. 开始训练
-trainer.train()
-
-# 10. 保存模型
-trainer.save_model("./mybatis_mapper_generator")
\ No newline at end of file
+
+class TrainingPipeline:
+    """
+    训练流水线：analyze -> build_dataset -> tokenize -> train -> export
+
+    每个阶段的输出保存在work_dir下，并在stages.json中记录由该阶段的配置和上游输出计算的键；
+    再次运行时键未变化且输出仍存在的阶段直接跳过。
+    项目源码变化不会改变analyze阶段的键，需要重新分析时传入force=['analyze']（扫描缓存保证只解析变化的文件）
+    """
+
+    MANIFEST_FILE = 'stages.json'
+
+    def __init__(self, config: Dict, reporter: Optional[AnalysisReporter] = None):
+        """
+        :param config: 训练配置，见DEFAULT_CONFIG / load_config
+        :param reporter: 输出进度和各阶段耗时（可选）
+        """
+        self.config = config
+        self.reporter = reporter or AnalysisReporter()
+        self.work_dir = config['work_dir']
+        self.manifest_path = os.path.join(self.work_dir, self.MANIFEST_FILE)
+        self.manifest = self._load_manifest()
+        self._tokenizer = None
+
+    def _load_manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.work_dir, file_name)
+
+    def _stage_key(self, config_keys: Iterable[str], inputs: Iterable[str] = ()) -> str:
+        """由阶段相关的配置项和上游输出文件的内容计算阶段的键"""
+        digest = hashlib.sha1(json.dumps({key: self.config[key] for key in config_keys},
+                                         sort_keys=True).encode('utf-8'))
+        for input_path in inputs:
+            with open(input_path, 'rb') as f:
+                digest.update(file_digest(f.read()).encode('ascii'))
+        return digest.hexdigest()
+
+    def _is_done(self, stage: str, key: str, output: str) -> bool:
+        entry = self.manifest.get(stage)
+        return entry is not None and entry['key'] == key and os.path.exists(output)
+
+    def _mark_done(self, stage: str, key: str, output: str):
+        self.manifest[stage] = {'key': key, 'output': output}
+        atomic_write_text(self.manifest_path, json.dumps(self.manifest, ensure_ascii=False, indent=2))
+
+    def run(self, stages: Optional[Iterable[str]] = None, force: Iterable[str] = ()) -> Dict:
+        """
+        运行流水线
+        :param stages: 要运行的阶段，默认全部；每个阶段依赖的上游输出需已存在
+        :param force: 忽略缓存、强制重新运行的阶段
+        :return: 各阶段的输出路径
+        """
+        stages = list(stages or STAGES)
+        force = set(force)
+        for stage in stages + list(force):
+            if stage not in STAGES:
+                raise ValueError(f"未知的阶段: {stage}，可选: {', '.join(STAGES)}")
+        self._configure_threads()
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        outputs = {}
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            with self.reporter.phase(stage):
+                outputs[stage] = getattr(self, f'_run_{stage}')(stage in force)
+        return outputs
+
+    def _configure_threads(self):
+        num_threads = self.config['num_threads']
+        if not num_threads:
+            return
+        os.environ["OMP_NUM_THREADS"] = str(num_threads)
+        os.environ["MKL_NUM_THREADS"] = str(num_threads)
+        import torch
+        torch.set_num_threads(num_threads)
+
+    def _run_analyze(self, force: bool) -> str:
+        """分析项目并导出训练样本"""
+        from .core.training_data_generator import TrainingDataGenerator
+
+        output = self._path('samples')
+        key = self._stage_key(['mapper_dir', 'entity_dir', 'mapper_java_dir', 'paraphrases', 'mine_statements', 'seed'])
+        if not force and self._is_done('analyze', key, output):
+            self.reporter.info("已有训练样本，跳过（项目源码变化后使用 --force analyze 重新分析）")
+            return output
+        for path_key in ('mapper_dir', 'entity_dir', 'mapper_java_dir'):
+            if not self.config[path_key]:
+                raise ValueError(f"缺少配置项: {path_key}")
+
+        data_generator = TrainingDataGenerator(
+            mapper_dir=self.config['mapper_dir'],
+            entity_dir=self.config['entity_dir'],
+            mapper_java_dir=self.config['mapper_java_dir'],
+            workers=self.config['analyze_workers'],
+            cache_path=self.config['scan_cache_path'],
+            reporter=self.reporter,
+            paraphrases=self.config['paraphrases'],
+            mine_statements=self.config['mine_statements'],
+            seed=self.config['seed']
+        )
+        # 样本流式写入分片，不在内存中保存全部样本
+        data_generator.export_samples(output)
+        self._mark_done('analyze', key, output)
+        return output
+
+    def _run_build_dataset(self, force: bool) -> str:
+        """格式化提示并划分训练集和验证集"""
+        source = self._path('samples')
+        output = self._path('dataset.json')
+        key = self._stage_key(['eval_ratio', 'seed'], [os.path.join(source, EXPORT_INDEX_FILE)])
+        if not force and self._is_done('build_dataset', key, output):
+            self.reporter.info("数据集未变化，跳过")
+            return output
+
+        data = load_training_data(iter_exported_samples(source))
+        # 固定随机种子，数据不变时划分结果不变
+        random.Random(self.config['seed']).shuffle(data)
+        split_point = int(len(data) * (1 - self.config['eval_ratio']))
+        atomic_write_text(output, json.dumps({'train': data[:split_point], 'eval': data[split_point:]},
+                                             ensure_ascii=False))
+        self._mark_done('build_dataset', key, output)
+        return output
+
+    def _load_tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(
+                self.config['model_name'],
+                trust_remote_code=True,
+                padding_side="right",
+                model_max_length=self.config['max_length']
+            )
+            # 确保有pad token
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            self._tokenizer = tokenizer
+        return self._tokenizer
+
+    def _tokenized_datasets(self, force: bool = False):
+        """分词结果由build_tokenized_dataset按数据内容缓存"""
+        with open(self._path('dataset.json'), 'r', encoding='utf-8') as f:
+            splits = json.load(f)
+        tokenizer = self._load_tokenizer()
+        return tuple(
+            build_tokenized_dataset(tokenizer, splits[name], max_length=self.config['max_length'],
+                                    packing=self.config['packing'], cache_dir=self.config['dataset_cache_dir'],
+                                    rebuild=force)
+            for name in ('train', 'eval')
+        )
+
+    def _run_tokenize(self, force: bool) -> str:
+        train_dataset, eval_dataset = self._tokenized_datasets(force)
+        self.reporter.info(f"训练集 {len(train_dataset)} 条，验证集 {len(eval_dataset)} 条",
+                           train=len(train_dataset), eval=len(eval_dataset))
+        return self.config['dataset_cache_dir']
+
+    def _run_train(self, force: bool) -> str:
+        """LoRA微调并保存适配器"""
+        output = self.config['save_path']
+        key = self._stage_key(
+            ['model_name', 'max_length', 'packing', 'lora', 'num_epochs', 'batch_size',
+             'gradient_accumulation_steps', 'learning_rate', 'warmup_ratio'],
+            [self._path('dataset.json')]
+        )
+        if not force and self._is_done('train', key, output):
+            self.reporter.info("模型已按当前数据和配置训练过，跳过")
+            return output
+
+        import torch
+        from transformers import AutoModelForCausalLM, Trainer, TrainingArguments
+        from peft import LoraConfig, get_peft_model
+
+        tokenizer = self._load_tokenizer()
+        train_dataset, eval_dataset = self._tokenized_datasets()
+
+        model = AutoModelForCausalLM.from_pretrained(
+            self.config['model_name'],
+            torch_dtype=torch.float32,
+            device_map="auto",
+            trust_remote_code=True
+        )
+        model.config.pad_token_id = tokenizer.pad_token_id
+
+        lora = self.config['lora']
+        lora_config = LoraConfig(
+            r=lora['r'],
+            lora_alpha=lora['alpha'],
+            target_modules=lora['target_modules'],
+            lora_dropout=lora['dropout'],
+            bias="none",
+            task_type="CAUSAL_LM"
+        )
+        model = get_peft_model(model, lora_config)
+
+        training_args = TrainingArguments(
+            output_dir=self.config['output_dir'],
+            num_train_epochs=self.config['num_epochs'],
+            per_device_train_batch_size=self.config['batch_size'],
+            per_device_eval_batch_size=self.config['batch_size'],
+            gradient_accumulation_steps=self.config['gradient_accumulation_steps'],
+
+            # 长度相近的样本分到同一批，配合动态填充减少填充token的计算
+            group_by_length=True,
+            length_column_name="length",
+
+            # 学习率调度
+            learning_rate=self.config['learning_rate'],
+            warmup_ratio=self.config['warmup_ratio'],
+            lr_scheduler_type="cosine_with_restarts",
+
+            # 梯度裁剪和权重衰减
+            max_grad_norm=1.0,
+            weight_decay=0.01,
+
+            # 评估和保存
+            save_strategy="steps",
+            save_steps=100,
+            evaluation_strategy="steps",
+            eval_steps=100,
+
+            # 日志
+            logging_dir="./logs",
+            logging_steps=10,
+
+            # 其他优化
+            fp16=False,
+            optim="adamw_torch",
+            adam_beta1=0.9,
+            adam_beta2=0.999,
+            adam_epsilon=1e-8,
+
+            # 早停策略
+            load_best_model_at_end=True,
+            metric_for_best_model="loss",
+            greater_is_better=False,
+
+            remove_unused_columns=False,  # 防止删除必要的列
+            seed=self.config['seed'],
+        )
+
+        # 数据集已分词，每批按批内最长序列填充
+        trainer = Trainer(
+            model=model,
+            args=training_args,
+            train_dataset=train_dataset,
+            eval_dataset=eval_dataset,
+            tokenizer=tokenizer,
+            data_collator=PaddingCollator(tokenizer),
+        )
+        trainer.train()
+        trainer.save_model(output)
+        self._mark_done('train', key, output)
+        return output
+
+    def _run_export(self, force: bool) -> Optional[str]:
+        """合并LoRA适配器导出推理模型，export_path为None时跳过"""
+        from .model_export import export_merged_model, is_export_current, read_export_info
+
+        export_path = self.config['export_path']
+        if not export_path:
+            self.reporter.info("未配置export_path，跳过导出")
+            return None
+        info = read_export_info(export_path)
+        if (not force and is_export_current(export_path, self.config['save_path'], self.config['model_name'])
+                and info.get('quantize') == self.config['quantize']):
+            self.reporter.info("导出的模型与当前适配器一致，跳过")
+            return export_path
+        return export_merged_model(self.config['model_name'], self.config['save_path'], export_path,
+                                   self.config['quantize'])
+
+
+def train(config: Dict, stages: Optional[Iterable[str]] = None, force: Iterable[str] = (),
+          reporter: Optional[AnalysisReporter] = None) -> Dict:
+    """
+    运行训练流水线
+    :param config: 训练配置，见DEFAULT_CONFIG / load_config
+    :param stages: 要运行的阶段，默认全部
+    :param force: 强制重新运行的阶段
+    :param reporter: 进度输出（可选）
+    :return: 各阶段的输出路径
+    """
+    return TrainingPipeline(config, reporter).run(stages, force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练MyBatis Mapper生成模型")
+    parser.add_argument("--config", help="配置文件（.yaml/.yml/.json），未指定的项使用默认值")
+    parser.add_argument("--mapper-dir")
+    parser.add_argument("--entity-dir")
+    parser.add_argument("--mapper-java-dir")
+    parser.add_argument("--work-dir")
+    parser.add_argument("--model-name")
+    parser.add_argument("--num-threads", type=int, help="CPU训练使用的线程数")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--gradient-accumulation-steps", type=int)
+    parser.add_argument("--num-epochs", type=int)
+    parser.add_argument("--save-path", help="LoRA适配器保存路径")
+    parser.add_argument("--export-path", help="训练后导出合并模型的路径")
+    parser.add_argument("--quantize", choices=["int8"])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="只运行指定的阶段")
+    parser.add_argument("--force", nargs="+", choices=STAGES, default=[], help="忽略缓存重新运行的阶段")
+    parser.add_argument("--log-level", default="info", choices=["quiet", "info", "debug"])
+    args = parser.parse_args()
+
+    overrides = {key: value for key, value in vars(args).items()
+                 if key not in ('config', 'stages', 'force', 'log_level')}
+    config = load_config(args.config, overrides)
+    outputs = train(config, args.stages, args.force, AnalysisReporter(level=args.log_level))
+    for stage, output in outputs.items():
+        print(f"{stage}: {output}")
+
+
+if __name__ == "__main__":
+    main()
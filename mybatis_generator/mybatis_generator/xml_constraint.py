@@ -0,0 +1,457 @@
+from typing import Dict, List, Optional, Tuple
+
+# 各元素允许的子元素，未列出的元素不限制
+_DYNAMIC_TAGS = ('include', 'trim', 'where', 'set', 'foreach', 'choose', 'if', 'bind')
+MAPPER_SCHEMA = {
+    'mapper': ('resultMap', 'sql', 'select', 'insert', 'update', 'delete', 'cache', 'cache-ref', 'parameterMap'),
+    'resultMap': ('id', 'result', 'association', 'collection', 'constructor', 'discriminator'),
+    'association': ('id', 'result', 'association', 'collection', 'constructor', 'discriminator'),
+    'collection': ('id', 'result', 'association', 'collection', 'constructor', 'discriminator'),
+    'constructor': ('idArg', 'arg'),
+    'discriminator': ('case',),
+    'case': ('id', 'result', 'association', 'collection', 'constructor', 'discriminator'),
+    'sql': _DYNAMIC_TAGS,
+    'select': _DYNAMIC_TAGS,
+    'insert': _DYNAMIC_TAGS + ('selectKey',),
+    'update': _DYNAMIC_TAGS + ('selectKey',),
+    'delete': _DYNAMIC_TAGS,
+    'selectKey': _DYNAMIC_TAGS,
+    'trim': _DYNAMIC_TAGS,
+    'where': _DYNAMIC_TAGS,
+    'set': _DYNAMIC_TAGS,
+    'foreach': _DYNAMIC_TAGS,
+    'if': _DYNAMIC_TAGS,
+    'when': _DYNAMIC_TAGS,
+    'otherwise': _DYNAMIC_TAGS,
+    'choose': ('when', 'otherwise'),
+    'include': ('property',),
+}
+MAPPER_ROOTS = ('mapper',)
+STATEMENT_ROOTS = ('select', 'insert', 'update', 'delete')
+
+_ENTITIES = ('lt', 'gt', 'amp', 'quot', 'apos')
+_BANG_PREFIXES = ('--', '[CDATA[', 'DOCTYPE')
+
+# 状态机的状态
+TEXT, LT, PI, BANG, COMMENT, CDATA, DOCTYPE, TAG_NAME, IN_TAG, AFTER_VALUE, ATTR_NAME, ATTR_NAME_END, \
+    ATTR_EQ, ATTR_VALUE, EMPTY_END, CLOSE, ENTITY = range(17)
+
+
+def _is_name_start(c: str) -> bool:
+    return c.isalpha() or c in '_:'
+
+
+def _is_name_char(c: str) -> bool:
+    return c.isalnum() or c in '_:.-'
+
+
+class XmlState:
+    """
+    逐字符推进的MyBatis Mapper XML状态机
+
+    只接受保持格式正确的字符：标签和属性的语法、结束标签与开始标签匹配、属性值中不出现 <、
+    & 只能开始实体引用、只有一个根元素；元素名按MAPPER_SCHEMA限制在MyBatis允许的子元素中。
+    根元素之前允许空白、开头的<?xml ...?>声明、DOCTYPE和注释，根元素结束后只允许空白
+    """
+
+    __slots__ = ('roots', 'schema', 'mode', 'stack', 'buffer', 'quote', 'attrs', 'entity', 'return_mode',
+                 'started', 'root_closed', 'length', 'safe_length', 'safe_stack', 'brackets')
+
+    def __init__(self, roots=MAPPER_ROOTS, schema: Optional[Dict] = None):
+        """
+        :param roots: 允许的根元素
+        :param schema: 元素 -> 允许的子元素，默认MAPPER_SCHEMA
+        """
+        self.roots = tuple(roots)
+        self.schema = MAPPER_SCHEMA if schema is None else schema
+        self.mode = TEXT
+        self.stack = []
+        self.buffer = ''
+        self.quote = ''
+        self.attrs = ()
+        self.entity = ''
+        self.return_mode = TEXT
+        # 是否已出现过标签、注释等标记，XML声明只能出现在所有标记之前
+        self.started = False
+        self.root_closed = False
+        self.brackets = 0
+        # 已接受的字符数，以及最近一次处于元素之间（TEXT）时的位置和打开的元素，用于补全被截断的输出
+        self.length = 0
+        self.safe_length = 0
+        self.safe_stack = ()
+
+    def copy(self) -> 'XmlState':
+        state = XmlState.__new__(XmlState)
+        for name in XmlState.__slots__:
+            setattr(state, name, getattr(self, name))
+        state.stack = list(self.stack)
+        return state
+
+    @property
+    def complete(self) -> bool:
+        """根元素已结束"""
+        return self.root_closed and self.mode == TEXT
+
+    def _allowed_children(self) -> Optional[Tuple[str, ...]]:
+        if not self.stack:
+            return self.roots
+        return self.schema.get(self.stack[-1])
+
+    def _name_prefix_ok(self, name: str) -> bool:
+        allowed = self._allowed_children()
+        return allowed is None or any(tag.startswith(name) for tag in allowed)
+
+    def _name_ok(self, name: str) -> bool:
+        allowed = self._allowed_children()
+        return allowed is None or name in allowed
+
+    def _open_element(self, self_closing: bool) -> bool:
+        if not self.stack and self.root_closed:
+            return False
+        if self_closing:
+            if not self.stack:
+                self.root_closed = True
+        else:
+            self.stack.append(self.buffer)
+        self.mode = TEXT
+        return True
+
+    def feed(self, text: str) -> bool:
+        """
+        推进若干字符
+        :return: 全部字符都合法时返回True；返回False后状态不再可用（调用方应先copy）
+        """
+        for c in text:
+            if not self._feed_char(c):
+                return False
+            self.length += 1
+            if self.mode == TEXT:
+                self.safe_length = self.length
+                self.safe_stack = tuple(self.stack)
+        return True
+
+    def _feed_char(self, c: str) -> bool:
+        mode = self.mode
+        if mode == TEXT:
+            if c == '<':
+                self.mode = LT
+                # 标签开始之前的文本都是完整的
+                self.safe_length = self.length
+                self.safe_stack = tuple(self.stack)
+            elif c == '&':
+                if not self.stack:
+                    return False
+                self.mode, self.return_mode, self.entity = ENTITY, TEXT, ''
+            elif not self.stack:
+                return c.isspace()
+            return True
+        if mode == LT:
+            if c == '?':
+                if self.started:
+                    return False
+                self.mode, self.buffer = PI, ''
+            elif c == '!':
+                self.mode, self.buffer = BANG, ''
+            elif c == '/':
+                if not self.stack:
+                    return False
+                self.mode, self.buffer = CLOSE, ''
+            elif _is_name_start(c):
+                if not self._name_prefix_ok(c):
+                    return False
+                self.mode, self.buffer, self.attrs = TAG_NAME, c, ()
+            else:
+                return False
+            self.started = True
+            return True
+        if mode == PI:
+            # 只允许 <?xml ...?> 声明
+            if len(self.buffer) < 3 and c != 'xml'[len(self.buffer)]:
+                return False
+            if len(self.buffer) == 3 and not c.isspace():
+                return False
+            if self.buffer.endswith('?') and c == '>':
+                self.mode = TEXT
+            self.buffer += c
+            return True
+        if mode == BANG:
+            self.buffer += c
+            if self.buffer == '--':
+                self.mode, self.buffer = COMMENT, ''
+            elif self.buffer == '[CDATA[':
+                if not self.stack:
+                    return False
+                self.mode, self.buffer = CDATA, ''
+            elif self.buffer == 'DOCTYPE':
+                if self.stack or self.root_closed:
+                    return False
+                self.mode, self.quote, self.brackets = DOCTYPE, '', 0
+            elif not any(prefix.startswith(self.buffer) for prefix in _BANG_PREFIXES):
+                return False
+            return True
+        if mode == COMMENT:
+            self.buffer = (self.buffer + c)[-3:]
+            if self.buffer == '-->':
+                self.mode = TEXT
+            return True
+        if mode == CDATA:
+            self.buffer = (self.buffer + c)[-3:]
+            if self.buffer == ']]>':
+                self.mode = TEXT
+            return True
+        if mode == DOCTYPE:
+            if self.quote:
+                if c == self.quote:
+                    self.quote = ''
+            elif c in '"\'':
+                self.quote = c
+            elif c == '[':
+                self.brackets += 1
+            elif c == ']':
+                self.brackets -= 1
+            elif c == '>' and self.brackets <= 0:
+                self.mode = TEXT
+            return True
+        if mode == TAG_NAME:
+            if _is_name_char(c):
+                self.buffer += c
+                return self._name_prefix_ok(self.buffer)
+            if not self._name_ok(self.buffer):
+                return False
+            if c.isspace():
+                self.mode = IN_TAG
+                return True
+            if c == '>':
+                return self._open_element(False)
+            if c == '/':
+                self.mode = EMPTY_END
+                return True
+            return False
+        if mode in (IN_TAG, AFTER_VALUE):
+            if c.isspace():
+                self.mode = IN_TAG
+                return True
+            if c == '>':
+                return self._open_element(False)
+            if c == '/':
+                self.mode = EMPTY_END
+                return True
+            if mode == IN_TAG and _is_name_start(c):
+                # buffer保存元素名，已读取的属性名依次放在attrs中
+                self.mode = ATTR_NAME
+                self.attrs = self.attrs + (c,)
+                return True
+            return False
+        if mode == ATTR_NAME:
+            if _is_name_char(c):
+                self.attrs = self.attrs[:-1] + (self.attrs[-1] + c,)
+                return True
+            if self.attrs[-1] in self.attrs[:-1]:
+                return False
+            if c.isspace():
+                self.mode = ATTR_NAME_END
+                return True
+            if c == '=':
+                self.mode = ATTR_EQ
+                return True
+            return False
+        if mode == ATTR_NAME_END:
+            if c.isspace():
+                return True
+            if c == '=':
+                self.mode = ATTR_EQ
+                return True
+            return False
+        if mode == ATTR_EQ:
+            if c.isspace():
+                return True
+            if c in '"\'':
+                self.mode, self.quote = ATTR_VALUE, c
+                return True
+            return False
+        if mode == ATTR_VALUE:
+            if c == self.quote:
+                self.mode = AFTER_VALUE
+            elif c == '<':
+                return False
+            elif c == '&':
+                self.mode, self.return_mode, self.entity = ENTITY, ATTR_VALUE, ''
+            return True
+        if mode == EMPTY_END:
+            if c != '>':
+                return False
+            return self._open_element(True)
+        if mode == CLOSE:
+            expected = self.stack[-1]
+            if len(self.buffer) < len(expected) and c == expected[len(self.buffer)]:
+                self.buffer += c
+                return True
+            if self.buffer != expected:
+                return False
+            if c.isspace():
+                return True
+            if c == '>':
+                self.stack.pop()
+                if not self.stack:
+                    self.root_closed = True
+                self.mode = TEXT
+                return True
+            return False
+        if mode == ENTITY:
+            name = self.entity
+            if c == ';':
+                if not (name in _ENTITIES or (name[:1] == '#' and _valid_char_ref(name[1:]))):
+                    return False
+                self.mode = self.return_mode
+                return True
+            name += c
+            if not any(entity.startswith(name) for entity in _ENTITIES) and not _char_ref_prefix(name):
+                return False
+            self.entity = name
+            return True
+        return False
+
+    def forced_text(self) -> str:
+        """结构上唯一确定的后续文本：结束标签的剩余部分、自闭合标签的 >"""
+        if self.mode == CLOSE and self.stack:
+            expected = self.stack[-1]
+            if expected.startswith(self.buffer):
+                return expected[len(self.buffer):] + '>'
+        if self.mode == EMPTY_END:
+            return '>'
+        return ''
+
+    def closing_text(self) -> str:
+        """关闭所有打开元素的结束标签"""
+        return ''.join(f"</{name}>" for name in reversed(self.stack))
+
+
+def _char_ref_prefix(name: str) -> bool:
+    if name[:1] != '#':
+        return False
+    digits = name[1:]
+    if digits[:1] in ('x', 'X'):
+        return all(c in '0123456789abcdefABCDEF' for c in digits[1:])
+    return digits.isdigit() or digits == ''
+
+
+def _valid_char_ref(digits: str) -> bool:
+    if digits[:1] in ('x', 'X'):
+        return len(digits) > 1 and _char_ref_prefix('#' + digits)
+    return digits.isdigit()
+
+
+def close_xml(text: str, roots=MAPPER_ROOTS) -> str:
+    """
+    补全被截断的输出：去掉最后一个不完整的标签/实体引用，再补上所有打开元素的结束标签，
+    根元素结束之后多余的内容也会去掉
+    :param text: 生成的XML文本
+    :param roots: 允许的根元素
+    :return: 格式正确的XML（text中出现非法字符时截断到非法字符之前）
+    """
+    state = XmlState(roots)
+    for index, c in enumerate(text):
+        previous = state.copy()
+        if not state.feed(c):
+            state = previous
+            break
+        if state.complete:
+            return text[:index + 1]
+    if state.mode == TEXT:
+        return text[:state.length] + state.closing_text()
+    return text[:state.safe_length] + ''.join(f"</{name}>" for name in reversed(state.safe_stack))
+
+
+class XmlConstraintProcessor:
+    """
+    约束解码的logits处理器（transformers LogitsProcessor接口）
+
+    按每条序列已生成的文本推进XmlState，只保留能让输出保持格式正确的token：
+    每步按得分从高到低检查top_k个候选，都不合法时继续检查其余token；根元素结束后只允许eos。
+    状态按已生成的token序列缓存，束搜索重排序列、草稿解码回退都不需要重新解析整段输出
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, roots=MAPPER_ROOTS, top_k: int = 64,
+                 max_cached_states: int = 8192):
+        """
+        :param tokenizer: 分词器
+        :param prompt_length: 输入提示的token数（批量时为填充后的长度），之后的token才受约束
+        :param roots: 允许的根元素，生成单条语句时为STATEMENT_ROOTS
+        :param top_k: 每步优先检查的候选token数
+        :param max_cached_states: 缓存的状态数上限，超出时清空
+        """
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.roots = tuple(roots)
+        self.top_k = top_k
+        self.max_cached_states = max_cached_states
+        self.eos_token_id = tokenizer.eos_token_id
+        self._special_ids = set(tokenizer.all_special_ids)
+        self._token_texts = {}
+        self._states = {(): XmlState(self.roots)}
+
+    def token_text(self, token_id: int) -> str:
+        text = self._token_texts.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id])
+            self._token_texts[token_id] = text
+        return text
+
+    def state_for(self, generated: List[int]) -> Optional[XmlState]:
+        """已生成的token序列对应的状态，序列不合法时返回None"""
+        key = tuple(generated)
+        state = self._states.get(key)
+        if state is not None:
+            return state
+        # 找到最长的已缓存前缀，再逐个token推进
+        start = len(key) - 1
+        while start > 0 and key[:start] not in self._states:
+            start -= 1
+        if len(self._states) > self.max_cached_states:
+            self._states = {(): XmlState(self.roots)}
+            start = 0
+        state = self._states[key[:start]]
+        for end in range(start + 1, len(key) + 1):
+            token_id = key[end - 1]
+            if token_id in self._special_ids:
+                return None
+            state = state.copy()
+            if not state.feed(self.token_text(token_id)):
+                return None
+            self._states[key[:end]] = state
+        return state
+
+    def allows(self, state: XmlState, token_id: int) -> bool:
+        if token_id == self.eos_token_id:
+            return state.complete
+        if state.complete or token_id in self._special_ids:
+            return False
+        text = self.token_text(token_id)
+        return bool(text) and state.copy().feed(text)
+
+    def forced_text(self, generated: List[int]) -> str:
+        """结构上唯一确定的后续文本（见XmlState.forced_text），可作为草稿"""
+        state = self.state_for(generated)
+        return state.forced_text() if state is not None else ''
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        for row in range(input_ids.shape[0]):
+            state = self.state_for(input_ids[row, self.prompt_length:].tolist())
+            if state is None:
+                continue
+            if state.complete:
+                allowed = [self.eos_token_id]
+            else:
+                candidates = torch.topk(scores[row], min(self.top_k, scores.shape[-1])).indices.tolist()
+                allowed = [token_id for token_id in candidates if self.allows(state, token_id)]
+                if not allowed:
+                    # 没有合法的token时结束生成，close_xml会截回最近的完整位置并补全结束标签
+                    order = torch.argsort(scores[row], descending=True).tolist()
+                    allowed = next(([token_id] for token_id in order[len(candidates):]
+                                    if self.allows(state, token_id)), [self.eos_token_id])
+            mask = torch.full_like(scores[row], float('-inf'))
+            mask[allowed] = 0
+            scores[row] = scores[row] + mask
+        return scores
@@ -0,0 +1,35 @@
+from mybatis_generator.benchmark import SAMPLE_ENTITIES, check_mapper, load_benchmark_entities, percentile
+
+USER_ENTITY = SAMPLE_ENTITIES[0]
+
+
+def test_check_mapper_valid_output():
+    mapper_xml = """<mapper namespace="com.example.mapper.UserMapper">
+    <select id="selectById">SELECT id, username, email, status, create_time FROM t_user</select>
+</mapper>"""
+    assert check_mapper(USER_ENTITY, mapper_xml) == {'well_formed': True, 'namespace_ok': True,
+                                                     'field_coverage': 1.0}
+
+
+def test_check_mapper_partial_and_malformed_output():
+    result = check_mapper(USER_ENTITY, '<mapper namespace="OrderMapper"><select id="s">SELECT id, email')
+    assert not result['well_formed']
+    assert not result['namespace_ok']
+    assert result['field_coverage'] == 2 / 5
+    result = check_mapper(USER_ENTITY, '<mapper namespace="OrderMapper"/>')
+    assert result['well_formed'] and not result['namespace_ok']
+
+
+def test_percentile_nearest_rank():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 95) == 5.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_load_benchmark_entities():
+    entities = load_benchmark_entities()
+    assert entities[:len(SAMPLE_ENTITIES)] == SAMPLE_ENTITIES
+    assert len(entities) > len(SAMPLE_ENTITIES)
+    assert all(isinstance(entity, str) and entity.strip() for entity in entities)
@@ -0,0 +1,98 @@
+import os
+
+from mybatis_generator.core.code_analyzer import ProjectAnalyzer
+from mybatis_generator.core.reporter import AnalysisReporter
+
+ENTITIES = {
+    'UserDO.java': "package com.example.entity;\npublic class UserDO { private Long id; private String userName; }",
+    'OrderEntity.java': "package com.example.entity;\npublic class OrderEntity { private Long id; }",
+    'Product.java': "package com.example.entity;\npublic class Product { private Long id; }",
+    'Account.java': "package com.example.entity;\npublic class Account { private Long id; }",
+}
+
+MAPPERS = {
+    # resultMap中使用小写的类型别名
+    'UserMapper.xml': '<mapper namespace="com.example.mapper.UserMapper">'
+                      '<resultMap id="BaseResultMap" type="userdo"><id column="id" property="id"/></resultMap>'
+                      '</mapper>',
+    # 没有类型引用，按接口名 OrderMapper -> OrderEntity 匹配
+    'OrderMapper.xml': '<mapper namespace="com.example.mapper.OrderMapper">'
+                       '<delete id="deleteById">DELETE FROM t_order WHERE id = #{id}</delete></mapper>',
+    # 接口名对不上，按接口方法的返回类型匹配
+    'ItemDao.xml': '<mapper namespace="com.example.mapper.ItemDao">'
+                   '<select id="listAll">SELECT * FROM t_product</select></mapper>',
+    'AccountMapper.xml': '<mapper namespace="com.example.mapper.AccountMapper">'
+                         '<resultMap id="m" type="com.example.entity.Account"/></mapper>',
+    'UnknownMapper.xml': '<mapper namespace="com.example.mapper.UnknownMapper">'
+                         '<select id="s">SELECT 1</select></mapper>',
+}
+
+INTERFACES = {
+    'ItemDao.java': "package com.example.mapper;\nimport java.util.List;\n"
+                    "public interface ItemDao { List<Product> listAll(); }",
+}
+
+
+def _write_files(directory, files):
+    os.makedirs(directory, exist_ok=True)
+    for name, content in files.items():
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def _analyzer(tmp_path):
+    _write_files(tmp_path / 'entity', ENTITIES)
+    _write_files(tmp_path / 'xml', MAPPERS)
+    _write_files(tmp_path / 'java', INTERFACES)
+    analyzer = ProjectAnalyzer(str(tmp_path / 'xml'), str(tmp_path / 'entity'), str(tmp_path / 'java'),
+                               reporter=AnalysisReporter(level='quiet'))
+    analyzer.analyze()
+    return analyzer
+
+
+def test_mappers_resolve_through_entity_index(tmp_path):
+    analyzer = _analyzer(tmp_path)
+    resolved = {namespace.split('.')[-1]: (mapper['entity_class'], mapper['match_source'])
+                for namespace, mapper in analyzer.existing_mappers.items()}
+    assert resolved == {
+        'UserMapper': ('com.example.entity.UserDO', 'type_ref'),
+        'OrderMapper': ('com.example.entity.OrderEntity', 'interface_name'),
+        'ItemDao': ('com.example.entity.Product', 'interface_method'),
+        'AccountMapper': ('com.example.entity.Account', 'entity_type'),
+        'UnknownMapper': (None, None),
+    }
+    assert analyzer.reporter.counters['mappers_matched'] == 4
+    assert analyzer.reporter.counters['mappers_unmatched'] == 1
+
+
+def test_training_pairs_use_resolved_entities(tmp_path):
+    pairs = _analyzer(tmp_path).get_training_pairs()
+    assert sorted(pair['entity']['name'] for pair in pairs) == ['Account', 'OrderEntity', 'Product', 'UserDO']
+    item_pair = next(pair for pair in pairs if pair['entity']['name'] == 'Product')
+    assert item_pair['interface']['name'] == 'ItemDao'
+
+
+def test_same_simple_name_prefers_closest_package(tmp_path):
+    for package in ('com.shop.entity', 'com.admin.entity'):
+        _write_files(tmp_path / 'entity' / package.split('.')[1],
+                     {'User.java': f"package {package};\npublic class User {{ private Long id; }}"})
+    _write_files(tmp_path / 'xml', {'UserMapper.xml': '<mapper namespace="com.admin.mapper.UserMapper">'
+                                                      '<select id="s" resultType="User">SELECT 1</select></mapper>'})
+    _write_files(tmp_path / 'java', {})
+    analyzer = ProjectAnalyzer(str(tmp_path / 'xml'), str(tmp_path / 'entity'), str(tmp_path / 'java'),
+                               reporter=AnalysisReporter(level='quiet'))
+    analyzer.analyze()
+    assert analyzer.existing_mappers['com.admin.mapper.UserMapper']['entity_class'] == 'com.admin.entity.User'
+
+
+def test_unreadable_file_is_skipped_with_cache(tmp_path):
+    _write_files(tmp_path / 'entity', ENTITIES)
+    _write_files(tmp_path / 'xml', MAPPERS)
+    _write_files(tmp_path / 'java', INTERFACES)
+    # 失效的符号链接，os.stat失败
+    os.symlink(str(tmp_path / 'missing.java'), str(tmp_path / 'entity' / 'Broken.java'))
+    analyzer = ProjectAnalyzer(str(tmp_path / 'xml'), str(tmp_path / 'entity'), str(tmp_path / 'java'),
+                               cache_path=str(tmp_path / 'cache.json'), reporter=AnalysisReporter(level='quiet'))
+    analyzer.analyze()
+    assert len(analyzer.entity_classes) == len(ENTITIES)
+    assert [error['file_path'] for error in analyzer.reporter.errors] == [str(tmp_path / 'entity' / 'Broken.java')]
@@ -0,0 +1,53 @@
+import pytest
+
+from mybatis_generator.dataset_pipeline import IGNORE_INDEX, PaddingCollator, pack_examples, tokenize_example
+
+
+class _CharTokenizer:
+    """按字符分词的测试分词器，add_special_tokens时在开头加上bos"""
+    bos_token_id = 1
+    eos_token_id = 2
+    pad_token_id = 0
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = [ord(ch) for ch in text]
+        return {'input_ids': [self.bos_token_id] + ids if add_special_tokens else ids}
+
+
+def test_prompt_tokens_are_masked():
+    example = tokenize_example(_CharTokenizer(), 'ab', 'xyz')
+    assert example['input_ids'] == [1, ord('a'), ord('b'), ord('x'), ord('y'), ord('z'), 2]
+    assert example['labels'] == [IGNORE_INDEX] * 3 + [ord('x'), ord('y'), ord('z'), 2]
+    assert example['length'] == 7
+
+
+def test_truncation_keeps_target_and_prompt_tail():
+    example = tokenize_example(_CharTokenizer(), 'abcdefgh', 'xyz', max_length=8)
+    assert example['length'] == 8
+    # 目标完整保留，提示从开头截断
+    assert example['input_ids'][-4:] == [ord('x'), ord('y'), ord('z'), 2]
+    assert example['input_ids'][:4] == [ord(ch) for ch in 'efgh']
+    assert example['labels'][:4] == [IGNORE_INDEX] * 4
+
+    # 目标过长时至少保留max_length的一半
+    long_target = tokenize_example(_CharTokenizer(), 'abcdefgh', 'x' * 20, max_length=8)
+    assert long_target['length'] == 8
+    assert long_target['labels'].count(IGNORE_INDEX) == 4
+
+
+def test_pack_examples_first_fit():
+    examples = [{'input_ids': [n] * n, 'labels': [n] * n, 'length': n} for n in (5, 3, 2, 4)]
+    packed = pack_examples(examples, max_length=8)
+    assert [p['length'] for p in packed] == [8, 6]
+    assert packed[0]['input_ids'] == [5] * 5 + [3] * 3
+    assert packed[1]['labels'] == [4] * 4 + [2] * 2
+
+
+def test_collator_pads_to_multiple_and_masks_padding():
+    pytest.importorskip('torch')
+    features = [{'input_ids': [5, 6, 7], 'labels': [IGNORE_INDEX, 6, 7]},
+                {'input_ids': [5], 'labels': [5]}]
+    batch = PaddingCollator(_CharTokenizer(), pad_to_multiple_of=4)(features)
+    assert batch['input_ids'].tolist() == [[5, 6, 7, 0], [5, 0, 0, 0]]
+    assert batch['attention_mask'].tolist() == [[1, 1, 1, 0], [1, 0, 0, 0]]
+    assert batch['labels'].tolist() == [[IGNORE_INDEX, 6, 7, IGNORE_INDEX], [5] + [IGNORE_INDEX] * 3]
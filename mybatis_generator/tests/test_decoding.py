@@ -0,0 +1,38 @@
+from mybatis_generator.decoding import TimingStreamer
+
+
+class _Ids:
+    """只实现numel()的token张量"""
+
+    def __init__(self, count):
+        self.count = count
+
+    def numel(self):
+        return self.count
+
+
+class _RecordingStreamer:
+    def __init__(self):
+        self.puts = []
+        self.ended = False
+
+    def put(self, value):
+        self.puts.append(value.numel())
+
+    def end(self):
+        self.ended = True
+
+
+def test_timing_streamer_counts_tokens_per_put():
+    inner = _RecordingStreamer()
+    streamer = TimingStreamer(inner)
+    assert streamer.ttft is None
+    # 提示不计入；草稿+验证解码一步put多个token
+    for count in (12, 3, 1, 4):
+        streamer.put(_Ids(count))
+    streamer.end()
+    assert streamer.new_tokens == 8
+    assert streamer.first_tokens == 3
+    assert streamer.ttft is not None and streamer.ttft >= 0
+    assert inner.puts == [12, 3, 1, 4]
+    assert inner.ended
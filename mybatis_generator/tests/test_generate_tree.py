@@ -0,0 +1,109 @@
+import os
+
+from mybatis_generator import generate_tree
+from mybatis_generator.generate_tree import DONE, FAILED, PENDING, SKIPPED, JobManifest
+
+CONFIG = {'model': 'facebook/opt-350m|base', 'decoding': 'fast'}
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest_path = str(tmp_path / 'manifest.json')
+    output_path = tmp_path / 'UserMapper.xml'
+    output_path.write_text('<mapper/>', encoding='utf-8')
+
+    manifest = JobManifest(manifest_path, CONFIG)
+    manifest.update('a/User.java', sha1='1', status=DONE, output=str(output_path), config=manifest.config_id)
+    manifest.update('a/Util.java', sha1='2', status=SKIPPED)
+    manifest.update('a/Order.java', sha1='3', status=PENDING, output=str(tmp_path / 'OrderMapper.xml'))
+    manifest.save()
+
+    reloaded = JobManifest(manifest_path, CONFIG)
+    assert reloaded.jobs == manifest.jobs
+    assert reloaded.summary() == {PENDING: 1, DONE: 1, FAILED: 0, SKIPPED: 1}
+    assert reloaded.up_to_date('a/User.java', '1')
+    assert not reloaded.up_to_date('a/User.java', 'changed')
+    assert not reloaded.up_to_date('a/Order.java', '3')
+    assert reloaded.known_non_entity('a/Util.java', '2')
+    assert not reloaded.known_non_entity('a/Util.java', 'changed')
+
+
+def test_manifest_config_change_and_missing_output(tmp_path):
+    manifest_path = str(tmp_path / 'manifest.json')
+    output_path = tmp_path / 'UserMapper.xml'
+    output_path.write_text('<mapper/>', encoding='utf-8')
+    manifest = JobManifest(manifest_path, CONFIG)
+    manifest.update('User.java', sha1='1', status=DONE, output=str(output_path), config=manifest.config_id)
+    manifest.save()
+
+    assert not JobManifest(manifest_path, dict(CONFIG, decoding='quality')).up_to_date('User.java', '1')
+    os.remove(output_path)
+    assert not JobManifest(manifest_path, CONFIG).up_to_date('User.java', '1')
+
+
+def test_manifest_remove_missing_and_corrupt_file(tmp_path):
+    manifest_path = tmp_path / 'manifest.json'
+    manifest = JobManifest(str(manifest_path), CONFIG)
+    for rel_path in ('A.java', 'B.java', 'C.java'):
+        manifest.update(rel_path, sha1=rel_path, status=PENDING)
+    assert manifest.remove_missing({'B.java'}) == 2
+    assert list(manifest.jobs) == ['B.java']
+
+    manifest_path.write_text('{not json', encoding='utf-8')
+    assert JobManifest(str(manifest_path), CONFIG).jobs == {}
+
+
+class _FakeGenerator:
+    def generate_mappers(self, contents, batch_size, on_result):
+        for index, content in enumerate(contents):
+            on_result(index, f'<mapper>{len(content)}</mapper>')
+
+
+def test_generate_task_fails_only_unreadable_entities(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_tree, '_worker_generator', _FakeGenerator())
+    good = tmp_path / 'User.java'
+    good.write_text('public class User { private Long id; }', encoding='utf-8')
+    gbk = tmp_path / 'Order.java'
+    gbk.write_bytes('// 订单\npublic class Order { private Long id; }'.encode('gbk'))
+    task = [(name, str(tmp_path / name), str(tmp_path / 'out' / name.replace('.java', 'Mapper.xml')))
+            for name in ('User.java', 'Order.java', 'Deleted.java')]
+
+    results = {result['rel_path']: result for result in generate_tree._generate_task(task)}
+    assert results['User.java']['status'] == DONE
+    assert os.path.exists(task[0][2])
+    assert results['Order.java']['status'] == FAILED
+    assert results['Order.java']['error'].startswith('UnicodeDecodeError')
+    assert results['Deleted.java']['status'] == FAILED
+    assert not os.path.exists(task[1][2])
+
+
+class _FailingBatchGenerator:
+    """批量生成写完第一个结果后失败，逐个生成时Order失败"""
+
+    def __init__(self):
+        self.retried = []
+
+    def generate_mappers(self, contents, batch_size, on_result):
+        on_result(0, '<mapper>batch</mapper>')
+        raise RuntimeError('CUDA out of memory')
+
+    def generate_mapper(self, content):
+        self.retried.append(content)
+        if 'Order' in content:
+            raise ValueError('bad entity')
+        return '<mapper>single</mapper>'
+
+
+def test_generate_task_retries_only_unfinished_entities(tmp_path, monkeypatch):
+    generator = _FailingBatchGenerator()
+    monkeypatch.setattr(generate_tree, '_worker_generator', generator)
+    task = []
+    for name in ('User', 'Order', 'Product'):
+        source = tmp_path / f'{name}.java'
+        source.write_text(f'public class {name} {{ private Long id; }}', encoding='utf-8')
+        task.append((f'{name}.java', str(source), str(tmp_path / 'out' / f'{name}Mapper.xml')))
+
+    results = [result['status'] for result in generate_tree._generate_task(task)]
+    assert results == [DONE, FAILED, DONE]
+    assert [content.split()[2] for content in generator.retried] == ['Order', 'Product']
+    with open(task[0][2], 'r', encoding='utf-8') as f:
+        assert f.read() == '<mapper>batch</mapper>'
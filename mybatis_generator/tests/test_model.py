@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from mybatis_generator.core.model import EntityInfo, FieldInfo, InterfaceInfo, MapperInfo, SqlRefs
+
+ENTITY = {
+    'name': 'User',
+    'package': 'com.example.entity',
+    'fields': [{'name': 'id', 'type': 'Long'}, {'name': 'tags', 'type': 'List', 'generic_type': ['String']}],
+    'file_path': '/src/User.java',
+}
+
+INTERFACE = {
+    'name': 'UserMapper',
+    'package': 'com.example.mapper',
+    'methods': [{
+        'name': 'selectByIds',
+        'return_type': 'List<User>',
+        'parameters': [{'name': 'ids', 'type': 'List<Long>',
+                        'annotations': [{'name': 'Param', 'elements': {'value': '"ids"'}}]}],
+        'annotations': [],
+        'documentation': {'description': '批量查询'},
+    }],
+    'file_path': '/src/UserMapper.java',
+}
+
+
+def test_records_support_dict_style_access():
+    entity = EntityInfo.from_dict(ENTITY)
+    assert entity['name'] == 'User'
+    assert entity.get('package') == 'com.example.entity'
+    assert entity.get('missing', 'default') == 'default'
+    assert 'fields' in entity and 'missing' not in entity
+    assert entity['fields'][1]['generic_type'] == ('String',)
+    assert 'generic_type' not in entity['fields'][0]
+    with pytest.raises(KeyError):
+        entity['missing']
+
+
+def test_records_use_slots():
+    field = FieldInfo('id', 'Long')
+    assert not hasattr(field, '__dict__')
+    with pytest.raises(AttributeError):
+        field.extra = 1
+
+
+def test_to_dict_round_trip_through_json():
+    entity = EntityInfo.from_dict(ENTITY)
+    assert EntityInfo.from_dict(json.loads(json.dumps(entity.to_dict()))).to_dict() == entity.to_dict()
+    interface = InterfaceInfo.from_dict(INTERFACE)
+    restored = InterfaceInfo.from_dict(json.loads(json.dumps(interface.to_dict())))
+    assert restored.to_dict() == interface.to_dict()
+    parameter = restored['methods'][0]['parameters'][0]
+    assert parameter['annotations'][0]['elements'] == {'value': '"ids"'}
+    # 值为None的字段不出现在字典中
+    assert 'generic_type' not in entity.to_dict()['fields'][0]
+
+
+def test_repeated_strings_are_interned():
+    first = FieldInfo(''.join(['user', 'Name']), ''.join(['Str', 'ing']))
+    second = FieldInfo(''.join(['user', 'Na', 'me']), ''.join(['St', 'ring']))
+    assert first.name is second.name
+    assert first.type is second.type
+
+
+def test_mapper_info_reads_content_on_demand(tmp_path):
+    path = tmp_path / 'UserMapper.xml'
+    path.write_text('<mapper namespace="UserMapper"/>', encoding='utf-8')
+    mapper = MapperInfo(str(path), 'UserMapper', 'User', ('User',), SqlRefs(tables=['t_user']))
+    assert mapper['content'] == '<mapper namespace="UserMapper"/>'
+    assert mapper['sql_refs']['tables'] == ('t_user',)
+    assert mapper.get('entity_class') is None
+    path.write_text('<mapper namespace="UserMapper"><sql id="a">x</sql></mapper>', encoding='utf-8')
+    assert '<sql id="a">' in mapper.content
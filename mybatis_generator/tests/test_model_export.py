@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+from mybatis_generator.model_export import (EXPORT_INFO_FILE, QUANTIZED_WEIGHTS_FILE, _commit_export_dir,
+                                            _prepare_export_dir, is_export_current)
+
+
+def _write(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _export(output_path, weights_file, info):
+    """模拟一次导出：写入权重和说明文件后替换导出目录"""
+    export_path = _prepare_export_dir(output_path)
+    _write(os.path.join(export_path, weights_file), 'weights')
+    _write(os.path.join(export_path, EXPORT_INFO_FILE), json.dumps(info))
+    _commit_export_dir(export_path, output_path)
+
+
+def test_re_export_replaces_previous_files(tmp_path):
+    output_path = str(tmp_path / 'merged')
+    _export(output_path, QUANTIZED_WEIGHTS_FILE, {'base_model_name': 'm', 'quantize': 'int8'})
+    # 切换为不量化后重新导出，旧的int8权重不残留
+    _export(output_path, 'model.safetensors', {'base_model_name': 'm', 'quantize': None})
+    assert sorted(os.listdir(output_path)) == [EXPORT_INFO_FILE, 'model.safetensors']
+    assert not os.path.exists(output_path + '.tmp')
+
+
+def test_interrupted_export_keeps_previous_model(tmp_path):
+    output_path = str(tmp_path / 'merged')
+    _export(output_path, 'model.safetensors', {'base_model_name': 'm'})
+    # 导出中断：临时目录中没有说明文件，导出目录不受影响，下次导出时清理临时目录
+    _write(os.path.join(_prepare_export_dir(output_path), 'partial.bin'), 'x')
+    assert is_export_current(output_path, str(tmp_path / 'missing'), 'm', allow_without_adapter=True)
+    assert os.listdir(_prepare_export_dir(output_path)) == []
+
+
+def test_refuses_to_replace_unrelated_directory(tmp_path):
+    _write(str(tmp_path / 'notes.txt'), 'keep me')
+    with pytest.raises(ValueError):
+        _prepare_export_dir(str(tmp_path))
+    assert os.path.exists(str(tmp_path / 'notes.txt'))
@@ -0,0 +1,23 @@
+import sys
+import types
+
+from mybatis_generator.prefix_cache import PrefixCache
+
+
+class _OldDynamicCache:
+    pass
+
+
+class _DynamicCache:
+    def batch_repeat_interleave(self, repeats):
+        pass
+
+
+def test_supported_requires_batch_repeat_interleave(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'transformers', types.SimpleNamespace(DynamicCache=_OldDynamicCache))
+    assert not PrefixCache.supported()
+    monkeypatch.setitem(sys.modules, 'transformers', types.SimpleNamespace(DynamicCache=_DynamicCache))
+    assert PrefixCache.supported()
+    # 没有DynamicCache的旧版本
+    monkeypatch.setitem(sys.modules, 'transformers', types.SimpleNamespace())
+    assert not PrefixCache.supported()
@@ -0,0 +1,58 @@
+import pytest
+
+from mybatis_generator.prompt_compactor import compact_entity, entity_prompt_text
+
+USER_ENTITY = """package com.example.entity;
+
+import javax.persistence.*;
+
+/** 用户 */
+@Table(name = "sys_user")
+public class User {
+    private static final long serialVersionUID = 1L;
+    @Id
+    private Long id;
+    @Column(name = "login_name")
+    private String userName;
+    private transient String temp;
+    private List<String> tags;
+    private Date createTime;
+
+    public Long getId() { return id; }
+}"""
+
+
+def test_compact_entity_keeps_mapped_fields():
+    assert compact_entity(USER_ENTITY) == '\n'.join([
+        "实体类: com.example.entity.User",
+        "表名: sys_user",
+        "字段（属性 类型 列名）:",
+        "id Long id",
+        "userName String login_name",
+        "tags List<String> tags",
+        "createTime Date create_time",
+    ])
+
+
+def test_compact_entity_uses_naming_patterns():
+    source = USER_ENTITY.replace('@Table(name = "sys_user")\n', '')
+    summary = compact_entity(source, {'table_prefix': 'tb', 'column_style': 'camelCase'})
+    assert "表名: tb_user" in summary
+    assert "命名规则: 表名前缀 tb，列名 camelCase" in summary
+    assert "createTime Date createTime" in summary
+    # 注解声明的列名优先
+    assert "userName String login_name" in summary
+
+
+def test_compact_entity_unparseable_source():
+    assert compact_entity("生成根据id更新User的status的sql") is None
+    assert compact_entity("package a; interface UserMapper {}") is None
+
+
+def test_entity_prompt_text_modes():
+    assert entity_prompt_text(USER_ENTITY, 'off') == USER_ENTITY
+    assert entity_prompt_text(USER_ENTITY, 'always') == compact_entity(USER_ENTITY)
+    assert entity_prompt_text(USER_ENTITY, 'auto') == USER_ENTITY
+    assert entity_prompt_text(USER_ENTITY, 'auto', max_tokens=10) == compact_entity(USER_ENTITY)
+    with pytest.raises(ValueError):
+        entity_prompt_text(USER_ENTITY, 'short')
@@ -0,0 +1,92 @@
+import os
+
+from mybatis_generator.inference import MapperGenerator
+from mybatis_generator.result_cache import ResultCache, normalize_source
+
+ENTITY = """package com.example.entity;
+
+// 用户
+public class User {
+    private Long id;   
+    private String name; /* 姓名 */
+}
+"""
+
+
+def test_normalize_source():
+    assert normalize_source(ENTITY.replace('\n', '\r\n')) == normalize_source(ENTITY)
+    assert normalize_source(ENTITY) == ENTITY.replace('   \n', '\n').strip()
+    compact = normalize_source(ENTITY, ignore_comments=True)
+    assert compact == 'package com.example.entity;public class User{private Long id;private String name;}'
+    # 字符串常量中的注释符号和空白原样保留
+    assert normalize_source('String s = "a  // b";', ignore_comments=True) == 'String s="a  // b";'
+
+
+def test_key_depends_on_every_input(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    base = cache.key(ENTITY, None, 'opt|base', 'fast', ('</mapper>',))
+    assert cache.key(ENTITY + '\n\n', None, 'opt|base', 'fast', ('</mapper>',)) == base
+    assert cache.key(ENTITY.replace('name', 'title'), None, 'opt|base', 'fast', ('</mapper>',)) != base
+    assert cache.key(ENTITY, {'mapper_package': 'a'}, 'opt|base', 'fast', ('</mapper>',)) != base
+    assert cache.key(ENTITY, None, 'opt|adapter:1', 'fast', ('</mapper>',)) != base
+    assert cache.key(ENTITY, None, 'opt|base', 'quality', ('</mapper>',)) != base
+    assert cache.key(ENTITY, None, 'opt|base', 'fast', ('</select>',)) != base
+
+    ignoring = ResultCache(str(tmp_path), ignore_comments=True)
+    assert ignoring.key(ENTITY, None, 'opt|base', 'fast', ('</mapper>',)) == \
+        ignoring.key(ENTITY.replace('// 用户', '// User'), None, 'opt|base', 'fast', ('</mapper>',))
+
+
+def test_get_put_and_stats(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    assert cache.get('missing') is None
+    cache.put('k1', '<mapper/>')
+    assert cache.get('k1') == '<mapper/>'
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+    cache.clear()
+    assert cache.get('k1') is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = ResultCache(str(cache_dir), max_entries=2)
+    for index, key in enumerate(('k1', 'k2')):
+        cache.put(key, '<mapper/>')
+        os.utime(cache_dir / f'{key}.xml', ns=(index * 10 ** 9, index * 10 ** 9))
+    # 读取k1更新其最近使用时间，写入k3时淘汰k2
+    assert cache.get('k1') is not None
+    cache.put('k3', '<mapper/>')
+    assert sorted(os.listdir(cache_dir)) == ['k1.xml', 'k3.xml']
+
+
+def test_evicts_by_total_size(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = ResultCache(str(cache_dir), max_entries=100, max_bytes=25)
+    for index, key in enumerate(('k1', 'k2', 'k3')):
+        cache.put(key, 'x' * 10)
+        os.utime(cache_dir / f'{key}.xml', ns=(index * 10 ** 9, index * 10 ** 9))
+    assert sorted(os.listdir(cache_dir)) == ['k2.xml', 'k3.xml']
+
+
+def test_put_rescans_only_over_limits(tmp_path, monkeypatch):
+    (tmp_path / 'cache').mkdir()
+    cache = ResultCache(str(tmp_path / 'cache'), max_entries=3)
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: scans.append(path) or scandir(path))
+    for key in ('k1', 'k2', 'k3'):
+        cache.put(key, '<mapper/>')
+    # 只有第一次写入时扫描目录建立大小记录
+    assert len(scans) == 1
+    cache.put('k4', '<mapper/>')
+    assert len(scans) == 2
+    assert len(os.listdir(tmp_path / 'cache')) == 3
+
+
+def test_sampling_profiles_bypass_cache(tmp_path):
+    generator = MapperGenerator(result_cache=ResultCache(str(tmp_path)))
+    assert generator._use_result_cache('fast')
+    assert generator._use_result_cache('speculative')
+    assert not generator._use_result_cache('sampled')
+    assert not generator._use_result_cache('quality')
+    assert not MapperGenerator()._use_result_cache('fast')
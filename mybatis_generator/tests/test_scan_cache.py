@@ -0,0 +1,61 @@
+import os
+
+from mybatis_generator.core.scan_cache import ScanCache
+
+
+def _store(cache, file_path, root='/project'):
+    stat = os.stat(file_path)
+    cache.store('entity', file_path, stat.st_mtime_ns, stat.st_size, 'sha1', {'records': []}, root)
+
+
+def test_lookup_hits_until_file_or_root_changes(tmp_path):
+    source = tmp_path / 'User.java'
+    source.write_text('class User {}', encoding='utf-8')
+    cache = ScanCache(str(tmp_path / 'cache.json'))
+    cache.begin()
+    assert cache.lookup('entity', str(source), os.stat(source), '/project') is None
+    _store(cache, str(source))
+
+    assert cache.lookup('entity', str(source), os.stat(source), '/project')['records'] == {'records': []}
+    assert cache.lookup('entity', str(source), os.stat(source), '/other') is None
+    assert cache.lookup('mapper', str(source), os.stat(source), '/project') is None
+    assert cache.known_digest('entity', str(source), '/project') == 'sha1'
+    assert cache.known_digest('entity', str(source), '/other') is None
+
+    source.write_text('class User { Long id; }', encoding='utf-8')
+    assert cache.lookup('entity', str(source), os.stat(source), '/project') is None
+
+
+def test_save_reload_and_prune_unseen_files(tmp_path):
+    cache_path = str(tmp_path / 'cache.json')
+    files = []
+    for name in ('User.java', 'Order.java'):
+        files.append(tmp_path / name)
+        files[-1].write_text(f'class {name[:-5]} {{}}', encoding='utf-8')
+
+    cache = ScanCache(cache_path)
+    cache.begin()
+    for file_path in files:
+        _store(cache, str(file_path))
+    cache.save()
+
+    reloaded = ScanCache(cache_path)
+    assert len(reloaded.entries) == 2
+    # 第二次扫描只看到User.java，保存时清理Order.java的条目
+    reloaded.begin()
+    assert reloaded.lookup('entity', str(files[0]), os.stat(files[0]), '/project') is not None
+    reloaded.save()
+    assert list(ScanCache(cache_path).entries) == [f"entity:{os.path.abspath(files[0])}"]
+
+    # 同一实例的下一次扫描重新开始记录
+    reloaded.begin()
+    reloaded.save()
+    assert ScanCache(cache_path).entries == {}
+
+
+def test_corrupt_or_old_cache_is_discarded(tmp_path):
+    cache_path = tmp_path / 'cache.json'
+    cache_path.write_text('{"version": 1, "entries": {"entity:/a": {}}}', encoding='utf-8')
+    assert ScanCache(str(cache_path)).entries == {}
+    cache_path.write_text('not json', encoding='utf-8')
+    assert ScanCache(str(cache_path)).entries == {}
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import queue
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from mybatis_generator import decoding
+from mybatis_generator.server import GenerationServer
+
+
+class _TextIteratorStreamer:
+    """测试用的TextIteratorStreamer，put的直接是文本"""
+
+    def __init__(self, tokenizer, **kwargs):
+        self._queue = queue.Queue()
+
+    def put(self, value):
+        self._queue.put(value)
+
+    def end(self):
+        self._queue.put(None)
+
+    def __iter__(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                return
+            yield text
+
+
+@pytest.fixture(autouse=True)
+def fake_transformers(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'transformers', types.SimpleNamespace(
+        StoppingCriteria=type('StoppingCriteria', (), {}), TextIteratorStreamer=_TextIteratorStreamer))
+    monkeypatch.setattr(decoding._LazyStoppingCriteria, '_subclasses', {})
+
+
+class _FakeGenerator:
+    """生成直到被中断（或约2秒），记录是否观察到中断以及访问tokenizer的线程"""
+    decoding = 'fast'
+    loaded = True
+
+    def __init__(self):
+        self.interrupted = threading.Event()
+        self.tokenizer_threads = []
+
+    @property
+    def tokenizer(self):
+        self.tokenizer_threads.append(threading.current_thread().name)
+        return object()
+
+    def _wait(self, stopping_criteria, streamer=None):
+        for _ in range(200):
+            if stopping_criteria[0].interrupted:
+                self.interrupted.set()
+                return
+            if streamer is not None:
+                streamer.put(' ')
+            time.sleep(0.01)
+
+    def generate_mappers(self, entities, package_infos=None, batch_size=4, decoding=None, stopping_criteria=None):
+        if entities[0] == 'slow':
+            self._wait(stopping_criteria)
+        return [f'<mapper>{entity}</mapper>' for entity in entities]
+
+    def generate_mapper(self, entity, package_info=None, decoding=None, streamer=None, stopping_criteria=None):
+        streamer.put('<mapper>')
+        self._wait(stopping_criteria, streamer)
+        streamer.end()
+        return '<mapper></mapper>'
+
+
+async def _request(port, payload, read_all=True):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    writer.write(b'POST /generate HTTP/1.1\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+    await writer.drain()
+    if not read_all:
+        return reader, writer
+    response = await reader.read()
+    writer.close()
+    return response.decode('utf-8')
+
+
+def _run(server, scenario):
+    async def main():
+        server._queue = asyncio.Queue(maxsize=server.max_queue)
+        worker = asyncio.ensure_future(server._batch_worker())
+        listener = await asyncio.start_server(server._handle_connection, '127.0.0.1', 0)
+        try:
+            return await asyncio.wait_for(scenario(listener.sockets[0].getsockname()[1]), 10)
+        finally:
+            worker.cancel()
+            listener.close()
+            server._executor.shutdown(wait=True)
+    return asyncio.run(main())
+
+
+def test_rejects_non_object_json():
+    server = GenerationServer(_FakeGenerator())
+    response = _run(server, lambda port: _request(port, b'[1, 2]'))
+    assert response.startswith('HTTP/1.1 400')
+
+
+def test_worker_survives_round_errors(monkeypatch):
+    server = GenerationServer(_FakeGenerator(), max_wait_ms=1)
+    run_batch = server._run_batch
+    calls = []
+
+    async def flaky_run_batch(loop, batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        await run_batch(loop, batch)
+
+    monkeypatch.setattr(server, '_run_batch', flaky_run_batch)
+
+    async def scenario(port):
+        first = await _request(port, {'entity': 'User'})
+        second = await _request(port, {'entity': 'Order'})
+        return first, second
+
+    first, second = _run(server, scenario)
+    assert first.startswith('HTTP/1.1 500') and 'boom' in first
+    assert second.startswith('HTTP/1.1 200') and '<mapper>Order</mapper>' in second
+
+
+def test_timeout_interrupts_running_batch():
+    generator = _FakeGenerator()
+    server = GenerationServer(generator, max_wait_ms=1, request_timeout=0.1)
+    response = _run(server, lambda port: _request(port, {'entity': 'slow'}))
+    assert response.startswith('HTTP/1.1 504')
+    assert generator.interrupted.wait(1)
+
+
+def test_stream_disconnect_interrupts_generation():
+    generator = _FakeGenerator()
+    server = GenerationServer(generator)
+
+    async def scenario(port):
+        reader, writer = await _request(port, {'entity': 'User', 'stream': True}, read_all=False)
+        await reader.readuntil(b'<mapper>')
+        writer.transport.abort()
+        return await asyncio.get_event_loop().run_in_executor(None, generator.interrupted.wait, 1)
+
+    assert _run(server, scenario)
+    # streamer在生成线程中创建，不在事件循环中等待模型加载
+    assert generator.tokenizer_threads and all(name.startswith('mapper-generate')
+                                               for name in generator.tokenizer_threads)
@@ -0,0 +1,30 @@
+from mybatis_generator.speculative import NgramDrafter
+
+
+def test_draft_copies_continuation_of_longest_match():
+    drafter = NgramDrafter(max_ngram=3)
+    drafter.add([1, 2, 3, 4, 5])
+    drafter.add([9, 2, 3, 7, 8])
+    # 三元组 (1, 2, 3) 只出现在第一条序列
+    assert drafter.draft([0, 1, 2, 3], 2) == [4, 5]
+    # (2, 3) 以最近加入的序列为准
+    assert drafter.draft([6, 2, 3], 4) == [7, 8]
+    # 匹配不上更长的n-gram时缩短到单个token
+    assert drafter.draft([0, 0, 4], 3) == [5]
+
+
+def test_draft_without_match_or_budget():
+    drafter = NgramDrafter()
+    drafter.add([1, 2, 3])
+    assert drafter.draft([42], 4) == []
+    assert drafter.draft([1], 0) == []
+    assert drafter.draft([], 4) == []
+
+
+def test_extend_indexes_new_tokens():
+    drafter = NgramDrafter(max_ngram=2)
+    sequence_id = drafter.add([1, 2])
+    assert drafter.draft([2], 3) == []
+    drafter.extend(sequence_id, [3, 4])
+    assert drafter.draft([2], 3) == [3, 4]
+    assert drafter.draft([1, 2], 1) == [3]
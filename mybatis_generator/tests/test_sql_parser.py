@@ -0,0 +1,59 @@
+from xml.etree import ElementTree as ET
+
+from mybatis_generator.core.sql_parser import extract_mapper_refs, extract_sql_refs, statement_text
+
+
+def test_select_with_join_and_aliases():
+    refs = extract_sql_refs(
+        "SELECT u.id, u.user_name AS name, o.amount FROM t_user u "
+        "LEFT JOIN t_order o ON o.user_id = u.id WHERE u.status = #{status}")
+    assert refs['tables'] == ['t_user', 't_order']
+    assert refs['aliases'] == {'u': 't_user', 'o': 't_order'}
+    assert refs['joins'] == [{'type': 'LEFT', 'table': 't_order'}]
+    assert refs['columns'] == ['id', 'user_name', 'amount', 'user_id', 'status']
+
+
+def test_alias_star_is_not_a_column():
+    refs = extract_sql_refs("SELECT u.*, o.amount FROM t_user u JOIN t_order o ON o.user_id = u.id")
+    assert '*' not in refs['columns']
+    assert 'u' not in refs['columns']
+    assert refs['joins'] == [{'type': 'INNER', 'table': 't_order'}]
+
+
+def test_keyword_named_columns():
+    refs = extract_sql_refs("SELECT id, `key`, value, desc FROM t_config WHERE key = #{key} ORDER BY id DESC")
+    assert refs['tables'] == ['t_config']
+    assert refs['columns'] == ['id', 'key', 'value', 'desc']
+
+
+def test_insert_on_duplicate_key_update():
+    refs = extract_sql_refs("INSERT INTO t_config (name, value) VALUES (#{name}, #{value}) "
+                            "ON DUPLICATE KEY UPDATE value = VALUES(value)")
+    assert refs['tables'] == ['t_config']
+    assert refs['columns'] == ['name', 'value']
+
+
+def test_update_and_lock_clause():
+    assert extract_sql_refs("UPDATE t_user SET status = #{status} WHERE id = #{id}") == {
+        'tables': ['t_user'], 'columns': ['status', 'id'], 'aliases': {}, 'joins': []}
+    refs = extract_sql_refs("SELECT id FROM t_user WHERE id = #{id} LOCK IN SHARE MODE")
+    assert refs['aliases'] == {}
+    assert refs['columns'] == ['id']
+
+
+def test_statement_text_restores_dynamic_keywords():
+    element = ET.fromstring('<select id="s">SELECT id FROM t_user<where><if test="a">AND status = #{s}</if>'
+                            '</where></select>')
+    text = ' '.join(statement_text(element).split())
+    assert text == 'SELECT id FROM t_user WHERE AND status = #{s}'
+
+
+def test_extract_mapper_refs_includes_result_map_columns():
+    root = ET.fromstring(
+        '<mapper namespace="UserMapper">'
+        '<resultMap id="m" type="User"><id column="id" property="id"/><result column="nick" property="n"/></resultMap>'
+        '<select id="s">SELECT id, name FROM t_user</select>'
+        '</mapper>')
+    refs = extract_mapper_refs(root)
+    assert refs['tables'] == ['t_user']
+    assert refs['columns'] == ['id', 'nick', 'name']
@@ -0,0 +1,105 @@
+import os
+
+from mybatis_generator.core.statement_index import StatementIndex, index_terms
+
+USER_MAPPER = """<?xml version="1.0" encoding="UTF-8"?>
+<mapper namespace="com.example.mapper.UserMapper">
+    <select id="selectByUserName" resultType="User">
+        SELECT id, user_name, email FROM t_user WHERE user_name = #{userName}
+    </select>
+    <update id="updateEmailById">
+        UPDATE t_user SET email = #{email} WHERE id = #{id}
+    </update>
+</mapper>
+"""
+
+ORDER_MAPPER = """<?xml version="1.0" encoding="UTF-8"?>
+<mapper namespace="com.example.mapper.OrderMapper">
+    <select id="selectByOrderNo" resultType="Order">
+        SELECT id, order_no, amount FROM t_order WHERE order_no = #{orderNo}
+    </select>
+</mapper>
+"""
+
+
+def _write(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _mapper_dir(tmp_path):
+    mapper_dir = tmp_path / 'mappers'
+    mapper_dir.mkdir()
+    _write(mapper_dir / 'UserMapper.xml', USER_MAPPER)
+    _write(mapper_dir / 'OrderMapper.xml', ORDER_MAPPER)
+    return mapper_dir
+
+
+def test_index_terms_splits_identifiers():
+    terms = index_terms('private String userName; user_name')
+    assert terms.count('username') == 2
+    assert 'user' in terms and 'name' in terms
+    assert 'private' not in terms
+
+
+def test_search_ranks_matching_statements(tmp_path):
+    index = StatementIndex()
+    assert index.scan_dir(str(_mapper_dir(tmp_path))) == {'added': 2, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    assert len(index) == 3
+    hits = index.search('public class Order { private String orderNo; private BigDecimal amount; }', top_k=2)
+    assert hits[0]['id'] == 'selectByOrderNo'
+    assert hits[0]['namespace'] == 'com.example.mapper.OrderMapper'
+    assert hits[0]['score'] >= hits[-1]['score']
+    assert index.search('email', top_k=1)[0]['namespace'].endswith('UserMapper')
+    assert index.search('nothing matches') == []
+
+
+def test_update_is_incremental(tmp_path):
+    mapper_dir = _mapper_dir(tmp_path)
+    index = StatementIndex()
+    index.scan_dir(str(mapper_dir))
+    assert index.scan_dir(str(mapper_dir)) == {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 2}
+
+    _write(mapper_dir / 'OrderMapper.xml', ORDER_MAPPER.replace('selectByOrderNo', 'selectByTradeNo'))
+    os.remove(mapper_dir / 'UserMapper.xml')
+    assert index.scan_dir(str(mapper_dir)) == {'added': 0, 'updated': 1, 'removed': 1, 'unchanged': 0}
+    assert [hit['id'] for hit in index.search('order amount', top_k=5)] == ['selectByTradeNo']
+    assert index.search('email') == []
+
+
+def test_index_is_persisted(tmp_path):
+    mapper_dir = _mapper_dir(tmp_path)
+    index_path = str(tmp_path / 'index.json')
+    StatementIndex(index_path).scan_dir(str(mapper_dir))
+
+    reloaded = StatementIndex(index_path)
+    assert len(reloaded) == 3
+    assert reloaded.scan_dir(str(mapper_dir))['unchanged'] == 2
+    assert reloaded.search('email', top_k=1)[0]['id'] == 'updateEmailById'
+
+
+def test_retrieve_examples_respects_token_budget(tmp_path):
+    index = StatementIndex()
+    index.scan_dir(str(_mapper_dir(tmp_path)))
+    examples = index.retrieve_examples('user email', top_k=2, max_tokens=1000)
+    assert len(examples) == 2
+    assert all(example.lstrip().startswith('<') for example in examples)
+    assert index.retrieve_examples('user email', top_k=2, max_tokens=1) == []
+
+
+def test_pruned_search_matches_exhaustive_scoring(tmp_path):
+    mapper_dir = tmp_path / 'mappers'
+    mapper_dir.mkdir()
+    for i in range(30):
+        _write(mapper_dir / f'Entity{i}Mapper.xml', USER_MAPPER.replace('UserMapper', f'Entity{i}Mapper')
+               .replace('t_user', f't_entity{i % 7}').replace('email', f'email{i % 3}'))
+    index = StatementIndex(max_df_ratio=1.0)
+    index.scan_dir(str(mapper_dir))
+    weights = index._term_weights()
+    for query in ('entity3 email1 user name', 'email2 id', 'entity12 entity5 email0'):
+        scores = {}
+        for term in set(index_terms(query)):
+            for doc_id, weight in weights.get(term, {}).items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        expected = sorted((round(score, 4) for score in scores.values()), reverse=True)[:4]
+        assert [hit['score'] for hit in index.search(query, top_k=4)] == expected
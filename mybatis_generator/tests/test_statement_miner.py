@@ -0,0 +1,56 @@
+from xml.etree import ElementTree as ET
+
+from mybatis_generator.core.statement_miner import mine_mapper_statements
+
+MAPPER = """<?xml version="1.0" encoding="UTF-8"?>
+<mapper namespace="com.example.mapper.UserMapper">
+    <sql id="columns">id, user_name</sql>
+    <sql id="byStatus">status = #{status}</sql>
+    <select id="selectById" resultType="User">
+        SELECT <include refid="columns"/> FROM t_user WHERE id = #{id}
+    </select>
+    <select id="listByStatus" resultType="User">
+        SELECT <include refid="com.example.mapper.UserMapper.columns"/> FROM t_user
+        <where><include refid="byStatus"/></where>
+    </select>
+    <delete id="deleteAll">DELETE FROM t_user</delete>
+    <update>UPDATE t_user SET status = 0</update>
+</mapper>
+"""
+
+INTERFACE = {'methods': [{
+    'name': 'selectById',
+    'return_type': 'User',
+    'parameters': [{'type': 'Long', 'name': 'id'}],
+    'documentation': {'description': '根据主键\n    查询用户', 'params': {'id': '用户id'}, 'return': '用户'},
+}]}
+
+
+def _mine(tmp_path, interface=None):
+    path = tmp_path / 'UserMapper.xml'
+    path.write_text(MAPPER, encoding='utf-8')
+    return list(mine_mapper_statements(str(path), 'com.example.mapper.UserMapper', interface))
+
+
+def test_mines_statements_with_method_documentation(tmp_path):
+    samples = _mine(tmp_path, INTERFACE)
+    # <sql>片段和没有id的语句不作为样本
+    assert len(samples) == 3
+    assert samples[0]['description'] == ("生成UserMapper.selectById方法的sql: 根据主键 查询用户\n"
+                                         "方法签名: User selectById(Long id)\n"
+                                         "参数 id: 用户id\n"
+                                         "返回: 用户\n"
+                                         "可引用的sql片段: columns")
+    assert samples[1]['description'] == ("生成UserMapper中id为listByStatus的select语句\n"
+                                         "可引用的sql片段: columns, byStatus")
+    assert samples[2]['description'] == "生成UserMapper中id为deleteAll的delete语句"
+    for sample in samples:
+        assert ET.fromstring(sample['xml']).tag in ('select', 'delete')
+
+
+def test_mined_xml_uses_template_indent(tmp_path):
+    samples = _mine(tmp_path)
+    assert samples[0]['xml'] == ('    <select id="selectById" resultType="User">\n'
+                                 '        SELECT <include refid="columns" /> FROM t_user WHERE id = #{id}\n'
+                                 '    </select>')
+    assert samples[2]['xml'] == '    <delete id="deleteAll">DELETE FROM t_user</delete>'
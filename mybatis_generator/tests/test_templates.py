@@ -0,0 +1,61 @@
+from xml.etree import ElementTree as ET
+
+from mybatis_generator.core.template_engine import TemplateEngine, is_java_source
+from mybatis_generator.core.templates import (batch_update_field, select_list, table_name_for, to_snake_case,
+                                              update_field_by_id)
+
+
+def test_naming_helpers():
+    assert to_snake_case('createTime') == 'create_time'
+    assert table_name_for('UserOrder') == 't_user_order'
+    assert table_name_for('User', '') == 'user'
+
+
+def test_templates_render_well_formed_statements():
+    fields = [{'name': 'id'}, {'name': 'userName'}]
+    for xml in (update_field_by_id('t_user', 'status'), batch_update_field('t_user', 'status'),
+                select_list('t_user', fields)):
+        ET.fromstring(xml)
+    assert 'SET status = #{status}' in update_field_by_id('t_user', 'status')
+    assert 'AND user_name = #{userName}' in select_list('t_user', fields)
+
+
+def test_generate_known_requests():
+    engine = TemplateEngine()
+    xml = engine.generate('生成根据id更新User的status的sql')
+    assert '<update id="updateStatusById">' in xml
+    assert 'UPDATE `t_user`' in xml
+    assert '<select id="selectById"' in engine.generate('根据id查询Order')
+    assert 'batchUpdateStatus' in engine.generate('批量更新User的status')
+    assert engine.stats() == {'hits': 3, 'misses': 0, 'hit_rate': 1.0}
+
+
+def test_generate_falls_back_to_model():
+    engine = TemplateEngine()
+    assert engine.generate('生成统计Product数量的sql') is None
+    # 实体类未知时没有字段，无法生成列表查询
+    assert engine.generate('查询User列表') is None
+    assert engine.misses == 2
+    assert engine.hit_rate == 0.0
+
+
+def test_generate_with_project_entities():
+    entities = {'com.example.UserDO': {'name': 'UserDO', 'fields': [{'name': 'id'}, {'name': 'userName'}]}}
+    engine = TemplateEngine(entities, {'table_prefix': 'tb', 'entity_suffix': 'DO'})
+    xml = engine.generate('根据id更新User的user_name')
+    assert 'UPDATE `tb_user`' in xml
+    assert 'user_name = #{userName}' in xml
+    assert engine.generate('根据id更新User的unknown') is None
+    assert 'FROM `tb_user`' in engine.generate('查询User列表')
+
+
+def test_java_source_is_not_a_request():
+    source = ("/**\n * 用户，可根据id查询User，根据id更新User的status\n */\n"
+              "public class User {\n    private Long id;\n    private Integer status;\n}")
+    engine = TemplateEngine()
+    assert is_java_source(source)
+    assert engine.generate(source) is None
+    assert engine.generate('import java.util.*;\n// 查询User列表') is None
+    assert engine.generate('@Table(name = "t_user")\n// 根据id查询User') is None
+    assert engine.stats() == {'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+    assert not is_java_source('生成根据id更新User的status的sql')
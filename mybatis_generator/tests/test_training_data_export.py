@@ -0,0 +1,74 @@
+import json
+import os
+
+from mybatis_generator.core.reporter import AnalysisReporter
+from mybatis_generator.core.training_data_generator import (EXPORT_INDEX_FILE, TrainingDataGenerator,
+                                                            iter_exported_samples)
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _generator(tmp_path):
+    for name in ('User', 'Order'):
+        _write(str(tmp_path / 'entity' / f'{name}.java'),
+               f"package com.example.entity;\npublic class {name} {{ private Long id; private Integer status; }}")
+        _write(str(tmp_path / 'xml' / f'{name}Mapper.xml'),
+               f'<mapper namespace="com.example.mapper.{name}Mapper">'
+               f'<resultMap id="m" type="com.example.entity.{name}"><id column="id" property="id"/></resultMap>'
+               f'</mapper>')
+    os.makedirs(str(tmp_path / 'java'), exist_ok=True)
+    return TrainingDataGenerator(str(tmp_path / 'xml'), str(tmp_path / 'entity'), str(tmp_path / 'java'),
+                                 reporter=AnalysisReporter(level='quiet'))
+
+
+def test_export_round_trip_matches_generated_samples(tmp_path):
+    expected = _generator(tmp_path).generate_training_data()
+    assert expected
+    output_dir = str(tmp_path / 'out')
+    index = _generator(tmp_path).export_samples(output_dir, shard_size=3)
+
+    assert index['entities'] == 2
+    assert index['samples'] == len(expected)
+    assert len(index['sample_shards']) == -(-len(expected) // 3)
+    assert list(iter_exported_samples(output_dir, with_fields=True)) == expected
+
+    # 不带字段时project_context只有类全名、实体类名和表名
+    sample = next(iter_exported_samples(output_dir))
+    assert set(sample['project_context']) == {'entity_class', 'entity_name', 'table_name'}
+
+
+def test_re_export_removes_stale_shards(tmp_path):
+    output_dir = str(tmp_path / 'out')
+    first = _generator(tmp_path).export_samples(output_dir, shard_size=1)
+    second = _generator(tmp_path).export_samples(output_dir, shard_size=1000)
+
+    assert second['digest'] == first['digest']
+    assert sorted(os.listdir(output_dir)) == sorted([EXPORT_INDEX_FILE] + second['entity_shards']
+                                                    + second['sample_shards'])
+    with open(os.path.join(output_dir, EXPORT_INDEX_FILE), 'r', encoding='utf-8') as f:
+        assert json.load(f) == second
+
+
+def test_same_simple_name_in_different_packages(tmp_path):
+    for package, field in (('com.shop.entity', 'price'), ('com.admin.entity', 'role')):
+        folder = package.split('.')[1]
+        _write(str(tmp_path / 'entity' / folder / 'User.java'),
+               f"package {package};\npublic class User {{ private Long id; private String {field}; }}")
+        _write(str(tmp_path / 'xml' / f'{folder}UserMapper.xml'),
+               f'<mapper namespace="com.{folder}.mapper.UserMapper">'
+               f'<resultMap id="m" type="{package}.User"><id column="id" property="id"/></resultMap></mapper>')
+    os.makedirs(str(tmp_path / 'java'), exist_ok=True)
+    generator = TrainingDataGenerator(str(tmp_path / 'xml'), str(tmp_path / 'entity'), str(tmp_path / 'java'),
+                                      reporter=AnalysisReporter(level='quiet'))
+    output_dir = str(tmp_path / 'out')
+    generator.export_samples(output_dir)
+
+    fields = {}
+    for sample in iter_exported_samples(output_dir, with_fields=True):
+        context = sample['project_context']
+        fields[context['entity_class']] = [field['name'] for field in context['fields']]
+    assert fields == {'com.shop.entity.User': ['id', 'price'], 'com.admin.entity.User': ['id', 'role']}
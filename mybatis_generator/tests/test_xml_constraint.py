@@ -0,0 +1,53 @@
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from mybatis_generator.xml_constraint import STATEMENT_ROOTS, XmlState, close_xml
+
+
+def test_accepts_mapper_prefix_and_tracks_open_elements():
+    state = XmlState()
+    assert state.feed('<?xml version="1.0" encoding="UTF-8"?>\n<mapper namespace="a"><select id="x">SELECT 1')
+    assert state.stack == ['mapper', 'select']
+    assert state.closing_text() == '</select></mapper>'
+    assert not state.complete
+
+
+@pytest.mark.parametrize('text', [
+    '<select>',  # 不允许的根元素
+    '<mapper><foo>',  # mapper下不允许的子元素
+    '<mapper></select>',  # 结束标签不匹配
+    '<mapper a="<">',  # 属性值中出现 <
+    '<mapper>a &bogus',  # 未知的实体引用
+    '<mapper/><mapper>',  # 第二个根元素
+])
+def test_rejects_malformed_xml(text):
+    assert not XmlState().feed(text)
+
+
+def test_entity_references_and_completion():
+    state = XmlState()
+    assert state.feed('<mapper>a &lt; b &#60; c</mapper>')
+    assert state.complete
+    assert XmlState(STATEMENT_ROOTS).feed('<select id="x">SELECT 1</select>')
+
+
+def test_copy_is_independent():
+    state = XmlState()
+    state.feed('<mapper>')
+    copy = state.copy()
+    assert copy.feed('<select id="x">')
+    assert state.stack == ['mapper']
+    assert copy.stack == ['mapper', 'select']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('<mapper namespace="a"><select id="x">SELECT 1 &am',
+     '<mapper namespace="a"><select id="x">SELECT 1 </select></mapper>'),
+    ('<mapper><select id="x', '<mapper></mapper>'),
+    ('<mapper><sql id="a">x</sql></mapper>trailing', '<mapper><sql id="a">x</sql></mapper>'),
+])
+def test_close_xml(text, expected):
+    closed = close_xml(text)
+    assert closed == expected
+    ET.fromstring(closed)